@@ -0,0 +1,76 @@
+"""Time of encrypting a videoList with RMDJCodec against the per-byte loop.
+
+The per-byte loop is the one VideoList used before the codec, kept here as
+the reference, and every variant has to give the same bytes. Data is random,
+the stream variant reads from and writes to memory.
+Run it with the package installed (uv run or pip install -e .):
+
+    python benchmarks/rmdj.py [--sizes-mb 1 8] [--rounds 5]
+"""
+
+import argparse
+import io
+import os
+import time
+
+from quantumfetcher.constants import RMDJ_ENCRYPTION_KEY
+from quantumfetcher.rmdj import RMDJCodec
+
+
+def xor_per_byte(data: bytes) -> bytes:
+    xor_bytes = bytearray()
+
+    for i, byte in enumerate(data):
+        xor_bytes.append(byte ^ RMDJ_ENCRYPTION_KEY[i % len(RMDJ_ENCRYPTION_KEY)])
+
+    return bytes(xor_bytes)
+
+
+def xor_stream(data: bytes) -> bytes:
+    writer = io.BytesIO()
+    RMDJCodec.encrypt_stream(io.BytesIO(data), writer)
+    return writer.getvalue()
+
+
+def best_of(rounds: int, function, data: bytes) -> float:
+    timings = []
+
+    for _ in range(rounds):
+        started = time.perf_counter()
+        function(data)
+        timings.append(time.perf_counter() - started)
+
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes-mb", type=int, nargs="+", default=[1, 8])
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    variants = (
+        ("per-byte loop", xor_per_byte),
+        ("codec", RMDJCodec.encrypt),
+        ("codec stream", xor_stream),
+    )
+
+    print(f"{'size':>6} {'variant':<14} {'ms':>8}")
+
+    for size_mb in args.sizes_mb:
+        data = os.urandom(size_mb * 1024 * 1024)
+        expected = xor_per_byte(data)
+
+        for name, function in variants:
+            if function(data) != expected:
+                raise RuntimeError(f"{name} output differs from the per-byte loop")
+
+            if RMDJCodec.decrypt(function(data)) != data:
+                raise RuntimeError(f"{name} output doesn't decrypt back")
+
+            elapsed = best_of(args.rounds, function, data)
+            print(f"{size_mb:>4} MiB {name:<14} {elapsed * 1000:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,227 @@
+"""Time of extracting subtitles from every text track of an episode.
+
+Given a downloaded episode directory, every .ismt track in it (one per
+language) is measured. Parsing with the shared streaming parser is compared
+with the earlier approach, a tree per fragment searched with findall, and
+both have to give the same text. Full extraction (mmap, fragment index, JSON
+output) is timed on a copy of the track, so the episode is left untouched.
+
+Without an episode directory a synthetic track is used instead: styled TTML
+fragments (head/styling/layout) like the real ones, two of every three
+carrying a paragraph. With --corrupt, that many of its fragments are broken
+to measure skipping them.
+Run it with the package installed (uv run or pip install -e .):
+
+    python benchmarks/subtitles.py [episode_path] [--rounds 15]
+    python benchmarks/subtitles.py [--fragments 3000] [--corrupt 0] [--rounds 15]
+"""
+
+import argparse
+import shutil
+import struct
+import tempfile
+import time
+import xml.etree.ElementTree as ET
+from pathlib import Path
+
+from quantumfetcher.constants import TTML_NS
+from quantumfetcher.mp4 import BOX_HEADER, get_fragment_offsets
+from quantumfetcher.subtitles import SubtitleSegments, extract_subtitles
+
+XML_ID = "{http://www.w3.org/XML/1998/namespace}id"
+FRAGMENT_DURATION = 20_000_000  # 2 s in 100 ns units
+
+HEAD = (
+    "<head><styling>"
+    '<style xml:id="normal" tts:fontFamily="sansSerif" tts:fontSize="100%" tts:color="white"/>'
+    '<style xml:id="italic" tts:fontStyle="italic"/>'
+    "</styling><layout>"
+    '<region xml:id="bottom" tts:origin="10% 80%" tts:extent="80% 15%" tts:displayAlign="after"/>'
+    "</layout></head>"
+)
+
+
+def build_fragment(index: int, paragraph: int | None) -> bytes:
+    body = ""
+
+    if paragraph is not None:
+        body = (
+            f'<p xml:id="s{paragraph}" begin="{index * 2}s" end="{index * 2 + 2}s" region="bottom">'
+            f'Line {paragraph} of the subtitles,<br/><span style="italic">spoken</span> over two lines.</p>'
+        )
+
+    return (
+        '<?xml version="1.0" encoding="utf-8"?>'
+        '<tt xmlns="http://www.w3.org/ns/ttml" xmlns:tts="http://www.w3.org/ns/ttml#styling" xml:lang="en">'
+        f"{HEAD}<body><div>{body}</div></body></tt>"
+    ).encode()
+
+
+def build_fragments(count: int, corrupt: int) -> list[bytes]:
+    fragments = []
+    paragraph = 0
+
+    for index in range(count):
+        if index % 3 == 2:
+            fragments.append(build_fragment(index, None))
+        else:
+            fragments.append(build_fragment(index, paragraph))
+            paragraph += 1
+
+    # Cut broken fragments short, spread over the whole track
+    for index in range(0, count, count // corrupt) if corrupt else []:
+        fragments[index] = fragments[index][: len(fragments[index]) // 2]
+
+    return fragments
+
+
+def build_track(path: Path, fragments: list[bytes]):
+    entries = []
+
+    with open(path, "wb") as f:
+        for index, fragment in enumerate(fragments):
+            entries.append((index * FRAGMENT_DURATION, f.tell()))
+            f.write(BOX_HEADER.pack(BOX_HEADER.size, b"moof"))
+            f.write(BOX_HEADER.pack(BOX_HEADER.size + len(fragment), b"mdat"))
+            f.write(fragment)
+
+        # tfra version 1, 1 byte traf/trun/sample numbers
+        tfra = struct.pack(">B3xIII", 1, 1, 0, len(entries)) + b"".join(
+            struct.pack(">QQBBB", start, offset, 1, 1, 1) for start, offset in entries
+        )
+        tfra = BOX_HEADER.pack(BOX_HEADER.size + len(tfra), b"tfra") + tfra
+        # mfro is the last box, version/flags and the size of the whole mfra
+        mfra_size = BOX_HEADER.size + len(tfra) + 16
+        mfro = BOX_HEADER.pack(16, b"mfro") + struct.pack(">II", 0, mfra_size)
+
+        f.write(BOX_HEADER.pack(mfra_size, b"mfra") + tfra + mfro)
+
+
+def read_fragments(path: Path) -> list[bytes]:
+    # mdat payload of every fragment listed in the track's fragment index
+    data = path.read_bytes()
+    fragments = []
+
+    for _, offset in get_fragment_offsets(data, path):
+        (moof_size,) = struct.unpack_from(">I", data, offset)
+        mdat_size, _ = BOX_HEADER.unpack_from(data, offset + moof_size)
+        mdat_start = offset + moof_size + BOX_HEADER.size
+        fragments.append(data[mdat_start : offset + moof_size + mdat_size])
+
+    return fragments
+
+
+def parse_per_fragment(fragments: list[bytes]) -> list[str]:
+    # Earlier approach, kept here as the reference
+    segments: list[str] = []
+
+    for fragment in fragments:
+        try:
+            root = ET.fromstring(fragment)
+        except ET.ParseError:
+            continue
+
+        for paragraph in root.findall(".//xmlns:p", namespaces=TTML_NS):
+            lines = []
+
+            for node in paragraph.iter():
+                if node.tag.endswith("br"):
+                    lines.append("\n")
+                elif node.text:
+                    lines.append(node.text)
+
+            segment_id = int(paragraph.attrib[XML_ID].lstrip("s"))
+
+            if len(segments) > segment_id:
+                segments[segment_id] = "".join(lines)
+            else:
+                segments.append("".join(lines))
+
+    return segments
+
+
+def parse_shared(fragments: list[bytes]) -> list[str]:
+    segments = SubtitleSegments()
+
+    for fragment in fragments:
+        segments.add_fragment(fragment)
+
+    return [segment.text for segment in segments.close().segments]
+
+
+def best_of(rounds: int, function, *args) -> float:
+    timings = []
+
+    for _ in range(rounds):
+        started = time.perf_counter()
+        function(*args)
+        timings.append(time.perf_counter() - started)
+
+    return min(timings)
+
+
+def measure(track_path: Path, rounds: int) -> list[float]:
+    fragments = read_fragments(track_path)
+
+    if parse_per_fragment(fragments) != parse_shared(fragments):
+        raise RuntimeError(
+            f"Shared parser output differs from the reference for {track_path.name}"
+        )
+
+    track = extract_subtitles(track_path, 1, track_path.stem)
+    timings = [
+        best_of(rounds, parse_per_fragment, fragments),
+        best_of(rounds, parse_shared, fragments),
+        best_of(rounds, extract_subtitles, track_path, 1, track_path.stem),
+    ]
+
+    print(
+        f"{track_path.name:<32} {len(fragments):>9} {len(track.segments):>8} "
+        f"{len(track.skipped):>7} "
+        + " ".join(f"{timing * 1000:>12.1f}" for timing in timings)
+    )
+
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("episode_path", type=Path, nargs="?")
+    parser.add_argument("--fragments", type=int, default=3000)
+    parser.add_argument("--corrupt", type=int, default=0)
+    parser.add_argument("--rounds", type=int, default=15)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        temp_path = Path(temp_dir)
+
+        if args.episode_path is not None:
+            sources = sorted(args.episode_path.glob("*.ismt"))
+
+            if not sources:
+                parser.error(f"No text tracks (.ismt) in {args.episode_path}")
+
+            # Extraction writes its JSON next to the track, work on copies
+            tracks = [shutil.copy(source, temp_path) for source in sources]
+        else:
+            tracks = [temp_path / "textstream_eng=1000.ismt"]
+            build_track(tracks[0], build_fragments(args.fragments, args.corrupt))
+
+        print(
+            f"{'track':<32} {'fragments':>9} {'segments':>8} {'skipped':>7} "
+            f"{'per frag ms':>12} {'shared ms':>12} {'extract ms':>12}"
+        )
+        totals = [0.0, 0.0, 0.0]
+
+        for track_path in tracks:
+            timings = measure(Path(track_path), args.rounds)
+            totals = [total + timing for total, timing in zip(totals, timings)]
+
+        print(
+            f"{'total':<59} "
+            + " ".join(f"{total * 1000:>12.1f}" for total in totals)
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""Throughput and CPU use of every HTTP transport against a local origin.
+
+The origin runs in its own process on quantumfetcher.httpio and serves one
+file of random bytes with X-MS-Range support, the way the downloader asks
+for media. CPU is user+sys of the downloading process only. Every transport
+downloads the file once before the timed rounds, so imports aren't measured.
+Run it with the package installed (uv run or pip install -e .):
+
+    python benchmarks/transports.py [--size-mb 96] [--range-mb 4] [--rounds 3]
+"""
+
+import argparse
+import asyncio
+import multiprocessing
+import os
+import socket
+import tempfile
+import time
+from pathlib import Path
+
+from quantumfetcher.enumerators.type_transport import TransportType
+from quantumfetcher.httpio import (
+    get_byte_range,
+    parse_byte_range,
+    run_server,
+    send_head,
+)
+from quantumfetcher.transports.base import create_transport
+
+MEDIA_NAME = "media.ismv"
+
+
+def serve(address: str, path: Path):
+    size = path.stat().st_size
+
+    async def respond(writer, method, target, headers, keep_alive):
+        if target.strip("/") != MEDIA_NAME:
+            return await send_head(writer, 404, 0, keep_alive)
+
+        start, end = 0, size - 1
+        status = 200
+        byte_range = get_byte_range(headers)
+
+        if byte_range:
+            start, end = parse_byte_range(byte_range, size)
+            status = 206
+
+        length = end - start + 1
+        await send_head(writer, status, length, keep_alive)
+
+        if method == "HEAD":
+            return
+
+        with open(path, "rb") as f:
+            await asyncio.get_running_loop().sendfile(
+                writer.transport, f, start, length
+            )
+
+    run_server(address, respond)
+
+
+def get_free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_server(port: int):
+    deadline = time.monotonic() + 10
+
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.05)
+
+    raise RuntimeError("Origin did not start")
+
+
+def download(transport_type: TransportType, url: str, range_size: int) -> int:
+    # Same request pattern as the downloader, ranges one after another
+    transport = create_transport(transport_type)
+
+    try:
+        size = transport.get_content_length(url)
+        received = 0
+
+        for start in range(0, size, range_size):
+            end = min(start + range_size, size) - 1
+            headers = {"X-MS-Range": f"bytes={start}-{end}"}
+
+            with transport.stream(url, headers) as chunks:
+                for chunk in chunks:
+                    received += len(chunk)
+
+        if received != size:
+            raise RuntimeError(f"Received {received} of {size} bytes")
+
+        return received
+    finally:
+        transport.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size-mb", type=int, default=96)
+    parser.add_argument("--range-mb", type=int, default=4)
+    parser.add_argument("--rounds", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        media_path = Path(temp_dir) / MEDIA_NAME
+        media_path.write_bytes(os.urandom(args.size_mb * 1024 * 1024))
+
+        port = get_free_port()
+        origin = multiprocessing.Process(
+            target=serve, args=(f"127.0.0.1:{port}", media_path), daemon=True
+        )
+        origin.start()
+
+        try:
+            wait_for_server(port)
+            url = f"http://127.0.0.1:{port}/{MEDIA_NAME}"
+            range_size = args.range_mb * 1024 * 1024
+
+            print(f"{'transport':<12} {'wall s':>8} {'CPU s':>8} {'MB/s':>8}")
+
+            for transport_type in TransportType:
+                download(transport_type, url, range_size)
+
+                for _ in range(args.rounds):
+                    wall, cpu = time.perf_counter(), time.process_time()
+                    size = download(transport_type, url, range_size)
+                    wall = time.perf_counter() - wall
+                    cpu = time.process_time() - cpu
+
+                    print(
+                        f"{transport_type.value:<12} {wall:>8.2f} {cpu:>8.2f} {size / wall / 1e6:>8.0f}"
+                    )
+        finally:
+            origin.terminate()
+            origin.join()
+
+
+if __name__ == "__main__":
+    main()
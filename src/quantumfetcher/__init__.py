@@ -3,13 +3,35 @@ from typing import Annotated
 
 import typer
 
-from quantumfetcher.flow import Flow
-from quantumfetcher.prompt import Prompt
+from quantumfetcher.constants import MAX_CONNECTIONS
+from quantumfetcher.enumerators.policy_fsync import FsyncPolicy
+from quantumfetcher.enumerators.policy_placement import PlacementPolicy
+from quantumfetcher.enumerators.type_transport import TransportType
+from quantumfetcher.helpers import parse_budget, parse_size
 from quantumfetcher.video_list import VideoList
 
 app = typer.Typer()
 
 
+def __check_size(value: str) -> str:
+    try:
+        parse_size(value)
+    except ValueError as e:
+        raise typer.BadParameter(str(e))
+
+    return value
+
+
+def __check_budget(value: str | None) -> str | None:
+    try:
+        if value:
+            parse_budget(value)
+    except ValueError as e:
+        raise typer.BadParameter(str(e))
+
+    return value
+
+
 @app.command(
     help="Tool for fetching Quantum Break live action episodes for offline in-game playback"
 )
@@ -49,6 +71,36 @@ def main(
             help="Custom streaming server host",
         ),
     ] = "127.0.0.1:10000",
+    serve: Annotated[
+        bool,
+        typer.Option(
+            help="Serve downloaded episodes on --patch-videolist-server address",
+            is_flag=True,
+        ),
+    ] = False,
+    proxy: Annotated[
+        bool,
+        typer.Option(
+            help="Run a caching proxy for the origin on --patch-videolist-server address",
+            is_flag=True,
+        ),
+    ] = False,
+    proxy_cache_path: Annotated[
+        Path | None,
+        typer.Option(
+            help="Path to where the proxy caches responses (defaults to the application directory)",
+            dir_okay=True,
+            file_okay=False,
+            writable=True,
+        ),
+    ] = None,
+    proxy_cache_size: Annotated[
+        str,
+        typer.Option(
+            help="Maximum size of the proxy cache, least recently used responses are evicted first (e.g., 500M, 20G)",
+            callback=__check_size,
+        ),
+    ] = "20G",
     build_videolist_path: Annotated[
         Path | None,
         typer.Option(
@@ -58,6 +110,16 @@ def main(
             readable=True,
         ),
     ] = None,
+    job_file: Annotated[
+        Path | None,
+        typer.Option(
+            help="Run all targets listed in TOML/JSON job file in a single process",
+            exists=True,
+            file_okay=True,
+            dir_okay=False,
+            readable=True,
+        ),
+    ] = None,
     interactive: Annotated[
         bool,
         typer.Option(
@@ -116,6 +178,13 @@ def main(
             help="Comma-seperated list of text bitrates to download",
         ),
     ] = None,
+    budget: Annotated[
+        str | None,
+        typer.Option(
+            help="Pick video and audio quality of every episode to fit a total size (e.g., 20G) or what can be downloaded in given time at given bandwidth (e.g., 2h@50M for 2 hours at 50 Mbit/s)",
+            callback=__check_budget,
+        ),
+    ] = None,
     show_formats: Annotated[
         bool,
         typer.Option(
@@ -126,17 +195,152 @@ def main(
     extract_subtitles: Annotated[
         bool, typer.Option(help="Extract subtitles to JSON file", is_flag=True)
     ] = False,
+    subtitle_db_path: Annotated[
+        Path | None,
+        typer.Option(
+            help="Also index extracted subtitles in this SQLite database (implies --extract-subtitles)",
+            dir_okay=False,
+            file_okay=True,
+            writable=True,
+        ),
+    ] = None,
+    manifest_cache_path: Annotated[
+        Path | None,
+        typer.Option(
+            help="Path to where parsed manifests are cached (defaults to the application directory)",
+            dir_okay=True,
+            file_okay=False,
+            writable=True,
+        ),
+    ] = None,
+    no_manifest_cache: Annotated[
+        bool,
+        typer.Option(
+            help="Don't cache parsed manifests on disk",
+            is_flag=True,
+        ),
+    ] = False,
+    refresh_manifests: Annotated[
+        bool,
+        typer.Option(
+            help="Fetch manifests from the server even if they are cached",
+            is_flag=True,
+        ),
+    ] = False,
+    compact_manifests: Annotated[
+        bool,
+        typer.Option(
+            help="Collapse consecutive chunks of equal duration in saved client manifests",
+            is_flag=True,
+        ),
+    ] = False,
+    progressive: Annotated[
+        bool,
+        typer.Option(
+            help="Download the first episode fragment by fragment in play order, so it can be watched sooner",
+            is_flag=True,
+        ),
+    ] = False,
+    partial_manifests: Annotated[
+        bool,
+        typer.Option(
+            help="Keep manifests of the episode being downloaded up to date with the fragments already on disk",
+            is_flag=True,
+        ),
+    ] = False,
+    fsync: Annotated[
+        FsyncPolicy,
+        typer.Option(
+            help="When downloaded media is flushed to disk: after every range, once per file or never (left to the OS)",
+            case_sensitive=False,
+        ),
+    ] = FsyncPolicy.Never,
+    transport: Annotated[
+        TransportType,
+        typer.Option(
+            help="HTTP client library used for downloading",
+            case_sensitive=False,
+        ),
+    ] = TransportType.Requests,
+    max_connections: Annotated[
+        int,
+        typer.Option(
+            help="Upper limit of concurrent range requests, the actual number is tuned to the connection while downloading",
+            min=1,
+        ),
+    ] = MAX_CONNECTIONS,
+    storage_roots: Annotated[
+        str | None,
+        typer.Option(
+            help="Comma-separated list of directories (e.g., on separate disks) to spread media files over, episode directories link to them",
+        ),
+    ] = None,
+    storage_policy: Annotated[
+        PlacementPolicy,
+        typer.Option(
+            help="How storage roots are picked for new media files: fewest files being written or most free space",
+            case_sensitive=False,
+        ),
+    ] = PlacementPolicy.Load,
+    lease_path: Annotated[
+        Path | None,
+        typer.Option(
+            help="Shared directory used to split the download between multiple nodes",
+            dir_okay=True,
+            file_okay=False,
+            writable=True,
+        ),
+    ] = None,
+    lease_timeout: Annotated[
+        int,
+        typer.Option(
+            help="Seconds after which work claimed by an unresponsive node is taken over",
+        ),
+    ] = 300,
+    node_id: Annotated[
+        str | None,
+        typer.Option(
+            help="Name of this node in the lease directory (defaults to hostname and PID)",
+        ),
+    ] = None,
 ):
     if (
         path is None
         and not dump_videolist_path
         and not patch_videolist
         and not build_videolist_path
+        and not job_file
+        and not serve
+        and not proxy
     ):
         # Ask user for path to root game folder
+        from quantumfetcher.prompt import Prompt
+
         interactive = True
         path = Prompt.get_game_path()
 
+    if no_manifest_cache:
+        manifest_cache_path = None
+    elif manifest_cache_path is None:
+        manifest_cache_path = Path(typer.get_app_dir("quantumfetcher")) / "manifests"
+
+    storage_root_paths = (
+        [Path(root) for root in storage_roots.split(",")] if storage_roots else None
+    )
+
+    if job_file:
+        from quantumfetcher.batch import BatchJob
+
+        return BatchJob(job_file).run(
+            manifest_cache_path=manifest_cache_path,
+            refresh_manifests=refresh_manifests,
+            fsync_policy=fsync,
+            transport_type=transport,
+            max_connections=max_connections,
+            storage_roots=storage_root_paths,
+            storage_policy=storage_policy,
+        )
+
     is_game_dir = False
 
     if path and videolist_path == Path("data/videoList.rmdj"):
@@ -148,6 +352,11 @@ def main(
         # If no episodes path is provided, use the default one
         episodes_path = path / "videos" / "episodes"
 
+    if serve:
+        from quantumfetcher.streamer import Streamer
+
+        return Streamer(episodes_path).serve(patch_videolist_server)
+
     if build_videolist_path:
         return VideoList.build(build_videolist_path, videolist_path)
 
@@ -163,6 +372,20 @@ def main(
     if patch_videolist:
         return video_list.patch(patch_videolist_server)
 
+    if proxy:
+        from quantumfetcher.cache import DiskCache
+        from quantumfetcher.proxy import CachingProxy
+
+        if proxy_cache_path is None:
+            proxy_cache_path = Path(typer.get_app_dir("quantumfetcher")) / "proxy"
+
+        cache = DiskCache(proxy_cache_path, parse_size(proxy_cache_size))
+        return CachingProxy(cache, video_list).serve(patch_videolist_server)
+
+    # Downloading pulls in requests, rich live display and inquirer,
+    # videoList operations above don't need any of them
+    from quantumfetcher.flow import Flow
+
     Flow(
         interactive=interactive,
         video_list=video_list,
@@ -175,5 +398,20 @@ def main(
         text_langs=text_languages.split(",") if text_languages else None,
         text_bitrates=text_bitrates.split(",") if text_bitrates else None,
         show_formats=show_formats,
+        budget=parse_budget(budget) if budget else None,
         extract_subtitles=extract_subtitles,
+        subtitle_db_path=subtitle_db_path,
+        manifest_cache_path=manifest_cache_path,
+        refresh_manifests=refresh_manifests,
+        compact_manifests=compact_manifests,
+        progressive=progressive,
+        partial_manifests=partial_manifests,
+        fsync_policy=fsync,
+        transport=transport,
+        max_connections=max_connections,
+        storage_roots=storage_root_paths,
+        storage_policy=storage_policy,
+        lease_path=lease_path,
+        lease_timeout=lease_timeout,
+        node_id=node_id,
     )
@@ -0,0 +1,224 @@
+import json
+from pathlib import Path
+from typing import Any
+
+from rich.console import Console
+
+from quantumfetcher.constants import MAX_CONNECTIONS
+from quantumfetcher.downloader import Downloader
+from quantumfetcher.enumerators.policy_fsync import FsyncPolicy
+from quantumfetcher.enumerators.policy_placement import PlacementPolicy
+from quantumfetcher.enumerators.type_transport import TransportType
+from quantumfetcher.flow import Flow
+from quantumfetcher.helpers import parse_budget
+from quantumfetcher.manifests.snapshot import SnapshotCache
+from quantumfetcher.storage import StoragePool
+from quantumfetcher.transports.base import create_transport
+from quantumfetcher.video_list import VideoList
+
+try:
+    import tomllib
+except ModuleNotFoundError:  # Python 3.10
+    tomllib = None
+
+PATH_KEYS = {"path", "videolist_path", "episodes_path", "subtitle_db_path"}
+LIST_KEYS = {
+    "episodes",
+    "video_resolutions",
+    "video_bitrates",
+    "audio_languages",
+    "audio_bitrates",
+    "text_languages",
+    "text_bitrates",
+}
+FLAG_KEYS = {
+    "extract_subtitles",
+    "compact_manifests",
+    "progressive",
+    "partial_manifests",
+    "patch_videolist",
+}
+TARGET_KEYS = PATH_KEYS | LIST_KEYS | FLAG_KEYS | {
+    "patch_videolist_server",
+    "budget",
+}
+
+
+# A job file lists several game installs (targets) with their own selections,
+# top level keys are defaults for every target. All targets run in one process
+# and share a single downloader, so its connection pool, parsed manifests
+# and media files downloaded for earlier targets are reused by later ones.
+# Once no later target selects an episode, its shared entries are let go.
+class BatchJob:
+
+    def __init__(self, job_path: Path):
+        self.__targets = self.__load(job_path)
+
+    @property
+    def targets(self) -> list[dict[str, Any]]:
+        return self.__targets
+
+    def run(
+        self,
+        manifest_cache_path: Path | None = None,
+        refresh_manifests: bool = False,
+        fsync_policy: FsyncPolicy = FsyncPolicy.Never,
+        transport_type: TransportType = TransportType.Requests,
+        max_connections: int = MAX_CONNECTIONS,
+        storage_roots: list[Path] | None = None,
+        storage_policy: PlacementPolicy = PlacementPolicy.Load,
+    ):
+        console = Console()
+        downloader = Downloader(
+            manifest_cache=(
+                SnapshotCache(manifest_cache_path, refresh=refresh_manifests)
+                if manifest_cache_path
+                else None
+            ),
+            share=True,
+            fsync_policy=fsync_policy,
+            transport=create_transport(transport_type, max_connections),
+            max_connections=max_connections,
+            storage=(
+                StoragePool(storage_roots, storage_policy) if storage_roots else None
+            ),
+        )
+
+        manifest_urls = [
+            self.__get_manifest_urls(target) for target in self.__targets
+        ]
+
+        for idx, target in enumerate(self.__targets, start=1):
+            console.rule(
+                f"Target {idx}/{len(self.__targets)}: {target['path'] or target['videolist_path']}"
+            )
+            self.__run_target(downloader, target)
+            downloader.release_shared(set().union(*manifest_urls[idx:]))
+
+    @staticmethod
+    def __get_video_list(target: dict[str, Any]) -> VideoList:
+        if target["videolist_path"] is None:
+            return VideoList(target["path"] / "data" / "videoList.rmdj", True)
+
+        return VideoList(target["videolist_path"])
+
+    @staticmethod
+    def __get_manifest_urls(target: dict[str, Any]) -> set[str]:
+        # Client and server manifest URLs of every episode the target selects
+        video_list = BatchJob.__get_video_list(target)
+        episodes = target["episodes"]
+
+        if episodes is None or episodes == ["all"]:
+            episodes = list(video_list.episode_list)
+
+        return {
+            url
+            for episode_id in episodes
+            if episode_id in video_list.episode_list
+            for url in (
+                video_list.episode_list[episode_id],
+                video_list.get_server_manifest_url(episode_id),
+            )
+        }
+
+    def __run_target(self, downloader: Downloader, target: dict[str, Any]):
+        episodes_path: Path | None = target["episodes_path"]
+
+        if episodes_path is None:
+            episodes_path = target["path"] / "videos" / "episodes"
+
+        video_list = self.__get_video_list(target)
+
+        Flow(
+            interactive=False,
+            video_list=video_list,
+            downloader=downloader,
+            episodes=target["episodes"],
+            episodes_path=episodes_path,
+            video_resolutions=target["video_resolutions"],
+            video_bitrates=target["video_bitrates"],
+            audio_langs=target["audio_languages"],
+            audio_bitrates=target["audio_bitrates"],
+            text_langs=target["text_languages"],
+            text_bitrates=target["text_bitrates"],
+            show_formats=False,
+            budget=target["budget"],
+            extract_subtitles=target["extract_subtitles"],
+            subtitle_db_path=target["subtitle_db_path"],
+            compact_manifests=target["compact_manifests"],
+            progressive=target["progressive"],
+            partial_manifests=target["partial_manifests"],
+            lease_path=None,
+            lease_timeout=0,
+            node_id=None,
+        )
+
+        if target["patch_videolist"]:
+            video_list.patch(target["patch_videolist_server"])
+
+    @staticmethod
+    def __load(job_path: Path) -> list[dict[str, Any]]:
+        with open(job_path, "rb") as f:
+            if job_path.suffix.lower() == ".toml":
+                if tomllib is None:
+                    raise ValueError(
+                        "TOML job files require Python 3.11 or newer, use JSON instead."
+                    )
+
+                job = tomllib.load(f)
+            else:
+                job = json.load(f)
+
+        targets = job.pop("targets", None)
+
+        if not isinstance(targets, list) or not targets:
+            raise ValueError(f"Job file {job_path} doesn't list any targets.")
+
+        return [
+            BatchJob.__parse_target(job_path.parent, idx, {**job, **target})
+            for idx, target in enumerate(targets, start=1)
+        ]
+
+    @staticmethod
+    def __parse_target(base_path: Path, idx: int, target: dict[str, Any]):
+        unknown_keys = set(target) - TARGET_KEYS
+
+        if unknown_keys:
+            raise ValueError(
+                f"Unknown keys in job target {idx}: {', '.join(sorted(unknown_keys))}"
+            )
+
+        if "path" not in target and not (
+            "videolist_path" in target and "episodes_path" in target
+        ):
+            raise ValueError(
+                f"Job target {idx} needs either path or both videolist_path and episodes_path."
+            )
+
+        parsed: dict[str, Any] = {
+            "patch_videolist_server": target.get(
+                "patch_videolist_server", "127.0.0.1:10000"
+            )
+        }
+
+        for key in PATH_KEYS:
+            # Relative paths are relative to the job file
+            parsed[key] = base_path / target[key] if key in target else None
+
+        for key in LIST_KEYS:
+            # Filters are either lists or comma-separated strings like on the command line
+            value = target.get(key)
+
+            if isinstance(value, str):
+                value = value.split(",")
+
+            parsed[key] = [str(v) for v in value] if value is not None else None
+
+        for key in FLAG_KEYS:
+            parsed[key] = bool(target.get(key, False))
+
+        # Same as on the command line, or a plain number of bytes
+        budget = target.get("budget")
+        parsed["budget"] = parse_budget(str(budget)) if budget is not None else None
+
+        return parsed
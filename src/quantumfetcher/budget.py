@@ -0,0 +1,228 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
+
+from quantumfetcher.catalog import StreamCatalog
+from quantumfetcher.constants import MAX_CONNECTIONS
+from quantumfetcher.dataclasses.episode_plan import EpisodePlan
+from quantumfetcher.dataclasses.stream_audio import AudioStream
+from quantumfetcher.dataclasses.stream_text import TextStream
+from quantumfetcher.dataclasses.stream_video import VideoStream
+from quantumfetcher.enumerators.language import Language
+from quantumfetcher.enumerators.type_manifest import ManifestType
+from quantumfetcher.enumerators.type_stream import StreamType
+from quantumfetcher.helpers import format_size
+from quantumfetcher.manifests.server import ServerManifest
+from quantumfetcher.manifests.store import ManifestStore
+from quantumfetcher.transports.base import HTTPStatusError, TransportError
+from quantumfetcher.video_list import VideoList
+
+
+# Picks video and audio quality of every episode so that all of them fit in
+# a budget of bytes. Sizes of the candidate files are asked from the server,
+# durations come from the chunks in client manifests. Every episode is given
+# its lowest quality plus a part of the rest of the budget proportional to
+# its duration, and gets the best video (then audio) that fits in it. Whatever
+# an episode doesn't use is left to the episodes after it.
+class BudgetPlanner:
+
+    def __init__(
+        self,
+        video_list: VideoList,
+        manifests: ManifestStore,
+        catalog: StreamCatalog,
+        get_media_size: Callable[[str], int],
+    ):
+        self.__video_list = video_list
+        self.__manifests = manifests
+        self.__catalog = catalog
+        self.__get_media_size = get_media_size
+
+    def plan(
+        self,
+        budget: int,
+        audio_languages: list[Language],
+        text_streams: list[TextStream],
+    ) -> list[EpisodePlan]:
+        texts = {
+            episode_id: self.__catalog.select(episode_id, [], [], text_streams)[
+                StreamType.Text
+            ]
+            for episode_id in self.__manifests.episodes
+        }
+        options = {
+            episode_id: self.__get_options(
+                episode_id, audio_languages, texts[episode_id]
+            )
+            for episode_id in self.__manifests.episodes
+        }
+
+        remaining_budget = budget
+        remaining_duration = sum(
+            self.__catalog.get_duration(episode_id) for episode_id in options
+        )
+        remaining_minimum = sum(option[0][0] for option in options.values())
+        plans = []
+
+        for episode_id, choices in options.items():
+            duration = self.__catalog.get_duration(episode_id)
+            minimum = choices[0][0]
+            remaining_minimum -= minimum
+
+            spare = max(remaining_budget - remaining_minimum - minimum, 0)
+            share = minimum + (
+                int(spare * duration / remaining_duration)
+                if remaining_duration > 0
+                else spare
+            )
+
+            plan = self.__choose(
+                episode_id, duration, share, choices, texts[episode_id]
+            )
+            plans.append(plan)
+
+            remaining_budget -= plan.size
+            remaining_duration -= duration
+
+        return plans
+
+    def __get_options(
+        self,
+        episode_id: str,
+        audio_languages: list[Language],
+        texts: list[TextStream],
+    ) -> list[tuple[int, VideoStream | None, list[AudioStream]]]:
+        # Every combination worth considering with its size, smallest first
+        videos: list[VideoStream | None] = list(
+            self.__catalog.get_video_streams(episode_id)
+        ) or [None]
+        audio_levels = self.__get_audio_levels(episode_id, audio_languages)
+
+        server_manifest = self.__manifests.get(episode_id, ManifestType.Server)
+
+        if not isinstance(server_manifest, ServerManifest):
+            raise TypeError(
+                f"Expected ServerManifest for episode {episode_id}, got {type(server_manifest)}"
+            )
+
+        streams = [v for v in videos if v is not None]
+        streams += [a for level in audio_levels for a in level]
+        streams += texts
+        sizes = self.__get_sizes(episode_id, server_manifest, set(streams))
+        self.__manifests.release_unless_next(episode_id)
+
+        text_size = sum(sizes[t] for t in texts)
+        options = [
+            (
+                text_size
+                + (sizes[video] if video is not None else 0)
+                + sum(sizes[a] for a in level),
+                video,
+                level,
+            )
+            for video in videos
+            for level in audio_levels
+        ]
+
+        # Sort is stable, so equal sizes keep the lower video bitrate first
+        return sorted(options, key=lambda option: option[0])
+
+    def __get_audio_levels(
+        self, episode_id: str, audio_languages: list[Language]
+    ) -> list[list[AudioStream]]:
+        # One audio track per language, every language at the highest bitrate
+        # up to the level (or its lowest one), lowest level first
+        by_language = [
+            streams
+            for language in audio_languages
+            if (streams := self.__catalog.get_audio_streams(episode_id, language))
+        ]
+        bitrates = sorted({a.bitrate for streams in by_language for a in streams})
+        levels: list[list[AudioStream]] = []
+
+        for bitrate in bitrates:
+            level = [
+                next(
+                    (a for a in reversed(streams) if a.bitrate <= bitrate),
+                    streams[0],
+                )
+                for streams in by_language
+            ]
+
+            if not levels or levels[-1] != level:
+                levels.append(level)
+
+        return levels or [[]]
+
+    def __get_sizes(
+        self,
+        episode_id: str,
+        server_manifest: ServerManifest,
+        streams: set[VideoStream | AudioStream | TextStream],
+    ) -> dict[VideoStream | AudioStream | TextStream, int]:
+        duration = self.__catalog.get_duration(episode_id)
+        urls = {}
+
+        for stream in streams:
+            server_stream = server_manifest.resolve_stream(stream)
+
+            if server_stream is not None:
+                urls[stream] = self.__video_list.get_media_url(
+                    episode_id, server_stream.attributes.get("src")
+                )
+
+        def get_size(stream) -> int:
+            if stream in urls:
+                try:
+                    return self.__get_media_size(urls[stream])
+                except (HTTPStatusError, TransportError, KeyError, ValueError):
+                    pass
+
+            # Server doesn't tell, estimate from the bitrate
+            return int(stream.bitrate * duration / 8)
+
+        with ThreadPoolExecutor(
+            max_workers=MAX_CONNECTIONS, thread_name_prefix="budget"
+        ) as executor:
+            return dict(zip(streams, executor.map(get_size, streams)))
+
+    def __choose(
+        self,
+        episode_id: str,
+        duration: float,
+        share: int,
+        options: list[tuple[int, VideoStream | None, list[AudioStream]]],
+        texts: list[TextStream],
+    ) -> EpisodePlan:
+        # Best video first, then the best audio that still fits along with it.
+        # Share is never below the smallest option, so one always fits.
+        def quality(option):
+            _, video, audio = option
+            return (video.bitrate if video else 0, sum(a.bitrate for a in audio))
+
+        chosen = max((o for o in options if o[0] <= share), key=quality)
+        size, video, audio = chosen
+
+        better_video = [o for o in options if quality(o)[0] > quality(chosen)[0]]
+        better_audio = [
+            o for o in options if o[1] == video and quality(o) > quality(chosen)
+        ]
+
+        if better_video:
+            better_size, better, _ = min(better_video, key=lambda o: o[0])
+            reason = f"{better.height}p needs {format_size(better_size)}, {format_size(share)} available"
+        elif better_audio:
+            better_size, _, better = min(better_audio, key=lambda o: o[0])
+            reason = f"{sum(a.bitrate for a in better) // 1000} kbps audio needs {format_size(better_size)}, {format_size(share)} available"
+        else:
+            reason = "best available"
+
+        return EpisodePlan(
+            episode_id=episode_id,
+            duration=duration,
+            share=share,
+            size=size,
+            video=[video] if video is not None else [],
+            audio=audio,
+            text=texts,
+            reason=reason,
+        )
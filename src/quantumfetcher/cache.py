@@ -0,0 +1,105 @@
+import hashlib
+import json
+import os
+import struct
+import uuid
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, BinaryIO
+
+ENTRY_HEADER = struct.Struct(">I")
+
+
+def write_entry_header(f: BinaryIO, metadata: dict[str, Any]):
+    data = json.dumps(metadata).encode()
+    f.write(ENTRY_HEADER.pack(len(data)))
+    f.write(data)
+
+
+def read_entry_header(f: BinaryIO) -> tuple[dict[str, Any], int]:
+    (length,) = ENTRY_HEADER.unpack(f.read(ENTRY_HEADER.size))
+    return json.loads(f.read(length)), ENTRY_HEADER.size + length
+
+
+# Entries are files named after the hash of their key, a small JSON header
+# followed by the body. Least recently used entries are evicted once the
+# total size goes over the limit, the order survives restarts through the
+# modification time that is refreshed on every hit.
+class DiskCache:
+
+    def __init__(self, path: Path, max_size: int):
+        self.__path = path
+        self.__max_size = max_size
+        self.__entries: OrderedDict[str, int] = OrderedDict()
+        self.__size = 0
+
+        self.__path.mkdir(parents=True, exist_ok=True)
+
+        for temp_path in self.__path.glob("*.tmp"):
+            # Left behind by an interrupted fetch
+            temp_path.unlink(missing_ok=True)
+
+        entries = [(p.stat(), p) for p in self.__path.glob("*.entry")]
+
+        for stat, entry_path in sorted(entries, key=lambda e: e[0].st_mtime):
+            self.__entries[entry_path.stem] = stat.st_size
+            self.__size += stat.st_size
+
+        self.__evict()
+
+    @property
+    def size(self) -> int:
+        return self.__size
+
+    def __get_entry_path(self, name: str) -> Path:
+        return self.__path / f"{name}.entry"
+
+    def __get_name(self, key: str) -> str:
+        return hashlib.sha256(key.encode()).hexdigest()
+
+    def get(self, key: str) -> Path | None:
+        name = self.__get_name(key)
+
+        if name not in self.__entries:
+            return None
+
+        self.__entries.move_to_end(name)
+        entry_path = self.__get_entry_path(name)
+
+        try:
+            os.utime(entry_path)
+        except FileNotFoundError:
+            self.__size -= self.__entries.pop(name)
+            return None
+
+        return entry_path
+
+    def get_temp_path(self) -> Path:
+        return self.__path / f"{uuid.uuid4().hex}.tmp"
+
+    def add(self, key: str, temp_path: Path) -> Path:
+        name = self.__get_name(key)
+        entry_path = self.__get_entry_path(name)
+
+        os.replace(temp_path, entry_path)
+
+        self.__size -= self.__entries.pop(name, 0)
+        self.__entries[name] = entry_path.stat().st_size
+        self.__size += self.__entries[name]
+
+        self.__evict()
+
+        return entry_path
+
+    def __evict(self):
+        # The newest entry always stays, even if it's bigger than the limit
+        while self.__size > self.__max_size and len(self.__entries) > 1:
+            name, size = self.__entries.popitem(last=False)
+            self.__size -= size
+
+            try:
+                self.__get_entry_path(name).unlink(missing_ok=True)
+            except OSError:
+                # Still open by a client on Windows, it's gone from the index
+                # anyway and will be picked up again on the next start
+                pass
@@ -0,0 +1,162 @@
+import operator
+from bisect import bisect_left, bisect_right
+
+from quantumfetcher.dataclasses.stream_audio import AudioStream
+from quantumfetcher.dataclasses.stream_text import TextStream
+from quantumfetcher.dataclasses.stream_video import VideoStream
+from quantumfetcher.enumerators.language import Language
+from quantumfetcher.enumerators.type_manifest import ManifestType
+from quantumfetcher.enumerators.type_stream import StreamType
+from quantumfetcher.manifests.client import ClientManifest
+from quantumfetcher.manifests.store import ManifestStore
+
+
+# Streams of all episodes listed once, with per episode indexes by type,
+# language and bitrate, so selecting what to download never rescans manifests.
+# Indexed client manifests are released right away, except for the first
+# episodes the download starts with.
+class StreamCatalog:
+
+    def __init__(self, manifests: ManifestStore):
+        self.__manifests = manifests
+        self.__video: dict[str, tuple[list[int], list[VideoStream]]] = {}
+        self.__audio: dict[str, dict[Language, tuple[list[int], list[AudioStream]]]] = (
+            {}
+        )
+        self.__text: dict[str, dict[Language, TextStream]] = {}
+        self.__chunks: dict[str, dict[StreamType, int]] = {}
+        self.__durations: dict[str, float] = {}
+
+        self.__video_set: set[VideoStream] = set()
+        self.__audio_set: set[AudioStream] = set()
+        self.__text_set: set[TextStream] = set()
+
+    def add_episode(self, episode_id: str):
+        manifest = self.__manifests.get(episode_id, ManifestType.Client)
+
+        if not isinstance(manifest, ClientManifest):
+            raise TypeError(
+                f"Expected ClientManifest for episode {episode_id}, got {type(manifest)}"
+            )
+
+        video_streams = manifest.list_video_streams()
+        audio_streams = manifest.list_audio_streams()
+        text_streams = manifest.list_text_streams()
+
+        self.__index_episode(episode_id, video_streams, audio_streams, text_streams)
+        self.__chunks[episode_id] = {
+            stream_type: manifest.get_chunks_count(stream_type)
+            for stream_type in StreamType
+        }
+        self.__durations[episode_id] = manifest.get_duration()
+        self.__manifests.release_unless_next(episode_id)
+
+        # 4K test episode has streams no other episode has, don't offer them
+        # unless it's the only one selected
+        if episode_id == "J1 - 4K Test" and len(self.__manifests.episodes) != 1:
+            return
+
+        self.__video_set.update(video_streams)
+        self.__audio_set.update(audio_streams)
+        self.__text_set.update(text_streams)
+
+    def __index_episode(self, episode_id, video_streams, audio_streams, text_streams):
+        # Sort is stable, so equal bitrates keep manifest order
+        video_streams = sorted(video_streams, key=operator.attrgetter("bitrate"))
+        self.__video[episode_id] = ([v.bitrate for v in video_streams], video_streams)
+
+        audio_by_language: dict[Language, list[AudioStream]] = {}
+        for a in sorted(audio_streams, key=operator.attrgetter("bitrate")):
+            audio_by_language.setdefault(a.language, []).append(a)
+
+        self.__audio[episode_id] = {
+            language: ([a.bitrate for a in streams], streams)
+            for language, streams in audio_by_language.items()
+        }
+
+        self.__text[episode_id] = {}
+        for t in text_streams:
+            self.__text[episode_id].setdefault(t.language, t)
+
+    @staticmethod
+    def __get_closest_lte(index, bitrate):
+        bitrates, streams = index
+
+        position = bisect_right(bitrates, bitrate)
+        if position == 0:
+            return None
+
+        # First stream in manifest order having the closest bitrate
+        return streams[bisect_left(bitrates, bitrates[position - 1])]
+
+    @property
+    def qualities(self) -> dict[StreamType, list]:
+        return {
+            StreamType.Video: sorted(
+                self.__video_set, key=operator.attrgetter("bitrate"), reverse=True
+            ),
+            StreamType.Audio: sorted(
+                self.__audio_set, key=lambda x: (x.language.name, -x.bitrate)
+            ),
+            StreamType.Text: sorted(
+                self.__text_set, key=lambda x: (x.language.name, -x.bitrate)
+            ),
+        }
+
+    def get_chunks_count(self, episode_id: str, stream_type: StreamType) -> int:
+        return self.__chunks[episode_id][stream_type]
+
+    def get_duration(self, episode_id: str) -> float:
+        return self.__durations[episode_id]
+
+    def get_video_streams(self, episode_id: str) -> list[VideoStream]:
+        # Lowest bitrate first
+        return list(self.__video[episode_id][1])
+
+    def get_audio_streams(
+        self, episode_id: str, language: Language
+    ) -> list[AudioStream]:
+        # Lowest bitrate first
+        return list(self.__audio[episode_id].get(language, ([], []))[1])
+
+    def select(
+        self,
+        episode_id: str,
+        video_streams: list[VideoStream],
+        audio_streams: list[AudioStream],
+        text_streams: list[TextStream],
+    ) -> dict[StreamType, list]:
+        selected_video = []
+        for target in [v.bitrate for v in video_streams]:
+            best = self.__get_closest_lte(self.__video[episode_id], target)
+
+            if best is not None and best not in selected_video:
+                selected_video.append(best)
+
+        # Each wanted language is matched against every wanted audio bitrate
+        selected_audio = []
+        wanted_bitrates = [a.bitrate for a in audio_streams]
+        for language in [a.language for a in audio_streams]:
+            index = self.__audio[episode_id].get(language)
+
+            if index is None:
+                continue
+
+            for target in wanted_bitrates:
+                best = self.__get_closest_lte(index, target)
+
+                if best is not None and best not in selected_audio:
+                    selected_audio.append(best)
+
+        selected_text = []
+        for language in [t.language for t in text_streams]:
+            best = self.__text[episode_id].get(language)
+
+            if best is not None and best not in selected_text:
+                selected_text.append(best)
+
+        return {
+            StreamType.Video: selected_video,
+            StreamType.Audio: selected_audio,
+            StreamType.Text: selected_text,
+        }
@@ -0,0 +1,114 @@
+import threading
+import time
+
+from quantumfetcher.constants import (
+    CONCURRENCY_WINDOW,
+    INITIAL_CONNECTIONS,
+    MAX_CONNECTIONS,
+)
+
+# Throughput has to grow by this much for another connection to be worth it
+THROUGHPUT_GAIN = 1.05
+# Time to first byte this many times the lowest seen means queues are building up
+LATENCY_BACKOFF = 2.0
+
+
+# Number of range requests kept in flight, tuned by additive increase and
+# multiplicative decrease. Completed requests are measured in windows of at
+# least CONCURRENCY_WINDOW seconds: while every window is faster than the one
+# before, one more connection is allowed. Errors, throttling responses and
+# time to first byte climbing well above the lowest seen halve the limit,
+# at most once per window so a burst of failures counts only once.
+class ConcurrencyController:
+
+    def __init__(
+        self,
+        maximum: int = MAX_CONNECTIONS,
+        initial: int = INITIAL_CONNECTIONS,
+        minimum: int = 1,
+    ):
+        self.__minimum = max(1, minimum)
+        self.__maximum = max(self.__minimum, maximum)
+        self.__limit = min(max(initial, self.__minimum), self.__maximum)
+        self.__peak = self.__limit
+        self.__backoffs = 0
+
+        self.__lock = threading.Lock()
+        self.__window_start = time.monotonic()
+        self.__window_bytes = 0
+        self.__window_requests = 0
+        self.__window_latency = 0.0
+        self.__last_throughput = 0.0
+        self.__best_latency: float | None = None
+        self.__last_backoff = 0.0
+
+    @property
+    def limit(self) -> int:
+        return self.__limit
+
+    @property
+    def maximum(self) -> int:
+        return self.__maximum
+
+    @property
+    def peak(self) -> int:
+        return self.__peak
+
+    @property
+    def backoffs(self) -> int:
+        return self.__backoffs
+
+    def on_success(self, size: int, latency: float):
+        with self.__lock:
+            self.__window_bytes += size
+            self.__window_requests += 1
+            self.__window_latency += latency
+
+            now = time.monotonic()
+            elapsed = now - self.__window_start
+
+            if elapsed < CONCURRENCY_WINDOW or self.__window_requests < self.__limit:
+                return
+
+            throughput = self.__window_bytes / elapsed
+            latency = self.__window_latency / self.__window_requests
+
+            if (
+                self.__best_latency is None
+                or latency < self.__best_latency
+                or self.__limit == self.__minimum
+            ):
+                # With nothing left to back off from, the path itself got slower
+                self.__best_latency = latency
+
+            if latency > self.__best_latency * LATENCY_BACKOFF:
+                self.__decrease(now)
+            elif throughput > self.__last_throughput * THROUGHPUT_GAIN:
+                self.__limit = min(self.__limit + 1, self.__maximum)
+                self.__peak = max(self.__peak, self.__limit)
+
+            self.__last_throughput = throughput
+            self.__reset_window(now)
+
+    def on_error(self):
+        # Connection errors and 429/503 responses
+        with self.__lock:
+            now = time.monotonic()
+            self.__decrease(now)
+            self.__reset_window(now)
+
+    def __decrease(self, now: float):
+        if now - self.__last_backoff < CONCURRENCY_WINDOW:
+            return
+
+        self.__limit = max(self.__limit // 2, self.__minimum)
+        self.__last_backoff = now
+        self.__backoffs += 1
+        # Fewer connections are slower, growth starts over from the new limit
+        self.__last_throughput = 0.0
+
+    def __reset_window(self, now: float):
+        self.__window_start = now
+        self.__window_bytes = 0
+        self.__window_requests = 0
+        self.__window_latency = 0.0
@@ -1,4 +1,15 @@
 CHUNK_SIZE = 1024 * 1024  # 1 MiB
+READ_SIZE = 64 * 1024  # 64 KiB
+WRITE_BLOCK_SIZE = 4 * 1024 * 1024  # 4 MiB
+WRITE_BUFFERS = 8
+PLAY_ORDER_WRITE_BUFFERS = 2  # Per track, all of them are written at once
+PARTIAL_MANIFEST_INTERVAL = 5  # seconds
+PIPELINE_DEPTH = 1  # Episodes waiting between stages
+PROXY_PREFETCH_BLOCKS = 4
+INITIAL_CONNECTIONS = 4
+MAX_CONNECTIONS = 16
+CONCURRENCY_WINDOW = 1  # seconds
+MANIFEST_CACHE_TTL = 24 * 60 * 60  # seconds before a snapshot is revalidated
 
 # fmt: off
 RMDJ_ENCRYPTION_KEY = [
@@ -0,0 +1,80 @@
+import sqlite3
+from pathlib import Path
+
+from quantumfetcher.dataclasses.subtitle_segment import SubtitleSegment
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS segments (
+    episode TEXT NOT NULL,
+    language TEXT NOT NULL,
+    track TEXT NOT NULL,
+    segment_id INTEGER NOT NULL,
+    start_time INTEGER,
+    text TEXT NOT NULL,
+    PRIMARY KEY (episode, track, segment_id)
+);
+
+CREATE VIRTUAL TABLE IF NOT EXISTS segments_fts USING fts5(
+    text,
+    content='segments',
+    tokenize='unicode61 remove_diacritics 2'
+);
+
+CREATE TRIGGER IF NOT EXISTS segments_ai AFTER INSERT ON segments BEGIN
+    INSERT INTO segments_fts(rowid, text) VALUES (new.rowid, new.text);
+END;
+
+CREATE TRIGGER IF NOT EXISTS segments_ad AFTER DELETE ON segments BEGIN
+    INSERT INTO segments_fts(segments_fts, rowid, text)
+    VALUES ('delete', old.rowid, old.text);
+END;
+"""
+
+
+# All extracted segments of the library in a single SQLite database,
+# segments_fts is an external content full-text index over their text
+# kept in sync by triggers, so a track can be replaced without a rebuild
+class SubtitleCorpus:
+
+    def __init__(self, path: Path):
+        path.parent.mkdir(parents=True, exist_ok=True)
+
+        self.__connection = sqlite3.connect(path)
+
+        try:
+            self.__connection.executescript(SCHEMA)
+        except sqlite3.OperationalError as e:
+            self.__connection.close()
+            raise ValueError(
+                f"Cannot create subtitle database {path}, SQLite with FTS5 support is required ({e})."
+            )
+
+    def add_track(
+        self,
+        episode_id: str,
+        language: str,
+        track_name: str,
+        segments: list[SubtitleSegment],
+    ):
+        with self.__connection:
+            self.__connection.execute(
+                "DELETE FROM segments WHERE episode = ? AND track = ?",
+                (episode_id, track_name),
+            )
+            self.__connection.executemany(
+                "INSERT INTO segments VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    (
+                        episode_id,
+                        language,
+                        track_name,
+                        segment_id,
+                        segment.start,
+                        segment.text,
+                    )
+                    for segment_id, segment in enumerate(segments)
+                ),
+            )
+
+    def close(self):
+        self.__connection.close()
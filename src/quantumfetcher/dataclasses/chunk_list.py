@@ -0,0 +1,54 @@
+from array import array
+from dataclasses import dataclass, field
+from typing import Iterator
+
+
+# Chunks are kept as runs of equal durations (like the Smooth Streaming "r"
+# attribute does), so long manifests take a few typed arrays instead of
+# thousands of Python ints, and run-length encoded manifests never get expanded
+@dataclass(slots=True)
+class ChunkList:
+    starts: array = field(default_factory=lambda: array("Q"))
+    durations: array = field(default_factory=lambda: array("Q"))
+    repeats: array = field(default_factory=lambda: array("I"))
+    count: int = 0
+    end: int = 0
+
+    def append(self, duration: int, repeat: int = 1, start: int | None = None):
+        if repeat < 1:
+            raise ValueError(f"Invalid chunk repeat count: {repeat}")
+
+        if start is None:
+            start = self.end
+
+        if start == self.end and self.count and self.durations[-1] == duration:
+            self.repeats[-1] += repeat
+        else:
+            self.starts.append(start)
+            self.durations.append(duration)
+            self.repeats.append(repeat)
+
+        self.count += repeat
+        self.end = start + duration * repeat
+
+    def runs(self) -> Iterator[tuple[int, int, int]]:
+        return zip(self.starts, self.durations, self.repeats)
+
+    def head(self, count: int) -> "ChunkList":
+        chunks = ChunkList()
+
+        for start, duration, repeat in self.runs():
+            if chunks.count >= count:
+                break
+
+            chunks.append(duration, min(repeat, count - chunks.count), start)
+
+        return chunks
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __iter__(self) -> Iterator[int]:
+        for _, duration, repeat in self.runs():
+            for _ in range(repeat):
+                yield duration
@@ -0,0 +1,22 @@
+from dataclasses import dataclass
+from pathlib import Path
+
+from quantumfetcher.dataclasses.stream import ServerStream
+from quantumfetcher.dataclasses.stream_audio import AudioStream
+from quantumfetcher.dataclasses.stream_text import TextStream
+from quantumfetcher.dataclasses.stream_video import VideoStream
+from quantumfetcher.enumerators.type_stream import StreamType
+from quantumfetcher.manifests.client import ClientManifest
+from quantumfetcher.manifests.server import ServerManifest
+
+
+@dataclass(frozen=True)
+class EpisodeJob:
+    episode_id: str
+    episode_path: Path
+    client_manifest: ClientManifest
+    server_manifest: ServerManifest
+    client_manifest_path: str
+    streams: list[VideoStream | AudioStream | TextStream]
+    server_streams: list[ServerStream | None]
+    chunks: dict[StreamType, int]
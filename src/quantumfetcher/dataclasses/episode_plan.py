@@ -0,0 +1,26 @@
+from dataclasses import dataclass
+
+from quantumfetcher.dataclasses.stream_audio import AudioStream
+from quantumfetcher.dataclasses.stream_text import TextStream
+from quantumfetcher.dataclasses.stream_video import VideoStream
+from quantumfetcher.enumerators.type_stream import StreamType
+
+
+@dataclass(frozen=True)
+class EpisodePlan:
+    episode_id: str
+    duration: float
+    share: int
+    size: int
+    video: list[VideoStream]
+    audio: list[AudioStream]
+    text: list[TextStream]
+    reason: str
+
+    @property
+    def streams(self) -> dict[StreamType, list]:
+        return {
+            StreamType.Video: self.video,
+            StreamType.Audio: self.audio,
+            StreamType.Text: self.text,
+        }
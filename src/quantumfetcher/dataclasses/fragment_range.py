@@ -0,0 +1,13 @@
+from dataclasses import dataclass
+
+
+@dataclass(frozen=True)
+class FragmentRange:
+    track: int
+    time: int
+    start: int
+    end: int
+
+    @property
+    def size(self) -> int:
+        return self.end - self.start
@@ -0,0 +1,20 @@
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from quantumfetcher.dataclasses.stream_audio import AudioStream
+from quantumfetcher.dataclasses.stream_text import TextStream
+from quantumfetcher.dataclasses.stream_video import VideoStream
+from quantumfetcher.manifests.client import ClientManifest
+from quantumfetcher.manifests.server import ServerManifest
+from quantumfetcher.mp4 import FragmentScanner
+
+
+@dataclass
+class PartialEpisode:
+    client_manifest: ClientManifest
+    server_manifest: ServerManifest
+    client_manifest_path: Path
+    server_manifest_path: Path
+    files: dict[VideoStream | AudioStream | TextStream, Path]
+    scanners: dict[Path, FragmentScanner] = field(default_factory=dict)
+    saved_at: float = 0.0
@@ -0,0 +1,26 @@
+from dataclasses import dataclass
+
+
+@dataclass(slots=True)
+class QualityLevel:
+    attributes: dict[str, str]
+    bitrate: int
+    codec: str
+    width: int
+    height: int
+    samplingRate: int
+    channels: int
+    bitsPerSample: int
+
+    @classmethod
+    def from_attributes(cls, attributes: dict[str, str]) -> "QualityLevel":
+        return cls(
+            attributes=attributes,
+            bitrate=int(attributes.get("Bitrate", -1)),
+            codec=attributes.get("FourCC", ""),
+            width=int(attributes.get("MaxWidth", -1)),
+            height=int(attributes.get("MaxHeight", -1)),
+            samplingRate=int(attributes.get("SamplingRate", -1)),
+            channels=int(attributes.get("Channels", -1)),
+            bitsPerSample=int(attributes.get("BitsPerSample", -1)),
+        )
@@ -0,0 +1,11 @@
+from dataclasses import dataclass, field
+from pathlib import Path
+
+
+@dataclass
+class ServedEpisode:
+    episode_id: str
+    server_manifest: Path
+    client_manifest: Path
+    files: dict[str, Path] = field(default_factory=dict)
+    tracks: dict[tuple[str, str], Path] = field(default_factory=dict)
@@ -1,5 +1,7 @@
 from dataclasses import dataclass
 
+from quantumfetcher.dataclasses.chunk_list import ChunkList
+from quantumfetcher.dataclasses.quality_level import QualityLevel
 from quantumfetcher.enumerators.type_stream import StreamType
 
 
@@ -11,8 +13,8 @@ class StreamBase:
 
 @dataclass
 class ClientStream(StreamBase):
-    qualityLevels: list[dict[str, str]]
-    chunks: list[int]
+    qualityLevels: list[QualityLevel]
+    chunks: ChunkList
 
 
 @dataclass
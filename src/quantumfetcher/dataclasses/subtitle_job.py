@@ -0,0 +1,11 @@
+from dataclasses import dataclass
+from pathlib import Path
+
+
+@dataclass(frozen=True)
+class SubtitleJob:
+    episode_id: str
+    subtitle_path: Path
+    episode_num: int
+    track_name: str
+    language: str
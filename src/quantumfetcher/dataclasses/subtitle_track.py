@@ -0,0 +1,9 @@
+from dataclasses import dataclass
+
+from quantumfetcher.dataclasses.subtitle_segment import SubtitleSegment
+
+
+@dataclass(frozen=True)
+class SubtitleTrack:
+    segments: list[SubtitleSegment]
+    skipped: list[str]
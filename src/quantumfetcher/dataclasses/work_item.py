@@ -0,0 +1,17 @@
+from dataclasses import dataclass
+
+
+@dataclass(frozen=True)
+class WorkItem:
+    episode_id: str
+    filename: str
+    start: int
+    end: int
+
+    @property
+    def name(self) -> str:
+        return f"{self.episode_id}/{self.filename}.{self.start}-{self.end}"
+
+    @property
+    def size(self) -> int:
+        return self.end - self.start
@@ -1,11 +1,15 @@
+import os
 import re
+import shutil
+import threading
 import time
+from collections import deque
+from concurrent.futures import CancelledError, Future, ThreadPoolExecutor
+from contextlib import AbstractContextManager, ExitStack, nullcontext
 from math import ceil
 from pathlib import Path
+from typing import Iterator
 
-import requests
-from requests.adapters import HTTPAdapter, Retry
-from requests.exceptions import ChunkedEncodingError
 from rich.console import Group
 from rich.live import Live
 from rich.progress import (
@@ -21,17 +25,49 @@ from rich.progress import (
     TransferSpeedColumn,
 )
 
-from quantumfetcher.constants import CHUNK_SIZE, USER_AGENT
+from quantumfetcher.catalog import StreamCatalog
+from quantumfetcher.concurrency import ConcurrencyController
+from quantumfetcher.constants import (
+    CHUNK_SIZE,
+    MAX_CONNECTIONS,
+    PARTIAL_MANIFEST_INTERVAL,
+    PLAY_ORDER_WRITE_BUFFERS,
+    READ_SIZE,
+)
+from quantumfetcher.corpus import SubtitleCorpus
+from quantumfetcher.dataclasses.episode_job import EpisodeJob
+from quantumfetcher.dataclasses.fragment_range import FragmentRange
+from quantumfetcher.dataclasses.partial_episode import PartialEpisode
+from quantumfetcher.dataclasses.stream import ServerStream
 from quantumfetcher.dataclasses.stream_audio import AudioStream
 from quantumfetcher.dataclasses.stream_text import TextStream
 from quantumfetcher.dataclasses.stream_video import VideoStream
+from quantumfetcher.dataclasses.subtitle_job import SubtitleJob
+from quantumfetcher.dataclasses.subtitle_track import SubtitleTrack
+from quantumfetcher.dataclasses.work_item import WorkItem
+from quantumfetcher.enumerators.policy_fsync import FsyncPolicy
 from quantumfetcher.enumerators.type_manifest import ManifestType
 from quantumfetcher.enumerators.type_stream import StreamType
+from quantumfetcher.enumerators.type_transport import TransportType
+from quantumfetcher.extractor import SubtitleExtractor
+from quantumfetcher.lease import LeaseManager
 from quantumfetcher.manifests.base import BaseManifest
 from quantumfetcher.manifests.client import ClientManifest
 from quantumfetcher.manifests.server import ServerManifest
-from quantumfetcher.subtitles import extract_subtitles
+from quantumfetcher.manifests.snapshot import SnapshotCache
+from quantumfetcher.manifests.store import ManifestStore
+from quantumfetcher.mp4 import FragmentScanner, get_fragment_offsets, get_mfra_size
+from quantumfetcher.pipeline import Stage
+from quantumfetcher.storage import StoragePool
+from quantumfetcher.subtitles import SubtitleStreamParser
+from quantumfetcher.transports.base import (
+    BaseTransport,
+    HTTPStatusError,
+    TransportError,
+    create_transport,
+)
 from quantumfetcher.video_list import VideoList
+from quantumfetcher.writer import MediaWriter, read_progress
 
 
 class Downloader:
@@ -68,84 +104,283 @@ class Downloader:
 
     __progress_group = Group(__progress_overall, __progress_stream, __progress_media)
 
-    def __init__(self):
-        self.__session = requests.Session()
-        self.__session.headers.update({"User-Agent": USER_AGENT})
+    def __init__(
+        self,
+        manifest_cache: SnapshotCache | None = None,
+        share: bool = False,
+        fsync_policy: FsyncPolicy = FsyncPolicy.Never,
+        transport: BaseTransport | None = None,
+        max_connections: int = MAX_CONNECTIONS,
+        storage: StoragePool | None = None,
+    ):
+        self.__manifest_cache = manifest_cache
+        self.__fsync_policy = fsync_policy
+        self.__storage = storage
+
+        # When one downloader serves several targets, parsed manifests and
+        # finished media files are kept so that every one is fetched only once
+        self.__share = share
+        self.__shared_manifests: dict[tuple[ManifestType, str], BaseManifest] = {}
+        self.__shared_manifests_lock = threading.Lock()
+        self.__shared_media: dict[str, Path] = {}
+        # Server manifest URL of the episode every shared media file is from
+        self.__shared_media_episodes: dict[str, str] = {}
+
+        self.__transport = transport or create_transport(
+            TransportType.Requests, max_connections
+        )
+        self.__concurrency = ConcurrencyController(max_connections)
 
-        retries = Retry(total=10, backoff_factor=3)
+    def __fetch_file(self, url: str) -> str:
+        return self.__transport.get(url, {"Accept-Encoding": "deflate"}).decode()
 
-        self.__session.mount("http://", HTTPAdapter(max_retries=retries))
+    def fetch_manifest(
+        self, manifest_type: ManifestType, manifest_url: str
+    ) -> BaseManifest:
+        if not self.__share:
+            return self.__fetch_manifest(manifest_type, manifest_url)
 
-    def __fetch_file(self, url: str) -> str:
-        headers = self.__session.headers.copy()  # type: ignore
-        headers["Accept-Encoding"] = "deflate"
+        key = (manifest_type, manifest_url)
 
-        r = requests.get(url, headers=headers)
-        r.raise_for_status()
+        with self.__shared_manifests_lock:
+            if key not in self.__shared_manifests:
+                self.__shared_manifests[key] = self.__fetch_manifest(
+                    manifest_type, manifest_url
+                )
 
-        return r.content.decode()
+            return self.__shared_manifests[key]
+
+    def release_shared(self, manifest_urls: set[str]):
+        # Manifests and media files of episodes whose client or server
+        # manifest isn't listed are let go, nothing will reuse them anymore
+        with self.__shared_manifests_lock:
+            for key in list(self.__shared_manifests):
+                if key[1] not in manifest_urls:
+                    del self.__shared_manifests[key]
+
+        for media_url, manifest_url in list(self.__shared_media_episodes.items()):
+            if manifest_url not in manifest_urls:
+                self.__shared_media.pop(media_url, None)
+                del self.__shared_media_episodes[media_url]
+
+    def __share_media(self, episode_id: str, media_url: str):
+        if self.__share:
+            self.__shared_media_episodes[media_url] = (
+                self.__video_list.get_server_manifest_url(episode_id)
+            )
 
-    def fetch_manifest(
+    def __fetch_manifest(
         self, manifest_type: ManifestType, manifest_url: str
     ) -> BaseManifest:
+        if self.__manifest_cache:
+            # Server is only asked about snapshots older than the cache ttl
+            manifest = self.__manifest_cache.load(
+                manifest_type,
+                manifest_url,
+                lambda: self.__get_validators(manifest_url),
+            )
+
+            if manifest is not None:
+                return manifest
+
+            # Asked before the manifest is fetched, if it changes in between
+            # the snapshot is just fetched again next time
+            validators = self.__get_validators(manifest_url)
+
         content = self.__fetch_file(manifest_url)
 
         match manifest_type:
             case ManifestType.Client:
-                return ClientManifest(content)
+                manifest = ClientManifest(content)
             case ManifestType.Server:
-                return ServerManifest(content)
+                manifest = ServerManifest(content)
+
+        if self.__manifest_cache:
+            self.__manifest_cache.save(
+                manifest_type, manifest_url, manifest, validators
+            )
+
+        return manifest
+
+    def __get_validators(self, manifest_url: str) -> dict[str, str] | None:
+        # HEAD is much cheaper than fetching and parsing the manifest again
+        try:
+            headers = self.__transport.head(manifest_url)
+        except HTTPStatusError:
+            # Server doesn't answer HEAD, snapshot just expires by age
+            return {}
+        except TransportError:
+            return None
+
+        return {
+            name: headers[name] for name in ("etag", "last-modified") if name in headers
+        }
+
+    def get_media_size(self, media_url: str) -> int:
+        return self.__transport.get_content_length(media_url)
 
     def download(
         self,
         video_list: VideoList,
-        manifests: dict[str, dict[ManifestType, BaseManifest]],
+        manifests: ManifestStore,
+        catalog: StreamCatalog,
         episodes_path: Path,
         video_streams: list,
         audio_streams: list,
         text_streams: list,
         extract_subtitles: bool,
+        lease_manager: LeaseManager | None = None,
+        compact_manifests: bool = False,
+        subtitle_corpus: SubtitleCorpus | None = None,
+        progressive: bool = False,
+        partial_manifests: bool = False,
+        episode_streams: dict[str, dict[StreamType, list]] | None = None,
     ):
         self.__video_list = video_list
         self.__manifests = manifests
+        self.__catalog = catalog
         self.__download_path = episodes_path
         self.__streams_video = video_streams
         self.__streams_audio = audio_streams
         self.__streams_text = text_streams
+        self.__episode_streams = episode_streams or {}
         self.__extract_subtitles = extract_subtitles
+        self.__lease_manager = lease_manager
+        self.__compact_manifests = compact_manifests
+        self.__subtitle_corpus = subtitle_corpus
+        self.__progressive = progressive
+        self.__downloaded_in_order: set[Path] = set()
+        self.__partial_manifests = partial_manifests
+        self.__partial_episode: PartialEpisode | None = None
+        self.__subtitle_extractor = SubtitleExtractor()
+        self.__downloaded_bytes = 0
+        self.__range_pool = ThreadPoolExecutor(
+            max_workers=self.__concurrency.maximum, thread_name_prefix="range"
+        )
+        self.__stopped = threading.Event()
+        started = time.monotonic()
 
         with Live(self.__progress_group, refresh_per_second=10):
-            task_id = self.__progress_overall.add_task(
-                "Downloading episodes...",
-                total=len(manifests),
+            try:
+                self.__download_episodes()
+                self.__wait_for_subtitles()
+            finally:
+                # Ranges already running would keep retrying and the pool's
+                # threads are joined at exit, so they are told to give up first
+                self.__stopped.set()
+                self.__range_pool.shutdown(wait=False, cancel_futures=True)
+                self.__subtitle_extractor.close()
+
+            self.__log_summary(time.monotonic() - started)
+
+        self.__report_subtitle_failures()
+
+    def __log_summary(self, elapsed: float):
+        if not self.__downloaded_bytes:
+            return
+
+        self.__progress_overall.console.log(
+            f"Downloaded {self.__downloaded_bytes / 1024**2:.1f} MiB in {elapsed:.1f}s "
+            f"({self.__downloaded_bytes / 1024**2 / max(elapsed, 1e-3):.1f} MiB/s), "
+            f"{self.__concurrency.limit} concurrent range request(s) "
+            f"(peak {self.__concurrency.peak}, backed off {self.__concurrency.backoffs} time(s))."
+        )
+
+    def __download_episodes(self):
+        # Fetching manifests, resolving streams, downloading and saving
+        # manifests are stages running side by side: the next episode's
+        # server manifest is fetched while this one downloads, client
+        # manifests come from the catalog's store without another request,
+        # and manifests of every episode are let go once it's saved
+        self.__progress_task_id = self.__progress_overall.add_task(
+            "Downloading episodes...",
+            total=len(self.__manifests.episodes),
+        )
+
+        if self.__progressive and self.__lease_manager:
+            self.__progress_overall.console.log(
+                "[yellow]Warning![/yellow] Progressive download is not supported when sharing work with other nodes, downloading file by file."
             )
 
-            for episode_id, _ in manifests.items():
-                self.__download_episode(episode_id)
-                self.__progress_overall.update(task_id, advance=1)
+        if self.__storage and self.__lease_manager:
+            self.__progress_overall.console.log(
+                "[yellow]Warning![/yellow] Storage roots are not supported when sharing work with other nodes, writing to the episodes path."
+            )
+
+        self.__progressive_episode = (
+            self.__manifests.episodes[0]
+            if self.__progressive
+            and self.__manifests.episodes
+            and not self.__lease_manager
+            else None
+        )
+
+        pending_jobs: list[EpisodeJob] = []
 
-    def __get_episode_manifests(
-        self, episode_id
-    ) -> tuple[ClientManifest, ServerManifest]:
-        episode_manifests = self.__manifests[episode_id]
-        client_manifest = episode_manifests[ManifestType.Client]
+        with (
+            ThreadPoolExecutor(max_workers=1, thread_name_prefix="stage-save") as saver,
+            Stage("fetch", self.__fetch_episode, self.__manifests.episodes) as fetched,
+            Stage("resolve", self.__resolve_episode, fetched) as jobs,
+        ):
+            saving: Future | None = None
+
+            for job in jobs:
+                if not self.__download_episode(job):
+                    pending_jobs.append(job)
+                    continue
+
+                if saving is not None:
+                    # Saving never gets more than one episode behind
+                    saving.result()
+
+                saving = saver.submit(self.__save_episode, job)
+
+            if saving is not None:
+                saving.result()
+
+            while pending_jobs:
+                # The rest of the work is leased by other nodes, wait for them
+                # to finish or for their leases to expire so we can take over
+                self.__progress_overall.console.log(
+                    f"Waiting for other nodes to finish {len(pending_jobs)} episode(s)..."
+                )
+                time.sleep(self.__lease_manager.timeout / 4)
+
+                for job in list(pending_jobs):
+                    if self.__download_episode(job):
+                        pending_jobs.remove(job)
+                        self.__save_episode(job)
+
+    def __fetch_episode(
+        self, episode_id: str
+    ) -> tuple[str, ClientManifest, ServerManifest]:
+        client_manifest = self.__manifests.get(episode_id, ManifestType.Client)
 
         if not isinstance(client_manifest, ClientManifest):
             raise TypeError(
                 f"Expected ClientManifest for episode {episode_id}, got {type(client_manifest)}"
             )
 
-        server_manifest = episode_manifests[ManifestType.Server]
+        server_manifest = self.__manifests.get(episode_id, ManifestType.Server)
         if not isinstance(server_manifest, ServerManifest):
             raise TypeError(
                 f"Expected ServerManifest for episode {episode_id}, got {type(server_manifest)}"
             )
 
-        return client_manifest, server_manifest
+        return episode_id, client_manifest, server_manifest
 
-    def __download_episode(self, episode_id):
-        episode_path = self.__download_path / episode_id
-        episode_path.mkdir(exist_ok=True, parents=True)
+    def __resolve_episode(
+        self, fetched: tuple[str, ClientManifest, ServerManifest]
+    ) -> EpisodeJob | None:
+        episode_id, client_manifest, server_manifest = fetched
+        client_manifest_path = server_manifest.get_client_manifest_path()
+
+        if client_manifest_path is None:
+            self.__progress_stream.console.log(
+                f"[red]Error:[/red] Client manifest path not found for episode {episode_id}."
+            )
+            self.__finish_episode(episode_id)
+            return None
 
         media_to_download, chunks_per_type = self.__get_streams_to_fetch(episode_id)
 
@@ -153,210 +388,711 @@ class Downloader:
         for _, streams in media_to_download.items():
             streams_to_download.extend(streams)
 
-        client_manifest, server_manifest = self.__get_episode_manifests(episode_id)
-        client_manifest_path = server_manifest.get_client_manifest_path()
+        episode_path = self.__download_path / episode_id
+        episode_path.mkdir(exist_ok=True, parents=True)
 
-        if client_manifest_path is None:
-            self.__progress_stream.console.log(
-                f"[red]Error:[/red] Client manifest path not found for episode {episode_id}."
-            )
-            return
+        return EpisodeJob(
+            episode_id=episode_id,
+            episode_path=episode_path,
+            client_manifest=client_manifest,
+            server_manifest=server_manifest,
+            client_manifest_path=client_manifest_path,
+            streams=streams_to_download,
+            # Resolve all selected streams against the server manifest at once
+            server_streams=server_manifest.resolve_streams(streams_to_download),
+            chunks=chunks_per_type,
+        )
+
+    def __download_episode(self, job: EpisodeJob) -> bool:
+        # True once the episode is ready to be saved, or when it's
+        # already been saved by another node
+        episode_id = job.episode_id
+        episode_path = job.episode_path
+        finalize_name = f"{episode_id}/finalize"
+
+        if self.__lease_manager and self.__lease_manager.is_done(finalize_name):
+            self.__finish_episode(episode_id)
+            return True
 
         task_id = self.__progress_stream.add_task(
             f"Downloading episode files for {episode_id}...",
-            total=len(streams_to_download),
+            total=len(job.streams),
         )
 
-        for stream in streams_to_download:
+        if self.__partial_manifests and not self.__lease_manager:
+            self.__partial_episode = PartialEpisode(
+                client_manifest=job.client_manifest,
+                server_manifest=job.server_manifest,
+                client_manifest_path=episode_path / job.client_manifest_path,
+                server_manifest_path=episode_path
+                / self.__video_list.get_server_manifest_name(episode_id),
+                files={
+                    stream: episode_path / server_stream.attributes.get("src")
+                    for stream, server_stream in zip(job.streams, job.server_streams)
+                    if server_stream is not None
+                },
+            )
+
+        if episode_id == self.__progressive_episode:
+            self.__download_play_order(
+                episode_id, episode_path, job.streams, job.server_streams
+            )
+
+        episode_complete = True
+
+        for stream, server_stream in zip(job.streams, job.server_streams):
             stream_type = None
             if isinstance(stream, VideoStream):
-                chunks = chunks_per_type[StreamType.Video]
+                chunks = job.chunks[StreamType.Video]
                 stream_type = StreamType.Video
             elif isinstance(stream, AudioStream):
-                chunks = chunks_per_type[StreamType.Audio]
+                chunks = job.chunks[StreamType.Audio]
                 stream_type = StreamType.Audio
             elif isinstance(stream, TextStream):
-                chunks = chunks_per_type[StreamType.Text]
+                chunks = job.chunks[StreamType.Text]
                 stream_type = StreamType.Text
             else:
                 raise TypeError(
                     f"Unknown stream type {type(stream)} for episode {episode_id}."
                 )
 
-            self.__download_stream(
+            if not self.__download_stream(
                 episode_id,
                 episode_path,
                 stream,
+                server_stream,
                 stream_type,
                 chunks,
-            )
+            ):
+                episode_complete = False
 
             self.__progress_stream.update(task_id, advance=1)
+            self.__log_extracted_subtitles()
 
-        client_manifest.save(episode_path / client_manifest_path, streams_to_download)
-        server_manifest.save(
-            episode_path / self.__video_list.get_server_manifest_name(episode_id),
-            streams_to_download,
-        )
+        self.__partial_episode = None
 
         for media_task in self.__progress_media.tasks:
             self.__progress_media.remove_task(media_task.id)
 
         self.__progress_stream.remove_task(task_id)
 
-    def __get_streams_to_fetch(self, episode_id):
-        client_manifest, _ = self.__get_episode_manifests(episode_id)
-
-        media = {}
-        chunks = {}
-
-        def filter_streams(streams, stream_type):
-            filtered_streams = []
-
-            if stream_type == StreamType.Video:
-                wanted_bitrates = [s.bitrate for s in self.__streams_video]
-                for target in wanted_bitrates:
-                    candidates = [
-                        stream for stream in streams if stream.bitrate <= target
-                    ]
-
-                    if candidates:
-                        best = max(candidates, key=lambda s: s.bitrate)
-
-                        if best not in filtered_streams:
-                            filtered_streams.append(best)
-            elif stream_type == StreamType.Audio:
-                wanted_bitrates = [s.bitrate for s in self.__streams_audio]
-                wanted_languages = [s.language for s in self.__streams_audio]
-                for lang in wanted_languages:
-                    for target in wanted_bitrates:
-                        candidates = [
-                            stream
-                            for stream in streams
-                            if stream.language == lang and stream.bitrate <= target
-                        ]
-
-                        if candidates:
-                            best = max(candidates, key=lambda s: s.bitrate)
-
-                            if best not in filtered_streams:
-                                filtered_streams.append(best)
-            elif stream_type == StreamType.Text:
-                wanted_languages = [s.language for s in self.__streams_text]
-                for lang in wanted_languages:
-                    candidates = [
-                        stream for stream in streams if stream.language == lang
-                    ]
-
-                    if candidates:
-                        best = candidates[0]
-
-                        if best not in filtered_streams:
-                            filtered_streams.append(best)
-            else:
-                filtered_streams = streams
+        if self.__lease_manager:
+            # Only one node saves manifests and extracts subtitles,
+            # and only once every range of the episode has been downloaded
+            if not episode_complete or not self.__lease_manager.claim(finalize_name):
+                return False
+
+            for stream, server_stream in zip(job.streams, job.server_streams):
+                if (
+                    isinstance(stream, TextStream)
+                    and server_stream is not None
+                    and self.__extract_subtitles
+                ):
+                    self.__extract_stream_subtitles(
+                        self.__get_subtitle_job(
+                            episode_id, episode_path, stream, server_stream
+                        )
+                    )
 
-            return filtered_streams
+        return True
 
-        for stream_type in list(StreamType):
-            streams = client_manifest.list_streams(stream_type)
+    def __save_episode(self, job: EpisodeJob):
+        episode_id = job.episode_id
 
-            media[stream_type] = filter_streams(streams, stream_type)
-            chunks[stream_type] = client_manifest.get_chunks_count(stream_type)
+        if self.__lease_manager and self.__lease_manager.is_done(
+            f"{episode_id}/finalize"
+        ):
+            return
 
-        return media, chunks
+        job.client_manifest.save(
+            job.episode_path / job.client_manifest_path,
+            job.streams,
+            compact_chunks=self.__compact_manifests,
+        )
+        job.server_manifest.save(
+            job.episode_path / self.__video_list.get_server_manifest_name(episode_id),
+            job.streams,
+        )
 
-    def __download_stream(self, episode_id, episode_path, stream, stream_type, chunks):
-        _, server_manifest = self.__get_episode_manifests(episode_id)
+        if self.__lease_manager:
+            self.__lease_manager.complete(f"{episode_id}/finalize")
 
-        if stream_type == StreamType.Video:
-            stream = server_manifest.get_video_stream(stream.bitrate)
-        else:
-            stream = server_manifest.get_named_stream(
-                stream.name, stream_type, stream.bitrate
-            )
+        self.__finish_episode(episode_id)
+
+    def __finish_episode(self, episode_id: str):
+        self.__manifests.release(episode_id)
+        self.__progress_overall.update(self.__progress_task_id, advance=1)
+
+    def __get_streams_to_fetch(self, episode_id):
+        # Streams picked for this episode alone (to fit a budget) take
+        # precedence over the ones picked for all of them
+        media = self.__episode_streams.get(episode_id) or self.__catalog.select(
+            episode_id,
+            video_streams=self.__streams_video,
+            audio_streams=self.__streams_audio,
+            text_streams=self.__streams_text,
+        )
+        chunks = {
+            stream_type: self.__catalog.get_chunks_count(episode_id, stream_type)
+            for stream_type in StreamType
+        }
+
+        return media, chunks
 
-        if stream is None:
+    def __download_stream(
+        self, episode_id, episode_path, stream, server_stream, stream_type, chunks
+    ) -> bool:
+        if server_stream is None:
             self.__progress_stream.console.log(
                 f"[red]Error:[/red] Stream {stream} not found in server manifest for episode {episode_id}."
             )
-            return
+            return True
 
-        filename = stream.attributes.get("src")
+        filename = server_stream.attributes.get("src")
         media_url = self.__video_list.get_media_url(episode_id, filename)
+        self.__share_media(episode_id, media_url)
+
+        if episode_path / filename in self.__downloaded_in_order:
+            if stream_type == StreamType.Text and self.__extract_subtitles:
+                self.__extract_stream_subtitles(
+                    self.__get_subtitle_job(
+                        episode_id, episode_path, stream, server_stream
+                    )
+                )
+
+            return True
 
         self.__progress_stream.console.log(
             f"[{episode_id}] Downloading {stream_type.value} media file: {filename}"
         )
-        self.__download_media(media_url, chunks, episode_path / filename)
 
-        if stream_type == StreamType.Text and self.__extract_subtitles:
+        if self.__lease_manager:
+            # Subtitles are extracted when the whole episode is finalized
+            return self.__download_media_shared(
+                episode_id, media_url, chunks, episode_path / filename
+            )
+
+        output_path = episode_path / filename
+
+        if self.__reuse_media(media_url, output_path):
             self.__progress_stream.console.log(
-                f"[{episode_id}] Extracting subtitles from {filename}..."
+                f"[{episode_id}] Reused {filename} downloaded for a previous target"
             )
-            match = re.match(r"J(\d).*", episode_id)
-            episode_id_str = "-1"
 
-            if match:
-                episode_id_str = match.group(1)
+            if stream_type == StreamType.Text and self.__extract_subtitles:
+                self.__extract_stream_subtitles(
+                    self.__get_subtitle_job(
+                        episode_id, episode_path, stream, server_stream
+                    )
+                )
+
+            return True
+
+        if stream_type != StreamType.Text or not self.__extract_subtitles:
+            self.__download_media(media_url, chunks, output_path)
+            return True
+
+        job = self.__get_subtitle_job(episode_id, episode_path, stream, server_stream)
+
+        if read_progress(output_path):
+            # Resumed tracks are parsed from disk once they are complete
+            self.__download_media(media_url, chunks, output_path)
+            self.__extract_stream_subtitles(job)
+            return True
+
+        parser = SubtitleStreamParser(
+            output_path, episode_num=job.episode_num, track_name=job.track_name
+        )
+        self.__download_media(media_url, chunks, output_path, parser)
+
+        try:
+            track = parser.close()
+        except Exception as e:
+            self.__progress_stream.console.log(
+                f"[yellow]Warning![/yellow] [{episode_id}] Could not extract subtitles from {filename} while downloading ({e}), retrying from disk..."
+            )
+            self.__extract_stream_subtitles(job)
+        else:
+            self.__on_subtitles_extracted(job, track)
+
+        return True
+
+    def __get_subtitle_job(
+        self,
+        episode_id: str,
+        episode_path: Path,
+        stream: TextStream,
+        server_stream: ServerStream,
+    ) -> SubtitleJob:
+        return SubtitleJob(
+            episode_id=episode_id,
+            subtitle_path=episode_path / server_stream.attributes.get("src", ""),
+            episode_num=self.__get_episode_num(episode_id),
+            track_name=server_stream.parameters.get("trackName", "unknown"),
+            language=stream.language.value,
+        )
+
+    def __get_episode_num(self, episode_id: str) -> int:
+        match = re.match(r"J(\d).*", episode_id)
+        episode_id_str = "-1"
+
+        if match:
+            episode_id_str = match.group(1)
+
+        return int(episode_id_str)
+
+    def __extract_stream_subtitles(self, job: SubtitleJob):
+        self.__progress_stream.console.log(
+            f"[{job.episode_id}] Queued subtitle extraction from {job.subtitle_path.name}..."
+        )
+        self.__subtitle_extractor.submit(job)
+
+    def __on_subtitles_extracted(self, job: SubtitleJob, track: SubtitleTrack):
+        if track.skipped:
+            self.__progress_stream.console.log(
+                f"[yellow]Warning![/yellow] [{job.episode_id}] Skipped {len(track.skipped)} malformed fragment(s) in {job.subtitle_path.name}: {'; '.join(track.skipped)}"
+            )
 
-            extract_subtitles(
-                episode_path / filename,
-                episode_num=int(episode_id_str),
-                track_name=stream.parameters.get("trackName", "unknown"),
+        if self.__subtitle_corpus:
+            self.__subtitle_corpus.add_track(
+                job.episode_id, job.language, job.track_name, track.segments
             )
 
+        self.__progress_stream.console.log(
+            f"[{job.episode_id}] Finished extracting subtitles from {job.subtitle_path.name}."
+        )
+
+    def __log_extracted_subtitles(self, wait: bool = False):
+        for job, track, error in self.__subtitle_extractor.poll(wait):
+            if error is None:
+                self.__on_subtitles_extracted(job, track)
+
+    def __wait_for_subtitles(self):
+        if not self.__subtitle_extractor.pending:
+            return
+
+        self.__progress_stream.console.log(
+            f"Waiting for {self.__subtitle_extractor.pending} subtitle extraction(s) to finish..."
+        )
+        self.__log_extracted_subtitles(wait=True)
+
+    def __report_subtitle_failures(self):
+        for job, error in self.__subtitle_extractor.failures:
             self.__progress_stream.console.log(
-                f"[{episode_id}] Finished extracting subtitles from {filename}."
+                f"[red]Error:[/red] [{job.episode_id}] Failed to extract subtitles from {job.subtitle_path.name}: {error}"
             )
 
-    def __download_media(self, mediaUrl: str, chunks: int, outputPath: Path):
+    def __reuse_media(self, media_url: str, output_path: Path) -> bool:
+        source = self.__shared_media.get(media_url)
+
+        if source is None or source == output_path or output_path.exists():
+            return False
+
+        if source.is_symlink():
+            # Placed on a storage root, link to the same file there
+            output_path.symlink_to(source.resolve())
+            return True
+
+        try:
+            os.link(source, output_path)
+        except OSError:
+            # Different filesystem or no hard link support
+            shutil.copyfile(source, output_path)
+
+        return True
+
+    def __get_content_length(self, mediaUrl: str) -> int:
+        return self.get_media_size(mediaUrl)
+
+    def __get_chunk_size(self, contentLength: int, chunks: int) -> int:
+        return max(ceil(contentLength / chunks), CHUNK_SIZE)  # Segment-ish size or 1MB
+
+    def __download_media(
+        self,
+        mediaUrl: str,
+        chunks: int,
+        outputPath: Path,
+        parser: SubtitleStreamParser | None = None,
+    ):
         progress_media = self.__progress_media.add_task(
             f"Downloading {outputPath.name}..."
         )
 
-        with requests.head(mediaUrl) as r:
-            r.raise_for_status()
-            contentLength = int(r.headers["Content-Length"])
-
+        contentLength = self.__get_content_length(mediaUrl)
         self.__progress_media.update(progress_media, total=contentLength)
 
-        chunkSize = max(
-            ceil(contentLength / chunks), CHUNK_SIZE
-        )  # Segment-ish size or 1MB
-
-        if outputPath.exists():
-            # Resume from where we left
-            currentRange = outputPath.stat().st_size
-        else:
-            currentRange = 0
+        chunkSize = self.__get_chunk_size(contentLength, chunks)
 
+        # Resume from where we left
+        currentRange = read_progress(outputPath)
         self.__progress_media.update(progress_media, completed=currentRange)
 
-        with open(outputPath, "ab") as f:
-            while currentRange < contentLength:
-                endRange = min(currentRange + chunkSize, contentLength)
+        if currentRange < contentLength:
+            self.__write_media(
+                mediaUrl, outputPath, contentLength, chunkSize, progress_media, parser
+            )
 
-                headers = self.__session.headers.copy()  # type: ignore
-                headers["X-MS-Range"] = f"bytes={currentRange}-{endRange}"
+        if self.__share:
+            self.__shared_media[mediaUrl] = outputPath
 
-                try:
-                    with self.__session.get(
-                        mediaUrl, headers=headers, stream=True
-                    ) as r:
-                        r.raise_for_status()
-
-                        dlBytes = 0
-
-                        for chunk in r.iter_content(chunk_size=1024):
-                            f.write(chunk)
-                            currentRange += len(chunk)
-                            dlBytes += len(chunk)
-
-                        self.__progress_media.update(progress_media, advance=dlBytes)
-                except ChunkedEncodingError:
-                    self.__progress_media.console.log(
-                        f"[red]Error:[/red] Chunked encoding error while downloading {outputPath.name}. Retrying..."
+    def __write_media(
+        self,
+        mediaUrl: str,
+        outputPath: Path,
+        contentLength: int,
+        chunkSize: int,
+        progress_media,
+        parser: SubtitleStreamParser | None,
+    ):
+        # Ranges are fetched side by side, as many at once as the concurrency
+        # controller allows, and written in order as soon as the oldest is in
+        with (
+            self.__place(outputPath, contentLength),
+            MediaWriter(outputPath, contentLength, self.__fsync_policy) as writer,
+        ):
+            pending = deque(
+                (start, min(start + chunkSize, contentLength))
+                for start in range(writer.offset, contentLength, chunkSize)
+            )
+            in_flight: deque[Future] = deque()
+
+            try:
+                while pending or in_flight:
+                    while pending and len(in_flight) < self.__concurrency.limit:
+                        start, end = pending.popleft()
+                        in_flight.append(
+                            self.__range_pool.submit(
+                                self.__fetch_range, mediaUrl, outputPath, start, end
+                            )
+                        )
+
+                    data = in_flight.popleft().result()
+                    writer.write(data)
+
+                    if parser:
+                        parser.feed(data)
+
+                    if self.__partial_episode:
+                        writer.flush()
+
+                    writer.end_range()
+                    self.__downloaded_bytes += len(data)
+                    self.__progress_media.update(progress_media, advance=len(data))
+                    self.__save_partial_manifests()
+            finally:
+                for future in in_flight:
+                    future.cancel()
+
+    def __fetch_range(
+        self, mediaUrl: str, outputPath: Path, start: int, end: int
+    ) -> bytearray:
+        data = bytearray()
+
+        for chunk in self.__stream_range(mediaUrl, outputPath, start, end):
+            data += chunk
+
+        return data
+
+    def __stream_range(
+        self, mediaUrl: str, outputPath: Path, start: int, end: int
+    ) -> Iterator[bytes]:
+        # Every way of downloading media gets its bytes from here: requests
+        # are resumed where the last one stopped on connection errors and
+        # throttling responses, and given up once the download is stopped
+        position = start
+
+        while position < end:
+            if self.__stopped.is_set():
+                raise CancelledError()
+
+            headers = {"X-MS-Range": f"bytes={position}-{end - 1}"}
+            requested = time.monotonic()
+
+            try:
+                with self.__transport.stream(mediaUrl, headers) as chunks:
+                    latency = time.monotonic() - requested
+                    received = position
+
+                    for chunk in chunks:
+                        if self.__stopped.is_set():
+                            raise CancelledError()
+
+                        # Never spill into the next range
+                        chunk = chunk[: end - position]
+                        position += len(chunk)
+                        yield chunk
+
+                        if position >= end:
+                            break
+
+                self.__concurrency.on_success(position - received, latency)
+            except TransportError as e:
+                self.__concurrency.on_error()
+                self.__progress_media.console.log(
+                    f"[red]Error:[/red] Connection error while downloading {outputPath.name} ({e}). Retrying..."
+                )
+                self.__stopped.wait(1)
+            except HTTPStatusError as e:
+                if e.status not in (429, 503):
+                    raise
+
+                self.__concurrency.on_error()
+                self.__progress_media.console.log(
+                    f"[yellow]Warning![/yellow] Server is busy while downloading {outputPath.name} (HTTP {e.status}), slowing down to {self.__concurrency.limit} connection(s)..."
+                )
+                self.__stopped.wait(1)
+
+    def __place(self, path: Path, size: int) -> AbstractContextManager:
+        if self.__storage is None or self.__lease_manager:
+            return nullcontext()
+
+        return self.__storage.place(path, size)
+
+    def __download_play_order(
+        self, episode_id: str, episode_path: Path, streams: list, server_streams: list
+    ):
+        # Fragments of all tracks are fetched in presentation order, so the
+        # beginning of the episode is playable after the first few of them.
+        # Every file is still written front to back.
+        tracks: list[tuple[str, Path, int]] = []
+        ranges: list[FragmentRange] = []
+
+        for server_stream in server_streams:
+            if server_stream is None:
+                continue
+
+            filename = server_stream.attributes.get("src")
+            media_url = self.__video_list.get_media_url(episode_id, filename)
+            output_path = episode_path / filename
+            self.__share_media(episode_id, media_url)
+
+            if any(output_path == path for _, path, _ in tracks):
+                continue
+
+            contentLength = self.__get_content_length(media_url)
+
+            try:
+                entries = self.__fetch_fragment_index(
+                    media_url, contentLength, filename
+                )
+            except ValueError as e:
+                self.__progress_stream.console.log(
+                    f"[yellow]Warning![/yellow] [{episode_id}] Cannot read fragment index of {filename} ({e}), it will be downloaded afterwards."
+                )
+                continue
+
+            ranges.extend(
+                self.__get_fragment_ranges(len(tracks), entries, contentLength)
+            )
+            tracks.append((media_url, output_path, contentLength))
+
+        if not tracks:
+            return
+
+        self.__progress_stream.console.log(
+            f"[{episode_id}] Downloading {len(tracks)} media file(s) in play order..."
+        )
+
+        ranges.sort(key=lambda item: (item.time, item.track))
+        started = time.monotonic()
+        waiting = set(range(len(tracks)))
+
+        with ExitStack() as stack:
+            writers: list[MediaWriter] = []
+            progress_tasks = []
+
+            for media_url, output_path, contentLength in tracks:
+                stack.enter_context(self.__place(output_path, contentLength))
+                writer = stack.enter_context(
+                    MediaWriter(
+                        output_path,
+                        contentLength,
+                        self.__fsync_policy,
+                        buffers=PLAY_ORDER_WRITE_BUFFERS,
                     )
-                    time.sleep(1)
-                    continue
+                )
+                writers.append(writer)
+                progress_tasks.append(
+                    self.__progress_media.add_task(
+                        f"Downloading {output_path.name}...",
+                        total=contentLength,
+                        completed=writer.offset,
+                    )
+                )
+
+            for item in ranges:
+                media_url, output_path, _ = tracks[item.track]
+
+                self.__download_fragment(
+                    media_url,
+                    output_path,
+                    writers[item.track],
+                    item,
+                    progress_tasks[item.track],
+                )
+
+                if item.start == 0 and waiting:
+                    waiting.discard(item.track)
+
+                    if not waiting:
+                        self.__progress_stream.console.log(
+                            f"[{episode_id}] Beginning of every track is on disk after {time.monotonic() - started:.1f}s."
+                        )
+
+        for media_url, output_path, _ in tracks:
+            self.__downloaded_in_order.add(output_path)
+
+            if self.__share:
+                self.__shared_media[media_url] = output_path
+
+    def __get_fragment_ranges(
+        self, track: int, entries: list[tuple[int, int]], contentLength: int
+    ) -> list[FragmentRange]:
+        # Small fragments (audio, text) are grouped into ranges of at least
+        # CHUNK_SIZE so they don't cost a request each. The first range also
+        # holds the file header, the last one the fragment index.
+        ranges = []
+        start, startTime = 0, entries[0][0] if entries else 0
+
+        for fragmentTime, offset in entries[1:]:
+            if offset - start >= CHUNK_SIZE:
+                ranges.append(FragmentRange(track, startTime, start, offset))
+                start, startTime = offset, fragmentTime
+
+        ranges.append(FragmentRange(track, startTime, start, contentLength))
+
+        return ranges
+
+    def __fetch_fragment_index(
+        self, mediaUrl: str, contentLength: int, filename: str
+    ) -> list[tuple[int, int]]:
+        # The mfra box is at the end of the file, usually well within one read
+        tailSize = min(contentLength, READ_SIZE)
+        tail = self.__fetch_tail(mediaUrl, contentLength, tailSize)
+
+        if len(tail) < 4:
+            raise ValueError(f"Track file {filename} is too small.")
+
+        mfraSize = get_mfra_size(tail)
+
+        if tailSize < mfraSize <= contentLength:
+            tail = self.__fetch_tail(mediaUrl, contentLength, mfraSize)
+
+        return get_fragment_offsets(tail, filename)
+
+    def __fetch_tail(self, mediaUrl: str, contentLength: int, size: int) -> bytes:
+        headers = {"X-MS-Range": f"bytes={contentLength - size}-{contentLength - 1}"}
+
+        return self.__transport.get(mediaUrl, headers)[-size:]
+
+    def __download_fragment(
+        self,
+        mediaUrl: str,
+        outputPath: Path,
+        writer: MediaWriter,
+        item: FragmentRange,
+        progress_media,
+    ):
+        # Already on disk from a previous run
+        start = max(item.start, writer.offset)
+
+        for chunk in self.__stream_range(mediaUrl, outputPath, start, item.end):
+            writer.write(chunk)
+            self.__downloaded_bytes += len(chunk)
+            self.__progress_media.update(progress_media, advance=len(chunk))
+
+        writer.flush()
+        writer.end_range()
+        self.__save_partial_manifests()
+
+    def __save_partial_manifests(self):
+        # Manifests of the episode being downloaded describe only the
+        # fragments at the start of every file that are already on disk
+        partial = self.__partial_episode
+
+        if (
+            partial is None
+            or time.monotonic() - partial.saved_at < PARTIAL_MANIFEST_INTERVAL
+        ):
+            return
+
+        chunk_counts = {}
+
+        for stream, path in partial.files.items():
+            size = read_progress(path)
+
+            if not size:
+                continue
+
+            scanner = partial.scanners.setdefault(path, FragmentScanner(path))
+            count = scanner.scan(size)
+
+            if count:
+                chunk_counts[stream] = count
+
+        if chunk_counts:
+            partial.client_manifest.save(
+                partial.client_manifest_path,
+                list(chunk_counts),
+                compact_chunks=self.__compact_manifests,
+                chunk_counts=chunk_counts,
+            )
+            partial.server_manifest.save(
+                partial.server_manifest_path, list(chunk_counts)
+            )
+
+        partial.saved_at = time.monotonic()
+
+    def __download_media_shared(
+        self, episode_id: str, mediaUrl: str, chunks: int, outputPath: Path
+    ) -> bool:
+        progress_media = self.__progress_media.add_task(
+            f"Downloading {outputPath.name}..."
+        )
+
+        contentLength = self.__get_content_length(mediaUrl)
+        self.__progress_media.update(progress_media, total=contentLength)
+
+        chunkSize = self.__get_chunk_size(contentLength, chunks)
+        items = [
+            WorkItem(
+                episode_id=episode_id,
+                filename=outputPath.name,
+                start=start,
+                end=min(start + chunkSize, contentLength),
+            )
+            for start in range(0, contentLength, chunkSize)
+        ]
+
+        # Every node writes its ranges in place, so the file has to exist first
+        outputPath.touch(exist_ok=True)
+
+        for item in items:
+            if self.__lease_manager.claim(item.name):
+                try:
+                    self.__download_range(mediaUrl, outputPath, item)
+                except BaseException:
+                    self.__lease_manager.release(item.name)
+                    raise
+
+                self.__lease_manager.complete(item.name)
+
+            if self.__lease_manager.is_done(item.name):
+                self.__progress_media.update(progress_media, advance=item.size)
+
+        return all(self.__lease_manager.is_done(item.name) for item in items)
+
+    def __download_range(self, mediaUrl: str, outputPath: Path, item: WorkItem):
+        with open(outputPath, "r+b") as f:
+            f.seek(item.start)
+
+            # Bytes never spill into a range owned by another node
+            for chunk in self.__stream_range(
+                mediaUrl, outputPath, item.start, item.end
+            ):
+                f.write(chunk)
+                self.__downloaded_bytes += len(chunk)
+
+            # Other nodes only see the range as done after it's safely on disk
+            f.flush()
+            os.fsync(f.fileno())
@@ -0,0 +1,7 @@
+from enum import Enum
+
+
+class FsyncPolicy(Enum):
+    Range = "range"
+    File = "file"
+    Never = "none"
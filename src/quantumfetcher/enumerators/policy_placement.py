@@ -0,0 +1,6 @@
+from enum import Enum
+
+
+class PlacementPolicy(Enum):
+    FreeSpace = "free-space"
+    Load = "load"
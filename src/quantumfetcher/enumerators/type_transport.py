@@ -0,0 +1,7 @@
+from enum import Enum
+
+
+class TransportType(Enum):
+    Requests = "requests"
+    Urllib3 = "urllib3"
+    HTTPClient = "http.client"
@@ -0,0 +1,78 @@
+import multiprocessing
+import queue
+from concurrent.futures import CancelledError, Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from quantumfetcher.dataclasses.subtitle_job import SubtitleJob
+from quantumfetcher.dataclasses.subtitle_track import SubtitleTrack
+from quantumfetcher.subtitles import extract_subtitles
+
+
+class SubtitleExtractor:
+    def __init__(self, max_workers: int | None = None):
+        self.__max_workers = max_workers
+        self.__executor: ProcessPoolExecutor | None = None
+        self.__completed: queue.SimpleQueue = queue.SimpleQueue()
+        self.__pending = 0
+        self.__failures: list[tuple[SubtitleJob, BaseException]] = []
+
+    @property
+    def pending(self) -> int:
+        return self.__pending
+
+    @property
+    def failures(self) -> list[tuple[SubtitleJob, BaseException]]:
+        return list(self.__failures)
+
+    def submit(self, job: SubtitleJob):
+        if self.__executor is None:
+            # TTML parsing is CPU-bound, so tracks are parsed in separate processes.
+            # Spawn avoids forking a process that already runs network threads.
+            self.__executor = ProcessPoolExecutor(
+                max_workers=self.__max_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+
+        try:
+            future = self.__executor.submit(
+                extract_subtitles, job.subtitle_path, job.episode_num, job.track_name
+            )
+        except BrokenProcessPool as e:
+            self.__failures.append((job, e))
+            return
+
+        self.__pending += 1
+        future.add_done_callback(lambda f: self.__completed.put((job, f)))
+
+    def poll(
+        self, wait: bool = False
+    ) -> list[tuple[SubtitleJob, SubtitleTrack | None, BaseException | None]]:
+        finished = []
+
+        while self.__pending:
+            try:
+                job, future = self.__completed.get(block=wait)
+            except queue.Empty:
+                break
+
+            self.__pending -= 1
+
+            error = self.__get_error(future)
+            if error is not None:
+                self.__failures.append((job, error))
+                finished.append((job, None, error))
+            else:
+                finished.append((job, future.result(), None))
+
+        return finished
+
+    def close(self):
+        if self.__executor is not None:
+            self.__executor.shutdown(wait=not self.__pending, cancel_futures=True)
+            self.__executor = None
+
+    def __get_error(self, future: Future) -> BaseException | None:
+        if future.cancelled():
+            return CancelledError()
+
+        return future.exception()
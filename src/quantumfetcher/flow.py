@@ -5,19 +5,54 @@ from rich.console import Console
 from rich.progress import Progress
 from rich.table import Table
 
+from quantumfetcher.budget import BudgetPlanner
+from quantumfetcher.catalog import StreamCatalog
+from quantumfetcher.corpus import SubtitleCorpus
 from quantumfetcher.downloader import Downloader
-from quantumfetcher.enumerators.type_manifest import ManifestType
 from quantumfetcher.enumerators.type_stream import StreamType
-from quantumfetcher.helpers import deduplicate_streams, filter_streams, get_streams
-from quantumfetcher.manifests.base import BaseManifest
-from quantumfetcher.prompt import Prompt
+from quantumfetcher.dataclasses.episode_plan import EpisodePlan
+from quantumfetcher.helpers import (
+    deduplicate_streams,
+    filter_streams,
+    format_size,
+)
+from quantumfetcher.lease import LeaseManager
+from quantumfetcher.manifests.snapshot import SnapshotCache
+from quantumfetcher.manifests.store import ManifestStore
+from quantumfetcher.storage import StoragePool
+from quantumfetcher.transports.base import create_transport
 from quantumfetcher.video_list import VideoList
 
 
 class Flow:
 
     def __init__(self, interactive: bool, video_list: VideoList, **kwargs) -> None:
-        self.__downloader = Downloader()
+        downloader: Downloader | None = kwargs.get("downloader")
+
+        if downloader is None:
+            manifest_cache_path: Path | None = kwargs["manifest_cache_path"]
+
+            downloader = Downloader(
+                manifest_cache=(
+                    SnapshotCache(
+                        manifest_cache_path, refresh=kwargs["refresh_manifests"]
+                    )
+                    if manifest_cache_path
+                    else None
+                ),
+                fsync_policy=kwargs["fsync_policy"],
+                transport=create_transport(
+                    kwargs["transport"], kwargs["max_connections"]
+                ),
+                max_connections=kwargs["max_connections"],
+                storage=(
+                    StoragePool(kwargs["storage_roots"], kwargs["storage_policy"])
+                    if kwargs["storage_roots"]
+                    else None
+                ),
+            )
+
+        self.__downloader = downloader
 
         self.__interactive = interactive
         self.__video_list = video_list
@@ -33,33 +68,72 @@ class Flow:
         self.__fetch_text_bitrates: list[str] | None = kwargs["text_bitrates"]
 
         show_formats = kwargs["show_formats"]
-        extract_subtitles = kwargs["extract_subtitles"]
+        subtitle_db_path: Path | None = kwargs["subtitle_db_path"]
+        extract_subtitles = kwargs["extract_subtitles"] or subtitle_db_path is not None
+        compact_manifests = kwargs["compact_manifests"]
+        progressive = kwargs["progressive"]
+        partial_manifests = kwargs["partial_manifests"]
+        budget: int | None = kwargs["budget"]
+
+        lease_path: Path | None = kwargs["lease_path"]
+        self.__lease_manager = (
+            LeaseManager(lease_path, kwargs["lease_timeout"], kwargs["node_id"])
+            if lease_path
+            else None
+        )
 
         self.__fetch_manifests()
         self.__prepare_streams()
 
         if show_formats:
+            self.__manifests.close()
             return self.__dump_formats()
 
+        episode_streams = self.__plan_budget(budget) if budget is not None else None
+
         if self.__interactive and not extract_subtitles:
             if not self.__fetch_text_streams:
                 pass
             else:
+                from quantumfetcher.prompt import Prompt
+
                 extract_subtitles = Prompt.extract_subtitles()
 
-        self.__downloader.download(
-            video_list=self.__video_list,
-            manifests=self.__manifests,
-            episodes_path=self.__episodes_path,
-            video_streams=self.__fetch_video_streams,
-            audio_streams=self.__fetch_audio_streams,
-            text_streams=self.__fetch_text_streams,
-            extract_subtitles=extract_subtitles,
+        subtitle_corpus = (
+            SubtitleCorpus(subtitle_db_path)
+            if subtitle_db_path and extract_subtitles
+            else None
         )
 
-    def __fetch_manifests(self):
-        self.__manifests: dict[str, dict[ManifestType, BaseManifest]] = {}
+        try:
+            self.__downloader.download(
+                video_list=self.__video_list,
+                manifests=self.__manifests,
+                catalog=self.__catalog,
+                episodes_path=self.__episodes_path,
+                video_streams=self.__fetch_video_streams,
+                audio_streams=self.__fetch_audio_streams,
+                text_streams=self.__fetch_text_streams,
+                extract_subtitles=extract_subtitles,
+                lease_manager=self.__lease_manager,
+                compact_manifests=compact_manifests,
+                subtitle_corpus=subtitle_corpus,
+                progressive=progressive,
+                partial_manifests=partial_manifests,
+                episode_streams=episode_streams,
+            )
+        finally:
+            if subtitle_corpus:
+                subtitle_corpus.close()
+
+            # Leases still held after an error are given up, so other
+            # nodes take the work over without waiting for them to expire
+            if self.__lease_manager:
+                self.__lease_manager.close()
+
+            self.__manifests.close()
 
+    def __fetch_manifests(self):
         episodes = self.__video_list.episode_list
 
         # If episodes to fetch is provided, filter the video list
@@ -74,6 +148,8 @@ class Flow:
                     if episode_id in self.__episodes_to_fetch
                 }
         elif self.__interactive:
+            from quantumfetcher.prompt import Prompt
+
             self.__episodes_to_fetch = Prompt.select_episodes(self.__video_list)
             episodes = {
                 episode_id: url
@@ -81,6 +157,13 @@ class Flow:
                 if episode_id in self.__episodes_to_fetch
             }
 
+        self.__manifests = ManifestStore(
+            video_list=self.__video_list,
+            episodes=list(episodes.keys()),
+            fetch_manifest=self.__downloader.fetch_manifest,
+        )
+        self.__catalog = StreamCatalog(self.__manifests)
+
         with Progress(transient=True) as progress:
             if self.__episodes_to_fetch:
                 if len(episodes) != len(self.__episodes_to_fetch):
@@ -89,41 +172,25 @@ class Flow:
                         f"[yellow]Warning![/yellow] The following episodes are not in the video list: {missing_episodes}, they will be skipped."
                     )
 
-            for episode_id, client_manifest_url in progress.track(
-                episodes.items(),
+            # Only client manifests are needed to pick streams, server
+            # manifests are fetched once the download gets close to each episode
+            for episode_id in progress.track(
+                self.__manifests.episodes,
                 description="Fetching manifests...",
             ):
-                server_manifest_url = self.__video_list.get_server_manifest_url(
-                    episode_id
-                )
-
                 progress.console.log(
                     f"Fetching client manifest for episode {episode_id}..."
                 )
 
-                client_manifest = self.__downloader.fetch_manifest(
-                    manifest_type=ManifestType.Client,
-                    manifest_url=client_manifest_url,
-                )
-
-                progress.console.log(
-                    f"Fetching server manifest for episode {episode_id}..."
-                )
-
-                server_manifest = self.__downloader.fetch_manifest(
-                    manifest_type=ManifestType.Server,
-                    manifest_url=server_manifest_url,
-                )
-
-                self.__manifests[episode_id] = {
-                    ManifestType.Client: client_manifest,
-                    ManifestType.Server: server_manifest,
-                }
+                self.__catalog.add_episode(episode_id)
 
     def __prepare_streams(self):
-        qualities = get_streams(self.__manifests)
+        qualities = self.__catalog.qualities
 
         if self.__interactive:
+            # inquirer is only loaded when the user is actually asked something
+            from quantumfetcher.prompt import Prompt
+
             skip_video_prompt = (
                 self.__fetch_video_resolutions is not None
                 and self.__fetch_video_bitrates is not None
@@ -220,8 +287,65 @@ class Flow:
             key_func=lambda x: x.name,
         )
 
+    def __plan_budget(self, budget: int) -> dict[str, dict[StreamType, list]]:
+        # Video and audio bitrates are picked per episode to fit the budget,
+        # in the languages selected as usual
+        planner = BudgetPlanner(
+            video_list=self.__video_list,
+            manifests=self.__manifests,
+            catalog=self.__catalog,
+            get_media_size=self.__downloader.get_media_size,
+        )
+
+        with Progress(transient=True) as progress:
+            progress.add_task("Checking file sizes to fit the budget...", total=None)
+            plans = planner.plan(
+                budget,
+                audio_languages=list(
+                    dict.fromkeys(a.language for a in self.__fetch_audio_streams)
+                ),
+                text_streams=self.__fetch_text_streams,
+            )
+
+        self.__dump_plan(budget, plans)
+
+        return {plan.episode_id: plan.streams for plan in plans}
+
+    def __dump_plan(self, budget: int, plans: list[EpisodePlan]):
+        table = Table(title="Download Plan")
+        table.add_column("Episode")
+        table.add_column("Duration")
+        table.add_column("Video")
+        table.add_column("Audio")
+        table.add_column("Size")
+        table.add_column("Share")
+        table.add_column("Reason")
+
+        for plan in plans:
+            minutes, seconds = divmod(round(plan.duration), 60)
+
+            table.add_row(
+                plan.episode_id,
+                f"{minutes}:{seconds:02}",
+                ", ".join(f"{v.height}p ({v.bitrate} bps)" for v in plan.video),
+                ", ".join(f"{a.language.name} ({a.bitrate} bps)" for a in plan.audio),
+                format_size(plan.size),
+                format_size(plan.share),
+                plan.reason,
+            )
+
+        total = sum(plan.size for plan in plans)
+
+        console = Console()
+        console.print(table)
+        console.print(
+            f"Planned {format_size(total)} of {format_size(budget)} budget."
+            if total <= budget
+            else f"[yellow]Warning![/yellow] Even the lowest qualities take {format_size(total)}, {format_size(total - budget)} over {format_size(budget)} budget."
+        )
+
     def __dump_formats(self):
-        qualities = get_streams(self.__manifests)
+        qualities = self.__catalog.qualities
 
         video_streams = self.__fetch_video_streams or qualities[StreamType.Video]
         audio_streams = self.__fetch_audio_streams or qualities[StreamType.Audio]
@@ -1,65 +1,6 @@
-import operator
+import re
 from itertools import groupby
 
-from quantumfetcher.enumerators.type_manifest import ManifestType
-from quantumfetcher.enumerators.type_stream import StreamType
-from quantumfetcher.manifests.base import BaseManifest
-from quantumfetcher.manifests.client import ClientManifest
-
-
-def get_streams(
-    manifests: dict[str, dict[ManifestType, BaseManifest]],
-) -> dict[StreamType, list]:
-    def should_process(episode_id):
-        return episode_id != "J1 - 4K Test" or len(manifests) == 1
-
-    video_set = set()
-    audio_set = set()
-    text_set = set()
-
-    for episode_id in manifests.keys():
-        if not should_process(episode_id):
-            continue
-
-        manifest = manifests[episode_id][ManifestType.Client]
-
-        if not isinstance(manifest, ClientManifest):
-            raise TypeError(
-                f"Expected ClientManifest for episode {episode_id}, got {type(manifest)}"
-            )
-
-        for v in manifest.list_video_streams():
-            video_set.add(v)
-        for a in manifest.list_audio_streams():
-            audio_set.add(a)
-        for t in manifest.list_text_streams():
-            text_set.add(t)
-
-    def make_video_streams(streams):
-        return sorted(
-            video_set,
-            key=operator.attrgetter("bitrate"),
-            reverse=True,
-        )
-
-    def make_audio_streams(streams):
-        return sorted(
-            audio_set,
-            key=lambda x: (x.language.name, -x.bitrate),
-        )
-
-    def make_text_streams(streams):
-        return sorted(
-            text_set,
-            key=lambda x: (x.language.name, -x.bitrate),
-        )
-
-    return {
-        StreamType.Video: make_video_streams(video_set),
-        StreamType.Audio: make_audio_streams(audio_set),
-        StreamType.Text: make_text_streams(text_set),
-    }
-
 
 def filter_streams(
     streams,
@@ -95,3 +36,68 @@ def filter_streams(
 def deduplicate_streams(streams, key_func, reverse=False):
     sorted_streams = sorted(streams, key=key_func, reverse=reverse)
     return [next(g) for _, g in groupby(sorted_streams, key=key_func)]
+
+
+def parse_size(value: str) -> int:
+    # Plain number of bytes or a number with a binary unit, e.g. 512M or 20 GiB
+    match = re.fullmatch(r"(\d+(?:\.\d+)?)\s*([KMGT]?)(?:i?B)?", value.strip(), re.I)
+
+    if match is None:
+        raise ValueError(f"Invalid size {value}")
+
+    number, unit = match.groups()
+    exponent = "KMGT".find(unit.upper()) + 1 if unit else 0
+
+    return int(float(number) * 1024**exponent)
+
+
+def format_size(size: int) -> str:
+    for unit in ("B", "KiB", "MiB", "GiB"):
+        if abs(size) < 1024:
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.2f} {unit}"
+
+        size /= 1024
+
+    return f"{size:.2f} TiB"
+
+
+def parse_duration(value: str) -> float:
+    # Seconds, or hours/minutes/seconds like 2h, 90m or 1h30m
+    match = re.fullmatch(
+        r"(?:(\d+(?:\.\d+)?)h)?(?:(\d+(?:\.\d+)?)m)?(?:(\d+(?:\.\d+)?)s?)?",
+        value.strip().replace(" ", ""),
+        re.I,
+    )
+
+    if match is None or not any(match.groups()):
+        raise ValueError(f"Invalid duration {value}")
+
+    hours, minutes, seconds = (float(part or 0) for part in match.groups())
+
+    return hours * 3600 + minutes * 60 + seconds
+
+
+def parse_bandwidth(value: str) -> float:
+    # Bits per second with a decimal unit, e.g. 50M, 50Mbps or 1 Gbit/s
+    match = re.fullmatch(
+        r"(\d+(?:\.\d+)?)\s*([KMG]?)(?:bps|bit/s|b/s)?", value.strip(), re.I
+    )
+
+    if match is None:
+        raise ValueError(f"Invalid bandwidth {value}")
+
+    number, unit = match.groups()
+    exponent = "KMG".find(unit.upper()) + 1 if unit else 0
+
+    return float(number) * 1000**exponent
+
+
+def parse_budget(value: str) -> int:
+    # Total size (20G) or what can be downloaded until a deadline at a given
+    # bandwidth (2h@50M), in bytes
+    if "@" not in value:
+        return parse_size(value)
+
+    deadline, bandwidth = value.split("@", 1)
+
+    return int(parse_duration(deadline) * parse_bandwidth(bandwidth) / 8)
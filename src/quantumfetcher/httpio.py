@@ -0,0 +1,133 @@
+import asyncio
+import re
+from http import HTTPStatus
+from typing import Awaitable, Callable
+
+BYTE_RANGE = re.compile(r"bytes=(\d*)-(\d*)")
+MAX_REQUEST_BODY = 64 * 1024  # Nothing served here expects a request body
+
+Responder = Callable[
+    [asyncio.StreamWriter, str, str, dict[str, str], bool], Awaitable[None]
+]
+
+
+def run_server(address: str, respond: Responder):
+    host, _, port = address.rpartition(":")
+
+    if not host or not port.isdigit():
+        raise ValueError(f"Invalid server address {address}, expected host:port")
+
+    asyncio.run(__serve(host, int(port), respond))
+
+
+async def __serve(host: str, port: int, respond: Responder):
+    server = await asyncio.start_server(
+        lambda reader, writer: handle_connection(reader, writer, respond),
+        host,
+        port,
+        reuse_address=True,
+    )
+
+    async with server:
+        await server.serve_forever()
+
+
+# Minimal HTTP/1.1 server side, enough for the game and the downloader:
+# GET/HEAD requests on keep-alive connections, responses always carry
+# Content-Length and request bodies (only small ones are accepted) are discarded
+async def handle_connection(
+    reader: asyncio.StreamReader, writer: asyncio.StreamWriter, respond: Responder
+):
+    try:
+        while True:
+            try:
+                head = await reader.readuntil(b"\r\n\r\n")
+            except (asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+                break
+
+            request_line, *header_lines = head[:-4].decode("latin-1").split("\r\n")
+            headers = {}
+
+            for line in header_lines:
+                name, _, value = line.partition(":")
+                headers[name.strip().lower()] = value.strip()
+
+            try:
+                method, target, version = request_line.split(" ")
+            except ValueError:
+                await send_head(writer, 400, 0, keep_alive=False)
+                break
+
+            content_length = headers.get("content-length", "0")
+
+            if not content_length.isdecimal():
+                await send_head(writer, 400, 0, keep_alive=False)
+                break
+
+            if int(content_length) > MAX_REQUEST_BODY:
+                await send_head(writer, 413, 0, keep_alive=False)
+                break
+
+            await reader.readexactly(int(content_length))
+
+            connection = headers.get("connection", "").lower()
+            keep_alive = (
+                connection == "keep-alive"
+                if version == "HTTP/1.0"
+                else connection != "close"
+            )
+
+            await respond(writer, method, target, headers, keep_alive)
+
+            if not keep_alive:
+                break
+    except (ConnectionError, asyncio.IncompleteReadError):
+        pass
+    finally:
+        writer.close()
+
+
+async def send_head(
+    writer: asyncio.StreamWriter,
+    status: int,
+    content_length: int,
+    keep_alive: bool,
+    headers: dict[str, str] | None = None,
+):
+    lines = [f"HTTP/1.1 {status} {HTTPStatus(status).phrase}"]
+
+    for name, value in (headers or {}).items():
+        lines.append(f"{name}: {value}")
+
+    lines.append(f"Content-Length: {content_length}")
+    lines.append(f"Connection: {'keep-alive' if keep_alive else 'close'}")
+
+    writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1"))
+    await writer.drain()
+
+
+def get_byte_range(headers: dict[str, str]) -> str | None:
+    # Smooth Streaming servers take X-MS-Range, plain Range works as well
+    return headers.get("x-ms-range") or headers.get("range")
+
+
+def parse_byte_range(value: str, size: int) -> tuple[int, int] | None:
+    match = BYTE_RANGE.fullmatch(value.strip())
+
+    if match is None or not any(match.groups()):
+        raise ValueError(f"Invalid byte range {value}")
+
+    first, last = match.groups()
+
+    if not first:
+        # Suffix range, the last N bytes
+        start = max(size - int(last), 0)
+        end = size - 1
+    else:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+
+    if start >= size or start > end:
+        return None
+
+    return start, end
@@ -0,0 +1,232 @@
+import json
+import os
+import socket
+import threading
+import time
+import uuid
+from pathlib import Path
+
+
+# Every work item is represented by files in the shared lease directory,
+# <name>.lease while some node works on it and <name>.done once it's finished.
+# Leases are created with O_EXCL so only one node can hold them, a lease that
+# wasn't renewed within timeout seconds is considered abandoned (node died)
+# and will be reclaimed by the next node that comes across it. Every claim
+# writes its own token to the lease, so a node can tell whether the lease it
+# looks at is still the one it saw (or created) and never renews or removes
+# a lease that belongs to somebody else. Held leases are renewed from a
+# background thread, so a range that stalls doesn't look abandoned.
+class LeaseManager:
+
+    def __init__(self, path: Path, timeout: float, node_id: str | None = None):
+        self.__path = path
+        self.__timeout = timeout
+        self.__node_id = node_id or f"{socket.gethostname()}-{os.getpid()}"
+
+        # Tokens of the leases this node holds
+        self.__held: dict[str, str] = {}
+        self.__lock = threading.Lock()
+        self.__stopped = threading.Event()
+        self.__heartbeat: threading.Thread | None = None
+
+        self.__path.mkdir(parents=True, exist_ok=True)
+
+    @property
+    def node_id(self) -> str:
+        return self.__node_id
+
+    @property
+    def timeout(self) -> float:
+        return self.__timeout
+
+    def __lease_path(self, name: str) -> Path:
+        return self.__path / f"{name}.lease"
+
+    def __done_path(self, name: str) -> Path:
+        return self.__path / f"{name}.done"
+
+    def __read_token(self, path: Path) -> str | None:
+        try:
+            with open(path) as f:
+                return json.load(f).get("token")
+        except (FileNotFoundError, ValueError):
+            # Lease being written right now reads as empty
+            return None
+
+    def __is_stale(self, path: Path) -> bool:
+        try:
+            mtime = path.stat().st_mtime
+        except FileNotFoundError:
+            return False
+
+        return time.time() - mtime > self.__timeout
+
+    def is_done(self, name: str) -> bool:
+        return self.__done_path(name).exists()
+
+    def is_expired(self, name: str) -> bool:
+        try:
+            mtime = self.__lease_path(name).stat().st_mtime
+        except FileNotFoundError:
+            return True
+
+        return time.time() - mtime > self.__timeout
+
+    def is_held(self, name: str) -> bool:
+        with self.__lock:
+            token = self.__held.get(name)
+
+        return token is not None and self.__read_token(self.__lease_path(name)) == token
+
+    def claim(self, name: str) -> bool:
+        if self.is_done(name):
+            return False
+
+        lease_path = self.__lease_path(name)
+        lease_path.parent.mkdir(parents=True, exist_ok=True)
+
+        if lease_path.exists():
+            if not self.is_expired(name):
+                return False
+
+            if not self.__reclaim(lease_path):
+                return False
+
+        try:
+            fd = os.open(lease_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            return False
+
+        token = f"{self.__node_id}-{uuid.uuid4().hex}"
+
+        with os.fdopen(fd, "w") as f:
+            json.dump(
+                {"node": self.__node_id, "token": token, "claimed": time.time()}, f
+            )
+
+        with self.__lock:
+            self.__held[name] = token
+
+        # Another node reclaiming at the same time could have moved our fresh
+        # lease away before we wrote the token, in that case it isn't ours
+        if not self.is_held(name):
+            with self.__lock:
+                self.__held.pop(name, None)
+
+            return False
+
+        # The item might have been completed by another node
+        # between our first check and creating the lease
+        if self.is_done(name):
+            self.release(name)
+            return False
+
+        self.__start_heartbeat()
+        return True
+
+    def __reclaim(self, lease_path: Path) -> bool:
+        # Move the abandoned lease out of the way first, rename is atomic so
+        # only one of the nodes racing for it will succeed. The lease could
+        # still have been renewed or replaced between our check and the
+        # rename, so whatever we moved is checked again and put back if it
+        # turns out to be alive.
+        token = self.__read_token(lease_path)
+        stale_path = lease_path.with_name(
+            f"{lease_path.name}.{self.__node_id}-{uuid.uuid4().hex}"
+        )
+
+        try:
+            lease_path.rename(stale_path)
+        except FileNotFoundError:
+            return False
+
+        if self.__is_stale(stale_path) and self.__read_token(stale_path) == token:
+            stale_path.unlink(missing_ok=True)
+            return True
+
+        try:
+            # Link fails if somebody already created a new lease meanwhile,
+            # that one wins and the one we moved is gone for good
+            os.link(stale_path, lease_path)
+        except FileExistsError:
+            pass
+        except OSError:
+            # No hard links on this filesystem, rename can't overwrite on
+            # Windows but would on POSIX, so only use it when the path is free
+            if not lease_path.exists():
+                stale_path.rename(lease_path)
+
+        stale_path.unlink(missing_ok=True)
+        return False
+
+    def renew(self, name: str) -> None:
+        with self.__lock:
+            token = self.__held.get(name)
+
+        lease_path = self.__lease_path(name)
+        current = self.__read_token(lease_path)
+
+        if token is None or current is None:
+            # Missing lease might just be moved aside by a node checking it,
+            # it will be put back if it's still alive
+            return
+
+        if current != token:
+            # Another node took it over, stop renewing it
+            with self.__lock:
+                self.__held.pop(name, None)
+
+            return
+
+        try:
+            os.utime(lease_path)
+        except FileNotFoundError:
+            pass
+
+    def complete(self, name: str) -> None:
+        with open(self.__done_path(name), "w") as f:
+            json.dump({"node": self.__node_id, "completed": time.time()}, f)
+
+        self.release(name)
+
+    def release(self, name: str) -> None:
+        # Never remove a lease another node holds now
+        if self.is_held(name):
+            self.__lease_path(name).unlink(missing_ok=True)
+
+        with self.__lock:
+            self.__held.pop(name, None)
+
+    def close(self) -> None:
+        self.__stopped.set()
+
+        if self.__heartbeat is not None:
+            self.__heartbeat.join()
+            self.__heartbeat = None
+
+        with self.__lock:
+            names = list(self.__held)
+
+        for name in names:
+            self.release(name)
+
+    def __start_heartbeat(self) -> None:
+        with self.__lock:
+            if self.__heartbeat is not None:
+                return
+
+            self.__stopped.clear()
+            self.__heartbeat = threading.Thread(
+                target=self.__renew_held, name="lease-heartbeat", daemon=True
+            )
+            self.__heartbeat.start()
+
+    def __renew_held(self) -> None:
+        # Renewing a few times per timeout keeps the leases alive without
+        # hammering the shared filesystem, no matter how fast data arrives
+        while not self.__stopped.wait(self.__timeout / 4):
+            with self.__lock:
+                names = list(self.__held)
+
+            for name in names:
+                self.renew(name)
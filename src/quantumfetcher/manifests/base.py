@@ -1,4 +1,5 @@
 from abc import ABC, abstractmethod
+from typing import Any
 
 
 class BaseManifest(ABC):
@@ -6,3 +7,12 @@ class BaseManifest(ABC):
     @abstractmethod
     def save(self, path, streams) -> None:
         raise NotImplementedError("This method should be implemented by subclasses.")
+
+    @abstractmethod
+    def to_snapshot(self) -> dict[str, Any]:
+        raise NotImplementedError("This method should be implemented by subclasses.")
+
+    @classmethod
+    @abstractmethod
+    def from_snapshot(cls, data: dict[str, Any]) -> "BaseManifest":
+        raise NotImplementedError("This method should be implemented by subclasses.")
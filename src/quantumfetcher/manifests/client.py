@@ -1,5 +1,8 @@
 import xml.etree.ElementTree as ET
+from typing import Any
 
+from quantumfetcher.dataclasses.chunk_list import ChunkList
+from quantumfetcher.dataclasses.quality_level import QualityLevel
 from quantumfetcher.dataclasses.stream import ClientStream
 from quantumfetcher.dataclasses.stream_audio import AudioStream
 from quantumfetcher.dataclasses.stream_text import TextStream
@@ -7,6 +10,65 @@ from quantumfetcher.dataclasses.stream_video import VideoStream
 from quantumfetcher.enumerators.language import Language
 from quantumfetcher.enumerators.type_stream import StreamType
 from quantumfetcher.manifests.base import BaseManifest
+from quantumfetcher.manifests.writer import XMLWriter
+
+
+# Streaming parser target, receives elements one by one straight from expat
+# without building the document tree, chunk durations go into compact runs
+class ClientManifestParser:
+
+    def __init__(self) -> None:
+        self.__headers: dict[str, str] = {}
+        self.__streams: list[ClientStream] = []
+        self.__stream: ClientStream | None = None
+        self.__depth = 0
+
+    def start(self, tag: str, attrib: dict[str, str]):
+        self.__depth += 1
+
+        if self.__depth == 1:
+            # Extract headers attributes
+            self.__headers = attrib
+        elif self.__depth == 2 and tag == "StreamIndex":
+            self.__stream = ClientStream(
+                type=StreamType(attrib.get("Type")),
+                attributes=attrib,
+                qualityLevels=[],
+                chunks=ChunkList(),
+            )
+        elif self.__depth == 3 and self.__stream is not None:
+            if tag == "QualityLevel":
+                self.__stream.qualityLevels.append(QualityLevel.from_attributes(attrib))
+            elif tag == "c":
+                self.__parse_chunk(self.__stream.chunks, attrib)
+
+    def end(self, tag: str):
+        self.__depth -= 1
+
+        if self.__depth == 1 and self.__stream is not None:
+            self.__streams.append(self.__stream)
+            self.__stream = None
+
+    def close(self) -> tuple[dict[str, str], list[ClientStream]]:
+        return self.__headers, self.__streams
+
+    def __parse_chunk(self, chunks: ChunkList, attributes: dict[str, str]):
+        if "d" not in attributes:
+            return
+
+        if "n" in attributes:
+            chunk_number = int(attributes["n"])
+
+            if chunk_number != chunks.count:
+                raise ValueError(
+                    f"Chunk number mismatch: expected {len(chunks)}, got {chunk_number}"
+                )
+
+        chunks.append(
+            duration=int(attributes["d"]),
+            repeat=int(attributes.get("r", 1)),
+            start=int(attributes["t"]) if "t" in attributes else None,
+        )
 
 
 class ClientManifest(BaseManifest):
@@ -15,46 +77,55 @@ class ClientManifest(BaseManifest):
     __streams: list[ClientStream]
 
     def __init__(self, content: str) -> None:
-        tree = ET.ElementTree(ET.fromstring(content))
-        root = tree.getroot()
-
-        # Extract headers attributes
-        self.__headers = root.attrib  # type: ignore
-
-        self.__parse_stream_indexes(root)
+        parser = ET.XMLParser(target=ClientManifestParser())
+        parser.feed(content)
 
-    def __parse_stream_indexes(self, root):
-        self.__streams = []
+        self.__headers, self.__streams = parser.close()
 
-        for stream in root.findall("StreamIndex"):
-            qualityLevels = []
-            chunks = []
-
-            for ql in stream.findall("QualityLevel"):
-                qualityLevels.append(ql.attrib)
+    def to_snapshot(self) -> dict[str, Any]:
+        return {
+            "headers": self.__headers,
+            "streams": [
+                {
+                    "type": stream.type.value,
+                    "attributes": stream.attributes,
+                    "qualityLevels": [ql.attributes for ql in stream.qualityLevels],
+                    "chunks": [
+                        stream.chunks.starts.tolist(),
+                        stream.chunks.durations.tolist(),
+                        stream.chunks.repeats.tolist(),
+                    ],
+                }
+                for stream in self.__streams
+            ],
+        }
 
-            for chunk in stream.findall("c"):
-                if "n" in chunk.attrib and "d" in chunk.attrib:
-                    # If 'n' is present, override the chunk number
-                    chunk_number = int(chunk.attrib["n"])
+    @classmethod
+    def from_snapshot(cls, data: dict[str, Any]) -> "ClientManifest":
+        manifest = cls.__new__(cls)
+        manifest.__headers = data["headers"]
+        manifest.__streams = []
 
-                    if chunk_number != len(chunks):
-                        raise ValueError(
-                            f"Chunk number mismatch: expected {len(chunks)}, got {chunk_number}"
-                        )
+        for stream in data["streams"]:
+            chunks = ChunkList()
 
-                    # Convert to int and add to qualityLevels
-                    chunks.append(int(chunk.attrib["d"]))
+            for start, duration, repeat in zip(*stream["chunks"]):
+                chunks.append(duration=duration, repeat=repeat, start=start)
 
-            self.__streams.append(
+            manifest.__streams.append(
                 ClientStream(
-                    type=StreamType(stream.attrib.get("Type")),
-                    attributes=stream.attrib,
-                    qualityLevels=qualityLevels,
+                    type=StreamType(stream["type"]),
+                    attributes=stream["attributes"],
+                    qualityLevels=[
+                        QualityLevel.from_attributes(ql)
+                        for ql in stream["qualityLevels"]
+                    ],
                     chunks=chunks,
                 )
             )
 
+        return manifest
+
     def list_video_streams(self):
         streams = []
 
@@ -65,10 +136,10 @@ class ClientManifest(BaseManifest):
             for ql in stream.qualityLevels:
                 streams.append(
                     VideoStream(
-                        width=int(ql.get("MaxWidth", -1)),
-                        height=int(ql.get("MaxHeight", -1)),
-                        bitrate=int(ql.get("Bitrate", -1)),
-                        codec=ql.get("FourCC", ""),
+                        width=ql.width,
+                        height=ql.height,
+                        bitrate=ql.bitrate,
+                        codec=ql.codec,
                     )
                 )
 
@@ -86,11 +157,11 @@ class ClientManifest(BaseManifest):
                     AudioStream(
                         name=stream.attributes.get("Name", ""),
                         language=Language(stream.attributes.get("Language", "unk")),
-                        bitrate=int(ql.get("Bitrate", -1)),
-                        samplingRate=int(ql.get("SamplingRate", -1)),
-                        channels=int(ql.get("Channels", -1)),
-                        bitsPerSample=int(ql.get("BitsPerSample", -1)),
-                        codec=ql.get("FourCC", ""),
+                        bitrate=ql.bitrate,
+                        samplingRate=ql.samplingRate,
+                        channels=ql.channels,
+                        bitsPerSample=ql.bitsPerSample,
+                        codec=ql.codec,
                     )
                 )
 
@@ -108,8 +179,8 @@ class ClientManifest(BaseManifest):
                     TextStream(
                         name=stream.attributes.get("Name", ""),
                         language=Language(stream.attributes.get("Language", "unk")),
-                        bitrate=int(ql.get("Bitrate", -1)),
-                        codec=ql.get("FourCC", ""),
+                        bitrate=ql.bitrate,
+                        codec=ql.codec,
                     )
                 )
 
@@ -140,65 +211,137 @@ class ClientManifest(BaseManifest):
         else:
             return -1
 
-    def save(self, path, streams) -> None:
-        root = ET.Element("SmoothStreamingMedia", attrib=self.__headers)
+    def get_duration(self, mediaType: StreamType = StreamType.Video) -> float:
+        # In seconds, summed up from the chunks of the first stream of that type
+        timescale = int(self.__headers.get("TimeScale", 10_000_000))
 
+        for stream in self.__streams:
+            if stream.type == mediaType:
+                return sum(d * r for _, d, r in stream.chunks.runs()) / timescale
+
+        return int(self.__headers.get("Duration", 0)) / timescale
+
+    def save(
+        self,
+        path,
+        streams,
+        compact_chunks: bool = False,
+        chunk_counts: dict | None = None,
+    ) -> None:
+        # With chunk counts (per selected stream) only that many chunks are
+        # written, for episodes that are still being downloaded
         video_bitrates = {s.bitrate for s in streams if isinstance(s, VideoStream)}
         named_streams = {
             (
                 StreamType.Audio if isinstance(s, AudioStream) else StreamType.Text,
                 s.name,
                 s.language.value,
-            )
+            ): (chunk_counts[s] if chunk_counts else None)
             for s in streams
             if not isinstance(s, VideoStream)
         }
+        video_chunks = (
+            min(chunk_counts[s] for s in streams if isinstance(s, VideoStream))
+            if chunk_counts and video_bitrates
+            else None
+        )
 
-        def add_video_stream(stream):
-            stream_index = ET.SubElement(root, "StreamIndex", attrib=stream.attributes)
-            max_width = max_height = ql_idx = 0
-            for ql in stream.qualityLevels:
-                if int(ql.get("Bitrate", -1)) in video_bitrates:
-                    max_width = max(max_width, int(ql.get("MaxWidth", 0)))
-                    max_height = max(max_height, int(ql.get("MaxHeight", 0)))
-                    ql["Index"] = str(ql_idx)
-                    ql_idx += 1
-                    quality_level = ET.SubElement(
-                        stream_index, "QualityLevel", attrib=ql
-                    )
-                    quality_level.set("Bitrate", str(ql.get("Bitrate", -1)))
-            for idx, chunk in enumerate(stream.chunks):
-                ET.SubElement(stream_index, "c", n=str(idx), d=str(chunk))
-            stream_index.attrib.update(
-                {
-                    "QualityLevels": str(ql_idx),
-                    "MaxWidth": str(max_width),
-                    "MaxHeight": str(max_height),
-                    "DisplayWidth": str(max_width),
-                    "DisplayHeight": str(max_height),
-                }
-            )
+        written_streams = []
 
-        def add_named_stream(stream):
+        for stream in self.__streams:
             key = (
                 stream.type,
                 stream.attributes.get("Name"),
                 stream.attributes.get("Language"),
             )
-            if key not in named_streams:
-                return
-            stream_index = ET.SubElement(root, "StreamIndex", attrib=stream.attributes)
-            for ql in stream.qualityLevels:
-                ET.SubElement(stream_index, "QualityLevel", attrib=ql)
-            for idx, chunk in enumerate(stream.chunks):
-                ET.SubElement(stream_index, "c", n=str(idx), d=str(chunk))
 
-        for stream in self.__streams:
             if stream.type == StreamType.Video:
-                add_video_stream(stream)
-            elif stream.type in (StreamType.Audio, StreamType.Text):
-                add_named_stream(stream)
+                count = video_chunks
+            elif key in named_streams:
+                count = named_streams[key]
+            else:
+                continue
+
+            chunks = stream.chunks if count is None else stream.chunks.head(count)
+            written_streams.append((stream, chunks, count is not None))
+
+        def get_attributes(attributes, chunks, limited):
+            return dict(attributes, Chunks=str(len(chunks))) if limited else attributes
+
+        def write_chunks(writer, chunks):
+            idx = expected_start = 0
+
+            for start, duration, repeat in chunks.runs():
+                # Start time is only needed when there's a gap in the timeline
+                timing = {"t": str(start)} if start != expected_start else {}
+                expected_start = start + duration * repeat
+
+                if compact_chunks:
+                    if repeat > 1:
+                        timing["r"] = str(repeat)
+
+                    writer.element("c", n=str(idx), d=str(duration), **timing)
+                    idx += repeat
+                    continue
+
+                for _ in range(repeat):
+                    writer.element("c", n=str(idx), d=str(duration), **timing)
+                    timing = {}
+                    idx += 1
+
+        def write_video_stream(writer, stream, chunks, limited):
+            quality_levels = [
+                ql for ql in stream.qualityLevels if ql.bitrate in video_bitrates
+            ]
+            max_width = max([0] + [ql.width for ql in quality_levels])
+            max_height = max([0] + [ql.height for ql in quality_levels])
+
+            writer.start(
+                "StreamIndex",
+                dict(
+                    get_attributes(stream.attributes, chunks, limited),
+                    QualityLevels=str(len(quality_levels)),
+                    MaxWidth=str(max_width),
+                    MaxHeight=str(max_height),
+                    DisplayWidth=str(max_width),
+                    DisplayHeight=str(max_height),
+                ),
+            )
+
+            for ql_idx, ql in enumerate(quality_levels):
+                writer.element(
+                    "QualityLevel",
+                    dict(ql.attributes, Index=str(ql_idx), Bitrate=str(ql.bitrate)),
+                )
+
+            write_chunks(writer, chunks)
+            writer.end()
+
+        def write_named_stream(writer, stream, chunks, limited):
+            writer.start(
+                "StreamIndex", get_attributes(stream.attributes, chunks, limited)
+            )
+
+            for ql in stream.qualityLevels:
+                writer.element("QualityLevel", ql.attributes)
+
+            write_chunks(writer, chunks)
+            writer.end()
+
+        headers = self.__headers
+        limited_ends = [chunks.end for _, chunks, limited in written_streams if limited]
+
+        if limited_ends:
+            # Playback ends with the shortest of the written streams
+            headers = dict(headers, Duration=str(min(limited_ends)))
+
+        with XMLWriter(path, encoding="UTF-8") as writer:
+            writer.start("SmoothStreamingMedia", headers)
+
+            for stream, chunks, limited in written_streams:
+                if stream.type == StreamType.Video:
+                    write_video_stream(writer, stream, chunks, limited)
+                else:
+                    write_named_stream(writer, stream, chunks, limited)
 
-        tree = ET.ElementTree(root)
-        ET.indent(tree, space="  ", level=0)
-        tree.write(path, xml_declaration=True, encoding="UTF-8")
+            writer.end()
@@ -1,4 +1,6 @@
 import xml.etree.ElementTree as ET
+from bisect import bisect_left, bisect_right
+from typing import Any
 
 from quantumfetcher.constants import SMIL_NS
 from quantumfetcher.dataclasses.stream import ServerStream
@@ -7,12 +9,14 @@ from quantumfetcher.dataclasses.stream_text import TextStream
 from quantumfetcher.dataclasses.stream_video import VideoStream
 from quantumfetcher.enumerators.type_stream import StreamType
 from quantumfetcher.manifests.base import BaseManifest
+from quantumfetcher.manifests.writer import XMLWriter
 
 
 class ServerManifest(BaseManifest):
 
     __headers: dict[str, str]
     __streams: list[ServerStream]
+    __index: dict[tuple[StreamType, str | None], tuple[list[int], list[ServerStream]]]
 
     def __init__(self, content: str) -> None:
         tree = ET.ElementTree(ET.fromstring(content))
@@ -20,6 +24,11 @@ class ServerManifest(BaseManifest):
 
         self.__parse_headers(root)
         self.__parse_media_streams(root)
+        self.__build_index()
+
+    @property
+    def streams(self) -> list[ServerStream]:
+        return self.__streams
 
     def __parse_headers(self, root):
         self.__headers = {}
@@ -56,86 +65,118 @@ class ServerManifest(BaseManifest):
                     )
                 )
 
-    def __get_all_bitrates(self, type, trackName=None):
-        output = []
+    def to_snapshot(self) -> dict[str, Any]:
+        return {
+            "headers": self.__headers,
+            "streams": [
+                {
+                    "type": stream.type.value,
+                    "attributes": stream.attributes,
+                    "parameters": stream.parameters,
+                }
+                for stream in self.__streams
+            ],
+        }
+
+    @classmethod
+    def from_snapshot(cls, data: dict[str, Any]) -> "ServerManifest":
+        manifest = cls.__new__(cls)
+        manifest.__headers = data["headers"]
+        manifest.__streams = [
+            ServerStream(
+                type=StreamType(stream["type"]),
+                attributes=stream["attributes"],
+                parameters=stream["parameters"],
+            )
+            for stream in data["streams"]
+        ]
+        manifest.__build_index()
+
+        return manifest
+
+    def __build_index(self):
+        # Streams sorted by bitrate for every type, both across all tracks
+        # and per track name, so lookups are a binary search instead of a scan
+        groups: dict[tuple[StreamType, str | None], list[ServerStream]] = {}
 
         for stream in self.__streams:
-            if stream.type != type:
-                continue
+            groups.setdefault((stream.type, None), []).append(stream)
 
-            if trackName and stream.parameters.get("trackName") != trackName:
-                continue
+            trackName = stream.parameters.get("trackName")
+            if trackName:
+                groups.setdefault((stream.type, trackName), []).append(stream)
 
-            output.append(int(stream.attributes.get("systemBitrate", -1)))
+        self.__index = {}
 
-        return output
+        for key, streams in groups.items():
+            # Sort is stable, so streams with equal bitrates keep manifest order
+            streams.sort(key=lambda s: int(s.attributes.get("systemBitrate", -1)))
+            bitrates = [int(s.attributes.get("systemBitrate", -1)) for s in streams]
 
-    def __get_stream(self, type, bitrate, trackName=None):
-        for stream in self.__streams:
-            if stream.type != type:
-                continue
+            self.__index[key] = (bitrates, streams)
 
-            if trackName and stream.parameters.get("trackName") != trackName:
-                continue
+    def __get_closest_lte(self, type, bitrate, trackName=None):
+        bitrates, streams = self.__index.get((type, trackName or None), ([], []))
 
-            if int(stream.attributes.get("systemBitrate", -1)) == bitrate:
-                return stream
+        position = bisect_right(bitrates, bitrate)
+        if position == 0:
+            return None
 
-    def __get_closest_lte(self, vals, target):
-        filtered = [n for n in vals if n <= target]
-        return max(filtered) if filtered else None
+        # First stream in manifest order having the closest bitrate
+        return streams[bisect_left(bitrates, bitrates[position - 1])]
 
     def get_video_stream(self, bitrate):
-        bitrates = self.__get_all_bitrates(StreamType.Video)
-        closest_match = self.__get_closest_lte(bitrates, bitrate)
-        return self.__get_stream(StreamType.Video, closest_match)
+        return self.__get_closest_lte(StreamType.Video, bitrate)
 
     def get_named_stream(self, name, type, bitrate):
-        bitrates = self.__get_all_bitrates(type, trackName=name)
-        closest_match = self.__get_closest_lte(bitrates, bitrate)
-        return self.__get_stream(type, closest_match, trackName=name)
+        return self.__get_closest_lte(type, bitrate, trackName=name)
 
-    def save(self, path, streams):
-        root = ET.Element("smil", xmlns=SMIL_NS["smil"])
-
-        # Add headers
-        head = ET.SubElement(root, "head")
-        for name, content in self.__headers.items():
-            ET.SubElement(head, "meta", name=name, content=content)
-
-        # Prepare body and switch
-        body = ET.SubElement(root, "body")
-        switch = ET.SubElement(body, "switch")
-
-        def resolve_stream(stream):
-            if isinstance(stream, VideoStream):
-                return self.get_video_stream(stream.bitrate)
-            if isinstance(stream, AudioStream):
-                return self.get_named_stream(
-                    stream.name, StreamType.Audio, stream.bitrate
-                )
-            if isinstance(stream, TextStream):
-                return self.get_named_stream(
-                    stream.name, StreamType.Text, stream.bitrate
-                )
+    def resolve_stream(self, stream) -> ServerStream | None:
+        if isinstance(stream, VideoStream):
+            return self.get_video_stream(stream.bitrate)
+        if isinstance(stream, AudioStream):
+            return self.get_named_stream(stream.name, StreamType.Audio, stream.bitrate)
+        if isinstance(stream, TextStream):
+            return self.get_named_stream(stream.name, StreamType.Text, stream.bitrate)
 
-            raise ValueError(f"Unsupported stream type: {type(stream)}")
+        raise ValueError(f"Unsupported stream type: {type(stream)}")
 
+    def resolve_streams(self, streams) -> list[ServerStream | None]:
+        return [self.resolve_stream(stream) for stream in streams]
+
+    def save(self, path, streams):
         # Filter and resolve streams
-        new_streams = [s for s in (resolve_stream(stream) for stream in streams) if s]
+        new_streams = [s for s in self.resolve_streams(streams) if s]
+
+        with XMLWriter(path) as writer:
+            writer.start("smil", xmlns=SMIL_NS["smil"])
+
+            # Add headers
+            writer.start("head")
+            for name, content in self.__headers.items():
+                writer.element("meta", name=name, content=content)
+            writer.end()
+
+            # Prepare body and switch
+            writer.start("body")
+            writer.start("switch")
+
+            for stream in new_streams:
+                tag = (
+                    stream.type.value
+                    if stream.type != StreamType.Text
+                    else "textstream"
+                )
+                writer.start(tag, stream.attributes)
 
-        for stream in new_streams:
-            tag = stream.type.value if stream.type != StreamType.Text else "textstream"
-            element = ET.SubElement(switch, tag, attrib=stream.attributes)
+                for name, value in stream.parameters.items():
+                    writer.element("param", name=name, value=value, valuetype="data")
 
-            for name, value in stream.parameters.items():
-                ET.SubElement(
-                    element, "param", name=name, value=value, valuetype="data"
-                )
+                writer.end()
 
-        tree = ET.ElementTree(root)
-        ET.indent(tree, space="  ", level=0)
-        tree.write(path, encoding="utf-8", xml_declaration=True)
+            writer.end()
+            writer.end()
+            writer.end()
 
     def get_client_manifest_path(self) -> str | None:
         return self.__headers.get("clientManifestRelativePath")
@@ -0,0 +1,138 @@
+import hashlib
+import json
+import os
+import struct
+import time
+import zlib
+from pathlib import Path
+from typing import Callable
+
+from quantumfetcher.constants import MANIFEST_CACHE_TTL
+from quantumfetcher.enumerators.type_manifest import ManifestType
+from quantumfetcher.manifests.base import BaseManifest
+from quantumfetcher.manifests.client import ClientManifest
+from quantumfetcher.manifests.server import ServerManifest
+
+
+# Parsed manifests compiled to disk, one file per manifest URL so every
+# episode is only loaded when it's needed. Each file is a small header
+# (magic, format version, CRC32 and length of the payload) followed by
+# zlib compressed JSON produced by the manifest to_snapshot() method.
+# Snapshots younger than ttl are used as they are. Older ones are checked
+# against the ETag and Last-Modified the server sent with the manifest and
+# used for another ttl if they still match, manifests from servers that send
+# neither are fetched again.
+class SnapshotCache:
+
+    __magic = b"QFMS"
+    __version = 2
+    __header = struct.Struct(">4sHII")
+
+    def __init__(
+        self, path: Path, refresh: bool = False, ttl: float = MANIFEST_CACHE_TTL
+    ):
+        self.__path = path
+        self.__refresh = refresh
+        self.__ttl = ttl
+
+    def __snapshot_path(self, manifest_type: ManifestType, manifest_url: str) -> Path:
+        digest = hashlib.sha256(manifest_url.encode()).hexdigest()
+        return self.__path / f"{manifest_type.value.lower()}-{digest}.qfms"
+
+    def load(
+        self,
+        manifest_type: ManifestType,
+        manifest_url: str,
+        get_validators: Callable[[], dict[str, str] | None] | None = None,
+    ) -> BaseManifest | None:
+        if self.__refresh:
+            return None
+
+        path = self.__snapshot_path(manifest_type, manifest_url)
+
+        try:
+            with open(path, "rb") as f:
+                raw = f.read()
+                age = time.time() - os.fstat(f.fileno()).st_mtime
+        except FileNotFoundError:
+            return None
+
+        if len(raw) < self.__header.size:
+            return None
+
+        magic, version, checksum, length = self.__header.unpack_from(raw)
+        payload = raw[self.__header.size :]
+
+        # Snapshots from other versions or damaged ones are just rebuilt
+        if (
+            magic != self.__magic
+            or version != self.__version
+            or length != len(payload)
+            or checksum != zlib.crc32(payload)
+        ):
+            return None
+
+        data = json.loads(zlib.decompress(payload))
+
+        if data["url"] != manifest_url:
+            return None
+
+        if age >= self.__ttl and get_validators is not None:
+            if not self.__revalidate(path, data, get_validators):
+                return None
+
+        match manifest_type:
+            case ManifestType.Client:
+                return ClientManifest.from_snapshot(data["manifest"])
+            case ManifestType.Server:
+                return ServerManifest.from_snapshot(data["manifest"])
+
+    def __revalidate(
+        self,
+        path: Path,
+        data: dict,
+        get_validators: Callable[[], dict[str, str] | None],
+    ) -> bool:
+        validators = get_validators()
+
+        # Server can't be asked, fetching the manifest would fail too
+        if validators is None:
+            return True
+
+        if not data["validators"] or data["validators"] != validators:
+            return False
+
+        # Still the same, good for another ttl
+        os.utime(path)
+        return True
+
+    def save(
+        self,
+        manifest_type: ManifestType,
+        manifest_url: str,
+        manifest: BaseManifest,
+        validators: dict[str, str] | None = None,
+    ):
+        data = {
+            "url": manifest_url,
+            "validators": validators or {},
+            "manifest": manifest.to_snapshot(),
+        }
+        payload = zlib.compress(json.dumps(data, separators=(",", ":")).encode("utf-8"))
+
+        path = self.__snapshot_path(manifest_type, manifest_url)
+        path.parent.mkdir(parents=True, exist_ok=True)
+
+        # Write to a temporary file first, so a concurrent or interrupted
+        # run never leaves a half written snapshot behind
+        temp_path = path.with_suffix(f".{os.getpid()}.tmp")
+
+        with open(temp_path, "wb") as f:
+            f.write(
+                self.__header.pack(
+                    self.__magic, self.__version, zlib.crc32(payload), len(payload)
+                )
+            )
+            f.write(payload)
+
+        os.replace(temp_path, path)
@@ -0,0 +1,86 @@
+from concurrent.futures import Future
+from threading import Lock
+from typing import Callable
+
+from quantumfetcher.constants import PIPELINE_DEPTH
+from quantumfetcher.enumerators.type_manifest import ManifestType
+from quantumfetcher.manifests.base import BaseManifest
+from quantumfetcher.video_list import VideoList
+
+
+# Manifests of the selected episodes, each one is fetched only when something
+# actually needs it and kept until it's released. Fetching the same manifest
+# from several threads at once makes only one request.
+class ManifestStore:
+
+    def __init__(
+        self,
+        video_list: VideoList,
+        episodes: list[str],
+        fetch_manifest: Callable[[ManifestType, str], BaseManifest],
+    ):
+        self.__video_list = video_list
+        self.__episodes = episodes
+        self.__fetch_manifest = fetch_manifest
+
+        self.__lock = Lock()
+        self.__pending: dict[tuple[str, ManifestType], Future] = {}
+
+    @property
+    def episodes(self) -> list[str]:
+        return self.__episodes
+
+    def __get_manifest_url(self, episode_id: str, manifest_type: ManifestType) -> str:
+        match manifest_type:
+            case ManifestType.Client:
+                return self.__video_list.episode_list[episode_id]
+            case ManifestType.Server:
+                return self.__video_list.get_server_manifest_url(episode_id)
+
+    def __fetch(self, episode_id: str, manifest_type: ManifestType) -> BaseManifest:
+        return self.__fetch_manifest(
+            manifest_type, self.__get_manifest_url(episode_id, manifest_type)
+        )
+
+    def get(self, episode_id: str, manifest_type: ManifestType) -> BaseManifest:
+        key = (episode_id, manifest_type)
+
+        with self.__lock:
+            future = self.__pending.get(key)
+            fetch_now = future is None
+
+            if fetch_now:
+                future = self.__pending[key] = Future()
+
+        if fetch_now:
+            try:
+                future.set_result(self.__fetch(episode_id, manifest_type))
+            except BaseException as e:
+                future.set_exception(e)
+
+        try:
+            return future.result()
+        except BaseException:
+            # Let the next call try again instead of failing forever
+            with self.__lock:
+                if self.__pending.get(key) is future:
+                    del self.__pending[key]
+
+            raise
+
+    def release(self, episode_id: str):
+        # Fetched again if needed, from the snapshot cache when there's one
+        with self.__lock:
+            for manifest_type in ManifestType:
+                self.__pending.pop((episode_id, manifest_type), None)
+
+    def release_unless_next(self, episode_id: str):
+        # Manifests read ahead of the download (indexing, sizing) are only
+        # kept for the episodes the download pipeline starts with, so memory
+        # doesn't grow with the number of episodes
+        if episode_id not in self.__episodes[: PIPELINE_DEPTH + 1]:
+            self.release(episode_id)
+
+    def close(self):
+        with self.__lock:
+            self.__pending.clear()
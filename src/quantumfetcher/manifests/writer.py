@@ -0,0 +1,89 @@
+import os
+from pathlib import Path
+from types import TracebackType
+
+
+# Writes XML straight to the file as elements are produced, indented the same
+# way ElementTree.indent does it, without building the document tree first.
+# The file is only put in place once complete, so readers never see half of it.
+class XMLWriter:
+
+    __attribute_escapes = str.maketrans(
+        {
+            "&": "&amp;",
+            "<": "&lt;",
+            ">": "&gt;",
+            '"': "&quot;",
+            "\n": "&#10;",
+            "\r": "&#13;",
+            "\t": "&#09;",
+        }
+    )
+
+    def __init__(self, path: Path, encoding: str = "utf-8", indent: str = "  "):
+        self.__path = path
+        self.__temp_path = path.with_name(f"{path.name}.tmp")
+        self.__file = open(self.__temp_path, "w", encoding="utf-8", newline="\n")
+        self.__indent = indent
+        self.__tags: list[str] = []
+        self.__open_tag = False
+
+        self.__file.write(f"<?xml version='1.0' encoding='{encoding}'?>\n")
+
+    def __enter__(self) -> "XMLWriter":
+        return self
+
+    def __exit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc_value: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> None:
+        if exc_type is None:
+            self.close()
+            return
+
+        self.__file.close()
+        self.__temp_path.unlink(missing_ok=True)
+
+    def __close_open_tag(self):
+        if self.__open_tag:
+            self.__file.write(">")
+            self.__open_tag = False
+
+    def start(self, tag: str, attrib: dict[str, str] | None = None, **extra: str):
+        self.__close_open_tag()
+
+        if self.__tags:
+            self.__file.write("\n" + self.__indent * len(self.__tags))
+
+        self.__file.write(f"<{tag}")
+
+        for name, value in {**(attrib or {}), **extra}.items():
+            self.__file.write(
+                f' {name}="{str(value).translate(self.__attribute_escapes)}"'
+            )
+
+        self.__tags.append(tag)
+        self.__open_tag = True
+
+    def end(self):
+        tag = self.__tags.pop()
+
+        if self.__open_tag:
+            self.__file.write(" />")
+            self.__open_tag = False
+            return
+
+        self.__file.write("\n" + self.__indent * len(self.__tags) + f"</{tag}>")
+
+    def element(self, tag: str, attrib: dict[str, str] | None = None, **extra: str):
+        self.start(tag, attrib, **extra)
+        self.end()
+
+    def close(self):
+        while self.__tags:
+            self.end()
+
+        self.__file.close()
+        os.replace(self.__temp_path, self.__path)
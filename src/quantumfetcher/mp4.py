@@ -0,0 +1,129 @@
+import os
+import struct
+from pathlib import Path
+
+BOX_HEADER = struct.Struct(">I4s")
+
+
+def read_tfra_entries(data, tfraOffset: int, path) -> list[tuple[int, int]]:
+    _, tfraMagic = BOX_HEADER.unpack_from(data, tfraOffset)
+
+    if tfraMagic != b"tfra":
+        raise ValueError(
+            f"Invalid tfra magic in track file {path} (Expected: tfra, Got: {tfraMagic})."
+        )
+
+    # version (1 byte), flags (3 bytes), track ID (4 bytes),
+    # length sizes of traf/trun/sample numbers (4 bytes), number of entries (4 bytes)
+    tfraOffset += BOX_HEADER.size
+    version, temp, numOfEntries = struct.unpack_from(">B7xII", data, tfraOffset)
+
+    lenSizeOfTrafNum = ((temp & 0x3F) >> 4) + 1
+    lenSizeOfTrunNum = ((temp & 0xC) >> 2) + 1
+    lenSizeOfSampleNum = ((temp & 0x3)) + 1
+
+    # Decode all entries at once, traf/trun/sample numbers aren't needed so
+    # they are just skipped as padding
+    timeFormat = "Q" if version == 1 else "I"
+    entry = struct.Struct(
+        f">{timeFormat}{timeFormat}{lenSizeOfTrafNum + lenSizeOfTrunNum + lenSizeOfSampleNum}x"
+    )
+    entriesOffset = tfraOffset + 16
+
+    return list(
+        entry.iter_unpack(
+            data[entriesOffset : entriesOffset + entry.size * numOfEntries]
+        )
+    )
+
+
+def get_mfra_size(data) -> int:
+    # Last 4 bytes of the file (end of mfro box) is the size of the mfra box
+    (mfroSize,) = struct.unpack_from(">I", data, len(data) - 4)
+    return mfroSize
+
+
+def get_fragment_offsets(data, path) -> list[tuple[int, int]]:
+    # Data is either the whole file or any tail of it containing the mfra box
+    mfroSize = get_mfra_size(data)
+    mfraOffset = len(data) - mfroSize
+
+    if mfraOffset < 0:
+        raise ValueError(
+            f"Invalid mfro block size in track file {path} (Got: {mfroSize})."
+        )
+
+    mfraBlockSize, mfraMagic = BOX_HEADER.unpack_from(data, mfraOffset)
+
+    if mfraBlockSize != mfroSize:
+        raise ValueError(
+            f"Invalid mfro block size in track file {path} (Expected: {mfroSize}, Got: {mfraBlockSize})."
+        )
+
+    if mfraMagic != b"mfra":
+        raise ValueError(
+            f"Invalid mfra magic in track file {path} (Expected: mfra, Got: {mfraMagic})."
+        )
+
+    return read_tfra_entries(data, mfraOffset + BOX_HEADER.size, path)
+
+
+def read_fragment_index(path: Path) -> tuple[list[tuple[int, int]], int]:
+    # Only the mfra box at the end of the file is read, fragments end where
+    # the next one starts, the last one where the mfra box starts
+    with open(path, "rb") as f:
+        size = f.seek(0, os.SEEK_END)
+
+        if size < BOX_HEADER.size:
+            raise ValueError(f"Track file {path} is too small.")
+
+        f.seek(size - 4)
+        (mfroSize,) = struct.unpack(">I", f.read(4))
+
+        if not BOX_HEADER.size <= mfroSize <= size:
+            raise ValueError(
+                f"Invalid mfro block size in track file {path} (Got: {mfroSize})."
+            )
+
+        f.seek(size - mfroSize)
+        data = f.read(mfroSize)
+
+    return get_fragment_offsets(data, path), size - mfroSize
+
+
+# Counts complete fragments (moof and mdat box pairs) at the start of a track
+# file that is still being written, continuing where the last scan stopped
+class FragmentScanner:
+
+    def __init__(self, path: Path):
+        self.__path = path
+        self.__offset = 0
+        self.__count = 0
+
+    @property
+    def count(self) -> int:
+        return self.__count
+
+    def scan(self, size: int) -> int:
+        if self.__offset + BOX_HEADER.size > size:
+            return self.__count
+
+        with open(self.__path, "rb") as f:
+            while self.__offset + BOX_HEADER.size <= size:
+                f.seek(self.__offset)
+                boxSize, boxType = BOX_HEADER.unpack(f.read(BOX_HEADER.size))
+
+                if boxSize == 1:
+                    # 64-bit size follows the box type
+                    (boxSize,) = struct.unpack(">Q", f.read(8))
+
+                if boxSize < BOX_HEADER.size or self.__offset + boxSize > size:
+                    # Box not written completely yet (or runs to the end of the file)
+                    break
+
+                self.__offset += boxSize
+
+                if boxType == b"mdat":
+                    self.__count += 1
+
+        return self.__count
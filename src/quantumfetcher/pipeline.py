@@ -0,0 +1,77 @@
+import queue
+import threading
+from types import TracebackType
+from typing import Any, Callable, Iterable, Iterator
+
+from quantumfetcher.constants import PIPELINE_DEPTH
+
+
+# One step of a pipeline, runs func over items in its own thread and hands the
+# results over through a bounded queue, so it never gets more than depth items
+# ahead of whoever consumes them. Items keep their order, None results are
+# dropped and errors are raised in the consumer.
+class Stage:
+
+    def __init__(
+        self,
+        name: str,
+        func: Callable[[Any], Any],
+        items: Iterable,
+        depth: int = PIPELINE_DEPTH,
+    ):
+        self.__queue: queue.Queue = queue.Queue(maxsize=depth)
+        self.__stopped = threading.Event()
+        self.__thread = threading.Thread(
+            target=self.__run, args=(func, items), name=f"stage-{name}", daemon=True
+        )
+        self.__thread.start()
+
+    def __enter__(self) -> "Stage":
+        return self
+
+    def __exit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc_value: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> None:
+        self.close()
+
+    def __iter__(self) -> Iterator:
+        while True:
+            result, error, done = self.__queue.get()
+
+            if error is not None:
+                raise error
+
+            if done:
+                return
+
+            yield result
+
+    def close(self):
+        # Whatever the thread is doing now is finished, nothing else is started
+        self.__stopped.set()
+
+    def __run(self, func: Callable[[Any], Any], items: Iterable):
+        try:
+            for item in items:
+                if self.__stopped.is_set():
+                    return
+
+                result = func(item)
+
+                if result is not None:
+                    self.__put((result, None, False))
+        except BaseException as e:
+            self.__put((None, e, True))
+        else:
+            self.__put((None, None, True))
+
+    def __put(self, entry: tuple[Any, BaseException | None, bool]):
+        while not self.__stopped.is_set():
+            try:
+                self.__queue.put(entry, timeout=0.1)
+                return
+            except queue.Full:
+                continue
@@ -0,0 +1,333 @@
+import asyncio
+import posixpath
+from pathlib import Path
+from typing import BinaryIO, Callable
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter, Retry
+from rich.console import Console
+
+from quantumfetcher.cache import DiskCache, read_entry_header, write_entry_header
+from quantumfetcher.constants import (
+    CHUNK_SIZE,
+    PROXY_PREFETCH_BLOCKS,
+    READ_SIZE,
+    USER_AGENT,
+)
+from quantumfetcher.httpio import (
+    get_byte_range,
+    parse_byte_range,
+    run_server,
+    send_head,
+)
+from quantumfetcher.video_list import VideoList
+
+
+# Caching proxy in front of the origin, clients either use it as an HTTP proxy
+# (absolute request URLs) or request origin paths from it directly. Ranged
+# requests are split into aligned blocks of CHUNK_SIZE bytes which are cached
+# separately, so overlapping ranges asked for by different clients share their
+# blocks. Concurrent requests for the same entry wait for a single upstream
+# fetch, so the origin sees every byte once while it stays in the cache.
+class CachingProxy:
+
+    def __init__(self, cache: DiskCache, video_list: VideoList | None = None):
+        self.__console = Console()
+        self.__cache = cache
+        self.__origins = self.__get_origins(video_list) if video_list else []
+        self.__inflight: dict[str, asyncio.Task] = {}
+
+        self.__served_bytes = 0
+        self.__upstream_bytes = 0
+        self.__upstream_requests = 0
+        self.__coalesced_requests = 0
+
+        self.__session = requests.Session()
+        self.__session.headers.update({"User-Agent": USER_AGENT})
+        # Clients may have this very proxy configured in their environment
+        self.__session.trust_env = False
+
+        retries = Retry(total=10, backoff_factor=3)
+
+        self.__session.mount("http://", HTTPAdapter(max_retries=retries))
+
+    def serve(self, address: str):
+        self.__console.log(
+            f"Proxying {len(self.__origins)} origin path(s) on http://{address}/ (press Ctrl+C to stop)"
+        )
+
+        try:
+            run_server(address, self.__respond)
+        except KeyboardInterrupt:
+            self.__console.log(
+                f"Proxy stopped. Served {self.__served_bytes} bytes, fetched {self.__upstream_bytes} bytes in {self.__upstream_requests} upstream request(s), {self.__coalesced_requests} request(s) coalesced."
+            )
+
+    @staticmethod
+    def __get_origins(video_list: VideoList) -> list[tuple[str, str]]:
+        origins = {}
+
+        for episode_id in video_list.episode_list:
+            url = urlsplit(video_list.get_server_manifest_url(episode_id))
+            prefix = posixpath.dirname(url.path).rstrip("/") + "/"
+            origins[prefix] = f"{url.scheme}://{url.netloc}"
+
+        # Longest prefix wins
+        return sorted(origins.items(), key=lambda o: len(o[0]), reverse=True)
+
+    def __get_upstream_url(self, target: str) -> str | None:
+        if target.lower().startswith("http://"):
+            return target
+
+        for prefix, origin in self.__origins:
+            if target.startswith(prefix):
+                return origin + target
+
+        return None
+
+    async def __respond(
+        self,
+        writer: asyncio.StreamWriter,
+        method: str,
+        target: str,
+        headers: dict[str, str],
+        keep_alive: bool,
+    ):
+        if method not in ("GET", "HEAD"):
+            return await send_head(writer, 405, 0, keep_alive)
+
+        url = self.__get_upstream_url(target)
+
+        if url is None:
+            return await send_head(writer, 404, 0, keep_alive)
+
+        byte_range = get_byte_range(headers)
+
+        try:
+            if method == "HEAD" or byte_range:
+                info = await self.__get_info(url)
+                response_headers = {
+                    "Content-Type": info["content_type"],
+                    "Accept-Ranges": "bytes",
+                }
+
+            if method == "HEAD":
+                return await send_head(
+                    writer, 200, info["length"], keep_alive, response_headers
+                )
+
+            if not byte_range:
+                return await self.__send_whole(writer, url, keep_alive)
+        except requests.HTTPError as e:
+            return await send_head(writer, e.response.status_code, 0, keep_alive)
+        except (requests.RequestException, ValueError):
+            return await send_head(writer, 502, 0, keep_alive)
+
+        size = info["length"]
+
+        try:
+            resolved_range = parse_byte_range(byte_range, size)
+        except ValueError:
+            return await send_head(writer, 400, 0, keep_alive)
+
+        if resolved_range is None:
+            response_headers["Content-Range"] = f"bytes */{size}"
+            return await send_head(writer, 416, 0, keep_alive, response_headers)
+
+        start, end = resolved_range
+        response_headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+
+        await send_head(writer, 206, end - start + 1, keep_alive, response_headers)
+        await self.__send_blocks(writer, url, size, start, end)
+
+    async def __get_info(self, url: str) -> dict:
+        f, metadata, _ = await self.__open_entry(
+            f"HEAD {url}", lambda temp_path: self.__fetch_info(url, temp_path)
+        )
+        f.close()
+
+        return metadata
+
+    async def __send_whole(
+        self, writer: asyncio.StreamWriter, url: str, keep_alive: bool
+    ):
+        f, metadata, offset = await self.__open_entry(
+            f"GET {url}", lambda temp_path: self.__fetch_body(url, temp_path)
+        )
+
+        with f:
+            size = f.seek(0, 2) - offset
+
+            await send_head(
+                writer,
+                200,
+                size,
+                keep_alive,
+                {"Content-Type": metadata["content_type"]},
+            )
+            await self.__send_file(writer, f, offset, size)
+
+    async def __send_blocks(
+        self, writer: asyncio.StreamWriter, url: str, size: int, start: int, end: int
+    ):
+        first, last = start // CHUNK_SIZE, end // CHUNK_SIZE
+        prefetched: dict[int, asyncio.Future] = {}
+
+        try:
+            for idx in range(first, last + 1):
+                # Next few blocks are fetched while this one is being sent
+                for ahead in range(idx, min(idx + PROXY_PREFETCH_BLOCKS, last + 1)):
+                    if ahead not in prefetched:
+                        prefetched[ahead] = asyncio.ensure_future(
+                            self.__get_entry(*self.__get_block(url, size, ahead))
+                        )
+
+                try:
+                    await prefetched.pop(idx)
+                    f, _, offset = await self.__open_entry(
+                        *self.__get_block(url, size, idx)
+                    )
+                except (requests.RequestException, ValueError) as e:
+                    # Headers are already out, all that's left is to drop the connection
+                    raise ConnectionAbortedError(e)
+
+                with f:
+                    block_start = idx * CHUNK_SIZE
+                    slice_start = max(start, block_start) - block_start
+                    slice_end = min(end + 1, block_start + CHUNK_SIZE) - block_start
+
+                    await self.__send_file(
+                        writer, f, offset + slice_start, slice_end - slice_start
+                    )
+        finally:
+            for future in prefetched.values():
+                future.cancel()
+
+    def __get_block(
+        self, url: str, size: int, idx: int
+    ) -> tuple[str, Callable[[Path], int]]:
+        block_start = idx * CHUNK_SIZE
+        block_end = min(block_start + CHUNK_SIZE, size) - 1
+
+        return (
+            f"GET {url} bytes={block_start}-{block_end}",
+            lambda temp_path: self.__fetch_body(
+                url, temp_path, (block_start, block_end)
+            ),
+        )
+
+    async def __send_file(
+        self, writer: asyncio.StreamWriter, f: BinaryIO, offset: int, count: int
+    ):
+        if count:
+            await asyncio.get_running_loop().sendfile(
+                writer.transport, f, offset, count
+            )
+            self.__served_bytes += count
+
+    async def __open_entry(
+        self, key: str, fetch: Callable[[Path], int]
+    ) -> tuple[BinaryIO, dict, int]:
+        for _ in range(3):
+            entry_path = await self.__get_entry(key, fetch)
+
+            try:
+                f = open(entry_path, "rb")
+            except FileNotFoundError:
+                # Evicted by other requests before we got to it
+                continue
+
+            metadata, offset = read_entry_header(f)
+            return f, metadata, offset
+
+        raise ValueError(f"Cache is too small to hold {key}")
+
+    async def __get_entry(self, key: str, fetch: Callable[[Path], int]) -> Path:
+        entry_path = self.__cache.get(key)
+
+        if entry_path is not None:
+            return entry_path
+
+        task = self.__inflight.get(key)
+
+        if task is None:
+            task = asyncio.ensure_future(self.__fetch_entry(key, fetch))
+            task.add_done_callback(lambda t: t.cancelled() or t.exception())
+            self.__inflight[key] = task
+        else:
+            self.__coalesced_requests += 1
+
+        # A client going away doesn't cancel the fetch others may be waiting for
+        return await asyncio.shield(task)
+
+    async def __fetch_entry(self, key: str, fetch: Callable[[Path], int]) -> Path:
+        temp_path = self.__cache.get_temp_path()
+
+        try:
+            size = await asyncio.to_thread(fetch, temp_path)
+
+            self.__upstream_requests += 1
+            self.__upstream_bytes += size
+
+            return self.__cache.add(key, temp_path)
+        except BaseException:
+            temp_path.unlink(missing_ok=True)
+            raise
+        finally:
+            del self.__inflight[key]
+
+    def __fetch_info(self, url: str, temp_path: Path) -> int:
+        with self.__session.head(url) as r:
+            r.raise_for_status()
+            length = r.headers.get("Content-Length", "")
+
+            # Chunked or otherwise unsized responses can't be served by range
+            if not length.isdecimal():
+                raise ValueError(f"Origin sent no usable Content-Length for {url}")
+
+            metadata = {
+                "length": int(length),
+                "content_type": r.headers.get(
+                    "Content-Type", "application/octet-stream"
+                ),
+            }
+
+        with open(temp_path, "wb") as f:
+            write_entry_header(f, metadata)
+
+        return 0
+
+    def __fetch_body(
+        self, url: str, temp_path: Path, byte_range: tuple[int, int] | None = None
+    ) -> int:
+        headers = {}
+
+        if byte_range:
+            headers["X-MS-Range"] = f"bytes={byte_range[0]}-{byte_range[1]}"
+
+        size = 0
+
+        with self.__session.get(url, headers=headers, stream=True) as r:
+            r.raise_for_status()
+
+            with open(temp_path, "wb") as f:
+                write_entry_header(
+                    f,
+                    {
+                        "content_type": r.headers.get(
+                            "Content-Type", "application/octet-stream"
+                        )
+                    },
+                )
+
+                for chunk in r.iter_content(chunk_size=READ_SIZE):
+                    f.write(chunk)
+                    size += len(chunk)
+
+        if byte_range and size != byte_range[1] - byte_range[0] + 1:
+            raise ValueError(
+                f"Origin returned {size} bytes for range {byte_range[0]}-{byte_range[1]} of {url}"
+            )
+
+        return size
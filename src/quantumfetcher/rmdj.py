@@ -0,0 +1,51 @@
+from typing import BinaryIO
+
+from quantumfetcher.constants import CHUNK_SIZE, RMDJ_ENCRYPTION_KEY
+
+
+class RMDJCodec:
+
+    __key = bytes(RMDJ_ENCRYPTION_KEY)
+
+    @staticmethod
+    def __xor(data: bytes, offset: int = 0) -> bytes:
+        if not data:
+            return b""
+
+        # XOR the whole block at once as a single big integer against the key
+        # repeated to the block length, which is orders of magnitude faster
+        # than doing it byte by byte in Python
+        key = RMDJCodec.__key
+        phase = offset % len(key)
+        key_stream = (key[phase:] + key[:phase]) * (len(data) // len(key) + 1)
+
+        return (
+            int.from_bytes(data, "little")
+            ^ int.from_bytes(key_stream[: len(data)], "little")
+        ).to_bytes(len(data), "little")
+
+    @staticmethod
+    def __xor_stream(reader: BinaryIO, writer: BinaryIO) -> int:
+        offset = 0
+
+        while block := reader.read(CHUNK_SIZE):
+            writer.write(RMDJCodec.__xor(block, offset))
+            offset += len(block)
+
+        return offset
+
+    @staticmethod
+    def encrypt(data: bytes) -> bytes:
+        return RMDJCodec.__xor(data)
+
+    @staticmethod
+    def decrypt(data: bytes) -> bytes:
+        return RMDJCodec.__xor(data)
+
+    @staticmethod
+    def encrypt_stream(reader: BinaryIO, writer: BinaryIO) -> int:
+        return RMDJCodec.__xor_stream(reader, writer)
+
+    @staticmethod
+    def decrypt_stream(reader: BinaryIO, writer: BinaryIO) -> int:
+        return RMDJCodec.__xor_stream(reader, writer)
@@ -0,0 +1,91 @@
+import os
+import shutil
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator
+
+from quantumfetcher.enumerators.policy_placement import PlacementPolicy
+
+
+# Media files spread over several storage roots (usually separate disks), so
+# their write bandwidth adds up. A file is placed in <root>/<episode>/<name>
+# and linked from the episode directory with a symlink, so to the game and
+# the local server the episode looks the same as if it was downloaded there.
+# Files that already exist (from earlier runs) stay where they are.
+class StoragePool:
+
+    def __init__(
+        self, roots: list[Path], policy: PlacementPolicy = PlacementPolicy.Load
+    ):
+        self.__roots = roots
+        self.__policy = policy
+
+        # Roots on the same device share its write load
+        self.__devices: dict[Path, int] = {}
+        self.__writes: dict[int, int] = {}
+        self.__lock = threading.Lock()
+
+        for root in roots:
+            root.mkdir(parents=True, exist_ok=True)
+            self.__devices[root] = os.stat(root).st_dev
+
+    @contextmanager
+    def place(self, path: Path, size: int) -> Iterator[None]:
+        # Path stays the one in the episode directory, writes go through the
+        # symlink and count as load on the device they land on until done
+        with self.__lock:
+            target = self.__get_target(path, size)
+            device = os.stat(target.parent).st_dev
+            self.__writes[device] = self.__writes.get(device, 0) + 1
+
+        try:
+            yield
+        finally:
+            with self.__lock:
+                self.__writes[device] -= 1
+
+    def __get_target(self, path: Path, size: int) -> Path:
+        if path.is_symlink():
+            target = path.resolve()
+
+            if target.parent.is_dir():
+                return target
+
+            # Volume it was placed on is gone, start over somewhere else
+            path.unlink()
+
+        if path.exists():
+            return path
+
+        root = self.__choose_root(size)
+        target = root / path.parent.name / path.name
+        target.parent.mkdir(parents=True, exist_ok=True)
+        path.parent.mkdir(parents=True, exist_ok=True)
+
+        try:
+            path.symlink_to(target.absolute())
+        except OSError:
+            # No symlink support (or privileges on Windows), keep it in place
+            return path
+
+        return target
+
+    def __choose_root(self, size: int) -> Path:
+        free = {root: shutil.disk_usage(root).free for root in self.__roots}
+
+        # Roots the file doesn't fit in are only used when it fits nowhere
+        candidates = [root for root in self.__roots if free[root] >= size]
+        candidates = candidates or self.__roots
+
+        match self.__policy:
+            case PlacementPolicy.FreeSpace:
+                return max(candidates, key=lambda root: free[root])
+            case PlacementPolicy.Load:
+                return min(
+                    candidates,
+                    key=lambda root: (
+                        self.__writes.get(self.__devices[root], 0),
+                        -free[root],
+                    ),
+                )
@@ -0,0 +1,230 @@
+import asyncio
+import re
+from pathlib import Path
+from urllib.parse import unquote, urlsplit
+
+from rich.console import Console
+
+from quantumfetcher.dataclasses.served_episode import ServedEpisode
+from quantumfetcher.httpio import (
+    get_byte_range,
+    parse_byte_range,
+    run_server,
+    send_head,
+)
+from quantumfetcher.manifests.server import ServerManifest
+from quantumfetcher.mp4 import read_fragment_index
+from quantumfetcher.writer import get_progress_path
+
+CONTENT_TYPES = {
+    ".ism": "text/xml",
+    ".ismc": "text/xml",
+    ".ismv": "video/mp4",
+    ".isma": "audio/mp4",
+    ".ismt": "application/mp4",
+}
+
+QUALITY_LEVELS = re.compile(r"QualityLevels\((\d+)\)")
+FRAGMENTS = re.compile(r"Fragments\((.+)=(\d+)\)")
+
+
+# Serves downloaded episodes the way QuantumStreamer does, so the game can be
+# pointed at it with a patched videoList.rmdj:
+#   /<episode-id>/manifest                                   client manifest
+#   /<episode-id>                                            server manifest
+#   /<episode-id>/QualityLevels(<b>)/Fragments(<name>=<t>)   single fragment
+#   /<episode-id>/<file>, /<file>                            file, X-MS-Range
+# Fragment offsets of every track are read from their mfra boxes once at
+# startup, file contents are sent straight from the page cache with sendfile.
+class Streamer:
+
+    def __init__(self, episodes_path: Path):
+        self.__console = Console()
+        self.__episodes: dict[str, ServedEpisode] = {}
+        self.__files: dict[str, Path] = {}
+        self.__fragments: dict[Path, dict[int, tuple[int, int]]] = {}
+
+        for episode_path in sorted(episodes_path.iterdir()):
+            if episode_path.is_dir():
+                self.__index_episode(episode_path)
+
+    @property
+    def episodes(self) -> dict[str, ServedEpisode]:
+        return self.__episodes
+
+    def serve(self, address: str):
+        self.__console.log(
+            f"Serving {len(self.__episodes)} episode(s) on http://{address}/ (press Ctrl+C to stop)"
+        )
+
+        try:
+            run_server(address, self.__respond)
+        except KeyboardInterrupt:
+            self.__console.log("Server stopped.")
+
+    def __index_episode(self, episode_path: Path):
+        server_manifest_paths = sorted(episode_path.glob("*.ism"))
+
+        if not server_manifest_paths:
+            return
+
+        server_manifest = ServerManifest(
+            server_manifest_paths[0].read_text(encoding="utf-8")
+        )
+        client_manifest_path = server_manifest.get_client_manifest_path()
+
+        if client_manifest_path is None:
+            self.__console.log(
+                f"[yellow]Warning![/yellow] [{episode_path.name}] Client manifest path not found, skipping episode."
+            )
+            return
+
+        episode = ServedEpisode(
+            episode_id=episode_path.name,
+            server_manifest=server_manifest_paths[0],
+            client_manifest=episode_path / client_manifest_path,
+        )
+
+        for stream in server_manifest.streams:
+            filename = stream.attributes.get("src")
+
+            if not filename:
+                continue
+
+            media_path = episode_path / filename
+
+            if not media_path.is_file() or get_progress_path(media_path).exists():
+                self.__console.log(
+                    f"[yellow]Warning![/yellow] [{episode.episode_id}] {filename} is missing or incomplete, skipping."
+                )
+                continue
+
+            try:
+                self.__fragments[media_path] = self.__get_fragment_ranges(media_path)
+            except ValueError as e:
+                self.__console.log(
+                    f"[yellow]Warning![/yellow] [{episode.episode_id}] Cannot index fragments of {filename}: {e}"
+                )
+                continue
+
+            episode.files[filename] = media_path
+            episode.tracks[
+                (
+                    stream.parameters.get("trackName", ""),
+                    stream.attributes.get("systemBitrate", ""),
+                )
+            ] = media_path
+            self.__files.setdefault(filename, media_path)
+
+        for manifest_path in (episode.server_manifest, episode.client_manifest):
+            episode.files[manifest_path.name] = manifest_path
+
+        self.__episodes[episode.episode_id] = episode
+
+    def __get_fragment_ranges(self, path: Path) -> dict[int, tuple[int, int]]:
+        entries, mfraOffset = read_fragment_index(path)
+        ends = [offset for _, offset in entries[1:]] + [mfraOffset]
+
+        return {
+            start: (offset, end - offset) for (start, offset), end in zip(entries, ends)
+        }
+
+    async def __respond(
+        self,
+        writer: asyncio.StreamWriter,
+        method: str,
+        target: str,
+        headers: dict[str, str],
+        keep_alive: bool,
+    ):
+        if method not in ("GET", "HEAD"):
+            return await send_head(writer, 405, 0, keep_alive)
+
+        resolved = self.__resolve(unquote(urlsplit(target).path))
+
+        if resolved is None:
+            return await send_head(writer, 404, 0, keep_alive)
+
+        path, offset, size = resolved
+        status = 200
+        response_headers = {
+            "Content-Type": CONTENT_TYPES.get(path.suffix, "application/octet-stream"),
+            "Accept-Ranges": "bytes",
+        }
+
+        byte_range = get_byte_range(headers)
+
+        if byte_range:
+            try:
+                resolved_range = parse_byte_range(byte_range, size)
+            except ValueError:
+                return await send_head(writer, 400, 0, keep_alive)
+
+            if resolved_range is None:
+                response_headers["Content-Range"] = f"bytes */{size}"
+                return await send_head(writer, 416, 0, keep_alive, response_headers)
+
+            start, end = resolved_range
+            status = 206
+            response_headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+            offset += start
+            size = end - start + 1
+
+        await send_head(writer, status, size, keep_alive, response_headers)
+
+        if method == "HEAD" or not size:
+            return
+
+        with open(path, "rb") as f:
+            # Zero-copy where the platform supports it, read/write otherwise
+            await asyncio.get_running_loop().sendfile(writer.transport, f, offset, size)
+
+    def __resolve(self, path: str) -> tuple[Path, int, int] | None:
+        parts = path.strip("/").split("/")
+        episode = self.__episodes.get(parts[0])
+
+        if episode is None:
+            if len(parts) == 1 and parts[0] in self.__files:
+                return self.__whole_file(self.__files[parts[0]])
+
+            return None
+
+        if len(parts) == 1:
+            return self.__whole_file(episode.server_manifest)
+
+        if len(parts) == 2:
+            if parts[1] == "manifest":
+                return self.__whole_file(episode.client_manifest)
+
+            if parts[1] in episode.files:
+                return self.__whole_file(episode.files[parts[1]])
+
+            return None
+
+        if len(parts) != 3:
+            return None
+
+        quality_levels = QUALITY_LEVELS.fullmatch(parts[1])
+        fragments = FRAGMENTS.fullmatch(parts[2])
+
+        if quality_levels is None or fragments is None:
+            return None
+
+        track_name, start_time = fragments.groups()
+        media_path = episode.tracks.get((track_name, quality_levels.group(1)))
+
+        if media_path is None:
+            return None
+
+        fragment = self.__fragments[media_path].get(int(start_time))
+
+        if fragment is None:
+            return None
+
+        return media_path, *fragment
+
+    def __whole_file(self, path: Path) -> tuple[Path, int, int] | None:
+        try:
+            return path, 0, path.stat().st_size
+        except FileNotFoundError:
+            return None
@@ -1,81 +1,199 @@
 import json
-import os
+import mmap
+import struct
 import xml.etree.ElementTree as ET
 from pathlib import Path
 
-import typer
-
 from quantumfetcher.constants import TTML_NS
+from quantumfetcher.dataclasses.subtitle_segment import SubtitleSegment
+from quantumfetcher.dataclasses.subtitle_track import SubtitleTrack
+from quantumfetcher.mp4 import BOX_HEADER, get_fragment_offsets, read_tfra_entries
+
+TTML_PARAGRAPH = f"{{{TTML_NS['xmlns']}}}p"
+XML_ID = "{http://www.w3.org/XML/1998/namespace}id"
+
+
+# Streaming parser target, collects paragraph text with line breaks in a single pass
+# over all fragments of a track without building and searching their trees.
+# Changes made by the current fragment are remembered, so a malformed fragment
+# can be discarded without losing the ones before it.
+class TTMLSegmentParser:
+
+    def __init__(self) -> None:
+        self.__segments: list[tuple[int, list[str]]] = []
+        self.__open: list[tuple[int, list[str]]] = []
+        self.__changes: list[tuple[int, tuple[int, list[str]] | None]] = []
+        self.__fragment = -1
+        self.__depth = 0
+        self.__in_text = False
+
+    @property
+    def depth(self) -> int:
+        return self.__depth
+
+    def start_fragment(self):
+        self.__fragment += 1
+        self.__changes = []
+
+    def discard_fragment(self):
+        # Undo paragraphs of the current fragment, newest first, so appended
+        # ones come off the end and replaced ones get their old text back
+        for segment_id, previous in reversed(self.__changes):
+            if previous is None:
+                self.__segments.pop()
+            else:
+                self.__segments[segment_id] = previous
+
+        # Parsing starts over with a new parser, which opens its own root
+        self.__changes = []
+        self.__open = []
+        self.__depth = 0
+        self.__in_text = False
+
+    def start(self, tag: str, attrib: dict[str, str]):
+        self.__depth += 1
+
+        # Fragments are wrapped in a single root, paragraphs live below their roots
+        if tag == TTML_PARAGRAPH and self.__depth > 2:
+            segment_id = attrib.get(XML_ID, "").lstrip("s")
+
+            if not segment_id.isdecimal():
+                raise ValueError(
+                    f"paragraph with invalid xml:id {attrib.get(XML_ID)!r}"
+                )
 
+            self.__add_paragraph(int(segment_id))
 
-def __get_fragment_offsets(reader, path):
-    reader.seek(-4, os.SEEK_END)
-    mfroSize = int.from_bytes(reader.read(4))
+        if tag.endswith("br"):
+            for _, lines in self.__open:
+                lines.append("\n")
 
-    reader.seek(-mfroSize, os.SEEK_END)
+            self.__in_text = False
+        else:
+            # Only the element's own text counts, tails after child elements don't
+            self.__in_text = bool(self.__open)
 
-    mfraBlockSize = int.from_bytes(reader.read(4))
+    def data(self, data: str):
+        if self.__in_text:
+            for _, lines in self.__open:
+                lines.append(data)
 
-    if mfraBlockSize != mfroSize:
-        typer.echo(
-            f"Cannot extract subtitles! Invalid mfro block size in track file {path} (Expected: {mfroSize}, Got: {mfraBlockSize}).",
-            err=True,
-        )
-        return
+    def end(self, tag: str):
+        self.__in_text = False
 
-    mfraMagic = reader.read(4)
+        if self.__open and self.__open[-1][0] == self.__depth:
+            self.__open.pop()
 
-    if mfraMagic != b"mfra":
-        typer.echo(
-            f"Cannot extract subtitles! Invalid mfra magic in track file {path} (Expected: mfra, Got: {mfraMagic}).",
-            err=True,
-        )
-        return
+        self.__depth -= 1
 
-    reader.seek(4, os.SEEK_CUR)
-    tfraMagic = reader.read(4)
+    def close(self) -> list[tuple[int, str]]:
+        return [(fragment, "".join(lines)) for fragment, lines in self.__segments]
 
-    if tfraMagic != b"tfra":
-        typer.echo(
-            f"Cannot extract subtitles! Invalid tfra magic in track file {path} (Expected: tfra, Got: {mfraMagic}).",
-            err=True,
-        )
-        return
+    def __add_paragraph(self, segment_id: int):
+        lines: list[str] = []
+
+        if len(self.__segments) > segment_id:
+            self.__changes.append((segment_id, self.__segments[segment_id]))
+            self.__segments[segment_id] = (self.__fragment, lines)
+        else:
+            self.__changes.append((len(self.__segments), None))
+            self.__segments.append((self.__fragment, lines))
 
-    version = int.from_bytes(reader.read(1))
-    readSize = 8 if version == 1 else 4
+        self.__open.append((self.__depth, lines))
 
-    reader.seek(7, os.SEEK_CUR)
 
-    temp = int.from_bytes(reader.read(4))
-    lenSizeOfTrafNum = ((temp & 0x3F) >> 4) + 1
-    lenSizeOfTrunNum = ((temp & 0xC) >> 2) + 1
-    lenSizeOfSampleNum = ((temp & 0x3)) + 1
+# All fragments of a track go through one parser wrapped in a single root,
+# creating a parser per fragment is a large share of the parsing time.
+# A fragment that isn't well-formed (or leaves elements open) is discarded
+# and parsing goes on with a new parser, the rest of the track is kept.
+class SubtitleSegments:
 
-    numOfEntries = int.from_bytes(reader.read(4))
-    fragments = []
+    def __init__(self) -> None:
+        self.__target = TTMLSegmentParser()
+        self.__parser = self.__create_parser()
+        self.__starts: list[int | None] = []
+        self.__skipped: list[str] = []
 
-    for i in range(numOfEntries):
-        _ = int.from_bytes(reader.read(readSize))
-        offset = int.from_bytes(reader.read(readSize))
-        _ = int.from_bytes(reader.read(lenSizeOfTrafNum))
-        _ = int.from_bytes(reader.read(lenSizeOfTrunNum))
-        _ = int.from_bytes(reader.read(lenSizeOfSampleNum))
+    def __len__(self) -> int:
+        return len(self.__starts)
 
-        fragments.append(offset)
+    def __create_parser(self) -> ET.XMLParser:
+        parser = ET.XMLParser(target=self.__target, encoding="utf-8")
+        parser.feed(b"<fragments>")
+        return parser
+
+    def add_fragment(self, xml_data: bytes | memoryview, start: int | None = None):
+        self.__target.start_fragment()
+        self.__starts.append(start)
+        xml_data = self.__strip_declaration(xml_data)
+
+        if self.__feed(xml_data) is None:
+            return
+
+        # Parser might have choked on leftovers of the fragment before,
+        # so the fragment gets one more try with a clean one
+        self.__target.discard_fragment()
+        self.__parser = self.__create_parser()
+        error = self.__feed(xml_data)
+
+        if error is not None:
+            self.__target.discard_fragment()
+            self.__parser = self.__create_parser()
+            self.__skipped.append(f"fragment {len(self.__starts) - 1}: {error}")
+
+    def __feed(self, xml_data: bytes | memoryview) -> str | None:
+        try:
+            self.__parser.feed(xml_data)
+        except (ET.ParseError, ValueError) as e:
+            # Errors raised by the target stop the parser just like bad XML
+            return str(e)
+
+        if self.__target.depth != 1:
+            return "unbalanced elements"
+
+        return None
+
+    def close(self, starts: list[int | None] | None = None) -> SubtitleTrack:
+        try:
+            self.__parser.feed(b"</fragments>")
+            paragraphs = self.__parser.close()
+        except ET.ParseError:
+            # Trailing garbage after the last fragment, its paragraphs are complete
+            paragraphs = self.__target.close()
+
+        if starts is None:
+            starts = self.__starts
+
+        return SubtitleTrack(
+            segments=[
+                SubtitleSegment(start=starts[fragment], text=text)
+                for fragment, text in paragraphs
+            ],
+            skipped=self.__skipped,
+        )
 
-    return fragments
+    @staticmethod
+    def __strip_declaration(xml_data: bytes | memoryview) -> bytes | memoryview:
+        head = bytes(xml_data[:256])
+        start = 3 if head.startswith(b"\xef\xbb\xbf") else 0
 
+        # Every fragment is a standalone document, its XML declaration can't
+        # appear in the middle of the combined stream
+        if head.startswith(b"<?xml", start):
+            start = head.index(b"?>", start) + 2
 
-def __get_fragment_data(reader, offset):
-    reader.seek(offset, os.SEEK_SET)
-    moofSize = int.from_bytes(reader.read(4), "big")
-    _ = reader.read(moofSize - 4)
+        return xml_data[start:]
 
-    mdatSize = int.from_bytes(reader.read(4), "big")
-    mdatBlock = reader.read(mdatSize - 4)
 
-    return mdatBlock[0x4:].decode()
+def __get_fragment_data(data, offset) -> memoryview:
+    # Jump over the moof box straight to mdat that follows it
+    (moofSize,) = struct.unpack_from(">I", data, offset)
+    mdatSize, _ = BOX_HEADER.unpack_from(data, offset + moofSize)
+
+    mdatStart = offset + moofSize + BOX_HEADER.size
+    mdatEnd = offset + moofSize + mdatSize
+
+    return data[mdatStart:mdatEnd]
 
 
 def __get_episode_title(episode_num):
@@ -92,49 +210,156 @@ def __get_episode_title(episode_num):
             return ""
 
 
-def __get_text_with_line_breaks(elem):
-    lines = []
-
-    for node in elem.iter():
-        if node.tag.endswith("br"):
-            lines.append("\n")
-        elif node.text:
-            lines.append(node.text)
+def save_subtitles(
+    subtitle_path: Path,
+    episode_num: int,
+    track_name: str,
+    segments: list[SubtitleSegment],
+):
+    out = {
+        "episode_title": __get_episode_title(episode_num),
+        "segments": [segment.text for segment in segments],
+    }
 
-    return "".join(lines)
+    with open(
+        subtitle_path.parent / f"{track_name}_override.json", "w", encoding="utf-8"
+    ) as f:
+        json.dump(out, f, indent=4, ensure_ascii=False)
 
 
-def extract_subtitles(subtitle_path: Path, episode_num: int, track_name: str):
-    out = {"episode_title": __get_episode_title(episode_num), "segments": []}
-    segments = []
+def extract_subtitles(
+    subtitle_path: Path, episode_num: int, track_name: str
+) -> SubtitleTrack:
+    segments = SubtitleSegments()
 
     with open(subtitle_path, "rb") as f:
-        offsets = __get_fragment_offsets(f, subtitle_path)
+        if not subtitle_path.stat().st_size:
+            raise ValueError(
+                f"Cannot extract subtitles! Track file {subtitle_path} is empty."
+            )
+
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            with memoryview(mm) as data:
+                fragments = get_fragment_offsets(data, subtitle_path)
+
+                if not fragments:
+                    return SubtitleTrack(segments=[], skipped=[])
+
+                for start, offset in fragments:
+                    with __get_fragment_data(data, offset) as mdatBlock:
+                        segments.add_fragment(mdatBlock, start)
 
-        if not offsets:
+    result = segments.close()
+    save_subtitles(subtitle_path, episode_num, track_name, result.segments)
+
+    return result
+
+
+class SubtitleStreamParser:
+    def __init__(self, subtitle_path: Path, episode_num: int, track_name: str):
+        self.__subtitle_path = subtitle_path
+        self.__episode_num = episode_num
+        self.__track_name = track_name
+
+        self.__buffer = bytearray()
+        self.__position = 0
+        self.__skip = 0
+        self.__moof_offset: int | None = None
+        self.__fragment_offsets: list[int | None] = []
+        self.__fragment_starts: dict[int, int] = {}
+        self.__segments = SubtitleSegments()
+        self.__error: Exception | None = None
+
+    def feed(self, data: bytes):
+        if self.__error is not None:
             return
 
-        for offset in offsets:
-            xml_data = __get_fragment_data(f, offset)
+        try:
+            self.__feed(data)
+        except Exception as e:
+            # Keep downloading, the error is raised once the track is complete
+            self.__error = e
+
+    def close(self) -> SubtitleTrack:
+        if self.__error is not None:
+            raise self.__error
+
+        if self.__buffer or self.__skip:
+            raise ValueError(
+                f"Cannot extract subtitles! Track file {self.__subtitle_path} is truncated."
+            )
+
+        if not self.__segments:
+            return SubtitleTrack(segments=[], skipped=[])
+
+        # Fragment start times come from the tfra box at the very end of the track
+        result = self.__segments.close(
+            starts=[
+                self.__fragment_starts.get(offset) if offset is not None else None
+                for offset in self.__fragment_offsets
+            ]
+        )
+        save_subtitles(
+            self.__subtitle_path, self.__episode_num, self.__track_name, result.segments
+        )
+
+        return result
+
+    def __feed(self, data: bytes):
+        if self.__skip:
+            skipped = min(self.__skip, len(data))
+            self.__skip -= skipped
+            self.__position += skipped
+            data = data[skipped:]
+
+        self.__buffer += data
 
-            root = ET.fromstring(xml_data)
-            text_segments = root.findall(".//xmlns:p", namespaces=TTML_NS)
+        while len(self.__buffer) >= BOX_HEADER.size:
+            boxSize, boxType = BOX_HEADER.unpack_from(self.__buffer)
+            headerSize = BOX_HEADER.size
 
-            for segment in text_segments:
-                segment_id = int(
-                    segment.attrib["{http://www.w3.org/XML/1998/namespace}id"].lstrip(
-                        "s"
-                    )
+            if boxSize == 1:
+                # 64-bit box size follows the box type
+                if len(self.__buffer) < headerSize + 8:
+                    return
+
+                (boxSize,) = struct.unpack_from(">Q", self.__buffer, headerSize)
+                headerSize += 8
+
+            if boxSize < headerSize:
+                raise ValueError(
+                    f"Cannot extract subtitles! Invalid {boxType} box size in track file {self.__subtitle_path} (Got: {boxSize})."
                 )
 
-                if len(segments) > segment_id:
-                    segments[segment_id] = __get_text_with_line_breaks(segment)
-                else:
-                    segments.append(__get_text_with_line_breaks(segment))
+            if boxType == b"moof":
+                self.__moof_offset = self.__position
 
-    out["segments"] = segments
+            if boxType not in (b"mdat", b"mfra"):
+                # Only the mdat payloads and the fragment index are needed,
+                # everything else is dropped as it arrives instead of being buffered
+                consumed = min(boxSize, len(self.__buffer))
+                del self.__buffer[:consumed]
+                self.__position += consumed
+                self.__skip = boxSize - consumed
+                continue
 
-    with open(
-        subtitle_path.parent / f"{track_name}_override.json", "w", encoding="utf-8"
-    ) as f:
-        json.dump(out, f, indent=4, ensure_ascii=False)
+            if len(self.__buffer) < boxSize:
+                return
+
+            with memoryview(self.__buffer) as view:
+                if boxType == b"mdat":
+                    with view[headerSize:boxSize] as mdatBlock:
+                        self.__segments.add_fragment(mdatBlock)
+
+                    self.__fragment_offsets.append(self.__moof_offset)
+                    self.__moof_offset = None
+                else:
+                    self.__fragment_starts = {
+                        offset: start
+                        for start, offset in read_tfra_entries(
+                            view, headerSize, self.__subtitle_path
+                        )
+                    }
+
+            del self.__buffer[:boxSize]
+            self.__position += boxSize
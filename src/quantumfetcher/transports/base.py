@@ -0,0 +1,72 @@
+from abc import ABC, abstractmethod
+from contextlib import AbstractContextManager
+from typing import Iterator
+
+from quantumfetcher.constants import MAX_CONNECTIONS, USER_AGENT
+from quantumfetcher.enumerators.type_transport import TransportType
+
+# Connection errors are retried with exponential backoff, HTTP errors aren't
+RETRY_TOTAL = 10
+RETRY_BACKOFF_FACTOR = 3
+
+
+class TransportError(Exception):
+    # Connection dropped or body cut short, the request can be retried
+    pass
+
+
+class HTTPStatusError(Exception):
+    def __init__(self, url: str, status: int):
+        super().__init__(f"Server returned HTTP {status} for {url}")
+        self.url = url
+        self.status = status
+
+
+class BaseTransport(ABC):
+
+    def __init__(self) -> None:
+        self.headers = {"User-Agent": USER_AGENT}
+
+    @abstractmethod
+    def get(self, url: str, headers: dict[str, str] | None = None) -> bytes:
+        raise NotImplementedError("This method should be implemented by subclasses.")
+
+    @abstractmethod
+    def head(self, url: str) -> dict[str, str]:
+        raise NotImplementedError("This method should be implemented by subclasses.")
+
+    @abstractmethod
+    def stream(
+        self, url: str, headers: dict[str, str] | None = None
+    ) -> AbstractContextManager[Iterator[bytes]]:
+        raise NotImplementedError("This method should be implemented by subclasses.")
+
+    def close(self) -> None:
+        pass
+
+    def get_content_length(self, url: str) -> int:
+        return int(self.head(url)["content-length"])
+
+
+def create_transport(
+    transport_type: TransportType, connections: int = MAX_CONNECTIONS
+) -> BaseTransport:
+    # Backends are only imported when used, http.client needs nothing else.
+    # Connection pools keep as many connections per host as may be in flight.
+    match transport_type:
+        case TransportType.Requests:
+            from quantumfetcher.transports.transport_requests import (
+                RequestsTransport,
+            )
+
+            return RequestsTransport(connections)
+        case TransportType.Urllib3:
+            from quantumfetcher.transports.transport_urllib3 import Urllib3Transport
+
+            return Urllib3Transport(connections)
+        case TransportType.HTTPClient:
+            from quantumfetcher.transports.transport_httpclient import (
+                HTTPClientTransport,
+            )
+
+            return HTTPClientTransport()
@@ -0,0 +1,204 @@
+import http.client
+import socket
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+from typing import Iterator
+from urllib.parse import urljoin, urlsplit
+
+from quantumfetcher.constants import READ_SIZE
+from quantumfetcher.transports.base import (
+    RETRY_BACKOFF_FACTOR,
+    RETRY_TOTAL,
+    BaseTransport,
+    HTTPStatusError,
+    TransportError,
+)
+
+RECEIVE_BUFFER_SIZE = 4 * 1024 * 1024  # 4 MiB
+MAX_REDIRECTS = 10
+
+
+class TunedHTTPConnection(http.client.HTTPConnection):
+
+    def connect(self):
+        # Receive buffer has to be set before connecting,
+        # the TCP window scale is negotiated in the handshake
+        host, port = self._get_hostport(self.host, self.port)
+        error: OSError | None = None
+
+        for family, type, proto, _, address in socket.getaddrinfo(
+            host, port, type=socket.SOCK_STREAM
+        ):
+            sock = socket.socket(family, type, proto)
+
+            try:
+                sock.setsockopt(
+                    socket.SOL_SOCKET, socket.SO_RCVBUF, RECEIVE_BUFFER_SIZE
+                )
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                sock.settimeout(self.timeout)
+                sock.connect(address)
+            except OSError as e:
+                sock.close()
+                error = e
+                continue
+
+            self.sock = sock
+            return
+
+        raise error or OSError(f"Cannot resolve {host}")
+
+
+# Keeps idle keep-alive connections per host, a connection is only taken by
+# one request at a time so manifest prefetching threads can share the transport
+class HTTPClientTransport(BaseTransport):
+
+    def __init__(self, timeout: float = 60) -> None:
+        super().__init__()
+
+        self.__timeout = timeout
+        self.__idle: dict[str, list[http.client.HTTPConnection]] = {}
+        self.__lock = threading.Lock()
+
+    def get(self, url: str, headers: dict[str, str] | None = None) -> bytes:
+        with self.__request("GET", url, headers) as (r, url):
+            try:
+                data = r.read()
+            except (http.client.HTTPException, OSError) as e:
+                raise TransportError(str(e)) from e
+
+            return self.__decode(data, r.getheader("Content-Encoding"))
+
+    def head(self, url: str) -> dict[str, str]:
+        with self.__request("HEAD", url) as (r, url):
+            return {name.lower(): value for name, value in r.getheaders()}
+
+    @contextmanager
+    def stream(
+        self, url: str, headers: dict[str, str] | None = None
+    ) -> Iterator[Iterator[bytes]]:
+        with self.__request("GET", url, headers) as (r, url):
+            yield self.__iter_content(r)
+
+    def close(self) -> None:
+        with self.__lock:
+            for connections in self.__idle.values():
+                for connection in connections:
+                    connection.close()
+
+            self.__idle.clear()
+
+    @contextmanager
+    def __request(
+        self, method: str, url: str, headers: dict[str, str] | None = None
+    ) -> Iterator[tuple[http.client.HTTPResponse, str]]:
+        for _ in range(MAX_REDIRECTS + 1):
+            connection, r = self.__send(method, url, headers)
+
+            if r.status in (301, 302, 303, 307, 308) and r.getheader("Location"):
+                r.read()
+                self.__release(url, connection, r)
+                url = urljoin(url, r.getheader("Location"))
+                continue
+
+            break
+        else:
+            raise HTTPStatusError(url, r.status)
+
+        try:
+            if r.status >= 400:
+                raise HTTPStatusError(url, r.status)
+
+            yield r, url
+        finally:
+            self.__release(url, connection, r)
+
+    def __send(
+        self, method: str, url: str, headers: dict[str, str] | None
+    ) -> tuple[http.client.HTTPConnection, http.client.HTTPResponse]:
+        parts = urlsplit(url)
+        path = parts.path or "/"
+
+        if parts.query:
+            path += f"?{parts.query}"
+
+        for attempt in range(RETRY_TOTAL + 1):
+            connection = self.__acquire(parts.scheme, parts.netloc)
+
+            try:
+                connection.request(
+                    method, path, headers={**self.headers, **(headers or {})}
+                )
+                return connection, connection.getresponse()
+            except (http.client.HTTPException, OSError) as e:
+                connection.close()
+
+                if attempt == RETRY_TOTAL:
+                    raise TransportError(str(e)) from e
+
+                if attempt:
+                    # First retry is immediate, a kept-alive connection
+                    # may simply have been closed by the server meanwhile
+                    time.sleep(RETRY_BACKOFF_FACTOR * 2 ** (attempt - 1))
+
+        raise AssertionError("unreachable")
+
+    def __acquire(self, scheme: str, netloc: str) -> http.client.HTTPConnection:
+        key = f"{scheme}://{netloc}"
+
+        with self.__lock:
+            connections = self.__idle.get(key)
+
+            if connections:
+                return connections.pop()
+
+        if scheme == "https":
+            return http.client.HTTPSConnection(netloc, timeout=self.__timeout)
+
+        return TunedHTTPConnection(netloc, timeout=self.__timeout)
+
+    def __release(
+        self,
+        url: str,
+        connection: http.client.HTTPConnection,
+        r: http.client.HTTPResponse,
+    ):
+        if r.will_close or not (r.length == 0 or (r.length is None and r.isclosed())):
+            # Body wasn't read to the end or the server is closing it
+            connection.close()
+            return
+
+        r.close()
+
+        parts = urlsplit(url)
+
+        with self.__lock:
+            self.__idle.setdefault(f"{parts.scheme}://{parts.netloc}", []).append(
+                connection
+            )
+
+    def __iter_content(self, r: http.client.HTTPResponse) -> Iterator[bytes]:
+        try:
+            while chunk := r.read1(READ_SIZE):
+                yield chunk
+        except (http.client.HTTPException, OSError) as e:
+            raise TransportError(str(e)) from e
+
+        if r.length:
+            raise TransportError(f"Connection closed with {r.length} bytes left")
+
+    def __decode(self, data: bytes, encoding: str | None) -> bytes:
+        # Unlike requests and urllib3, http.client leaves that to the caller
+        match (encoding or "").lower():
+            case "gzip":
+                return zlib.decompress(data, 16 + zlib.MAX_WBITS)
+            case "deflate":
+                try:
+                    return zlib.decompress(data)
+                except zlib.error:
+                    # Raw deflate stream without the zlib header
+                    return zlib.decompress(data, -zlib.MAX_WBITS)
+            case _:
+                return data
@@ -0,0 +1,64 @@
+from contextlib import contextmanager
+from typing import Iterator
+
+import requests
+from requests.adapters import HTTPAdapter, Retry
+
+from quantumfetcher.constants import MAX_CONNECTIONS, READ_SIZE
+from quantumfetcher.transports.base import (
+    RETRY_BACKOFF_FACTOR,
+    RETRY_TOTAL,
+    BaseTransport,
+    HTTPStatusError,
+    TransportError,
+)
+
+
+class RequestsTransport(BaseTransport):
+
+    def __init__(self, connections: int = MAX_CONNECTIONS) -> None:
+        super().__init__()
+
+        self.__session = requests.Session()
+        self.__session.headers.update(self.headers)
+
+        retries = Retry(total=RETRY_TOTAL, backoff_factor=RETRY_BACKOFF_FACTOR)
+
+        adapter = HTTPAdapter(max_retries=retries, pool_maxsize=connections)
+
+        self.__session.mount("http://", adapter)
+        self.__session.mount("https://", adapter)
+
+    def get(self, url: str, headers: dict[str, str] | None = None) -> bytes:
+        with self.__session.get(url, headers=headers) as r:
+            self.__raise_for_status(r)
+            return r.content
+
+    def head(self, url: str) -> dict[str, str]:
+        with self.__session.head(url) as r:
+            self.__raise_for_status(r)
+            return {name.lower(): value for name, value in r.headers.items()}
+
+    @contextmanager
+    def stream(
+        self, url: str, headers: dict[str, str] | None = None
+    ) -> Iterator[Iterator[bytes]]:
+        with self.__session.get(url, headers=headers, stream=True) as r:
+            self.__raise_for_status(r)
+            yield self.__iter_content(r)
+
+    def close(self) -> None:
+        self.__session.close()
+
+    def __iter_content(self, r: requests.Response) -> Iterator[bytes]:
+        try:
+            yield from r.iter_content(chunk_size=READ_SIZE)
+        except (
+            requests.exceptions.ChunkedEncodingError,
+            requests.ConnectionError,
+        ) as e:
+            raise TransportError(str(e)) from e
+
+    def __raise_for_status(self, r: requests.Response):
+        if r.status_code >= 400:
+            raise HTTPStatusError(r.url, r.status_code)
@@ -0,0 +1,77 @@
+from contextlib import contextmanager
+from typing import Iterator
+
+import urllib3
+
+from quantumfetcher.constants import MAX_CONNECTIONS, READ_SIZE
+from quantumfetcher.transports.base import (
+    RETRY_BACKOFF_FACTOR,
+    RETRY_TOTAL,
+    BaseTransport,
+    HTTPStatusError,
+    TransportError,
+)
+
+
+class Urllib3Transport(BaseTransport):
+
+    def __init__(self, connections: int = MAX_CONNECTIONS) -> None:
+        super().__init__()
+
+        self.__pool = urllib3.PoolManager(
+            maxsize=connections,
+            headers=self.headers,
+            retries=urllib3.Retry(
+                total=RETRY_TOTAL,
+                backoff_factor=RETRY_BACKOFF_FACTOR,
+                redirect=10,
+                raise_on_redirect=False,
+            ),
+        )
+
+    def get(self, url: str, headers: dict[str, str] | None = None) -> bytes:
+        r = self.__pool.request("GET", url, headers=self.__get_headers(headers))
+        self.__raise_for_status(url, r)
+
+        return r.data
+
+    def head(self, url: str) -> dict[str, str]:
+        r = self.__pool.request("HEAD", url)
+        self.__raise_for_status(url, r)
+
+        return {name.lower(): value for name, value in r.headers.items()}
+
+    @contextmanager
+    def stream(
+        self, url: str, headers: dict[str, str] | None = None
+    ) -> Iterator[Iterator[bytes]]:
+        r = self.__pool.request(
+            "GET", url, headers=self.__get_headers(headers), preload_content=False
+        )
+
+        try:
+            self.__raise_for_status(url, r)
+            yield self.__iter_content(r)
+        finally:
+            r.release_conn()
+
+    def close(self) -> None:
+        self.__pool.clear()
+
+    def __get_headers(self, headers: dict[str, str] | None) -> dict[str, str]:
+        # Per-request headers replace the pool ones instead of adding to them
+        return {**self.headers, **headers} if headers else self.headers
+
+    def __iter_content(self, r: urllib3.HTTPResponse) -> Iterator[bytes]:
+        try:
+            yield from r.stream(READ_SIZE)
+        except (
+            urllib3.exceptions.ProtocolError,
+            urllib3.exceptions.ReadTimeoutError,
+        ) as e:
+            raise TransportError(str(e)) from e
+
+    def __raise_for_status(self, url: str, r: urllib3.HTTPResponse):
+        if r.status >= 400:
+            r.drain_conn()
+            raise HTTPStatusError(url, r.status)
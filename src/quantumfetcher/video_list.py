@@ -4,7 +4,7 @@ from urllib.parse import unquote, urlparse, urlunparse
 
 from rich import print
 
-from quantumfetcher.constants import RMDJ_ENCRYPTION_KEY
+from quantumfetcher.rmdj import RMDJCodec
 
 
 class VideoList:
@@ -28,16 +28,9 @@ class VideoList:
 
         self.__load_video_list(path)
 
-    @staticmethod
-    def __xor_bytes(src_bytes: bytes) -> bytearray:
-        xor_bytes = bytearray()
-        for i, byte in enumerate(src_bytes):
-            xor_bytes.append(byte ^ RMDJ_ENCRYPTION_KEY[i % len(RMDJ_ENCRYPTION_KEY)])
-        return xor_bytes
-
     def __load_video_list(self, path: Path):
         with open(path, "rb") as f:
-            decrypted_list_raw = self.__xor_bytes(f.read())
+            decrypted_list_raw = RMDJCodec.decrypt(f.read())
             self.__videoList = json.loads(decrypted_list_raw)
 
     def dump(self, dump_path: Path | None = None):
@@ -69,12 +62,7 @@ class VideoList:
         patched_video_list = json.dumps(self.__videoList, indent=4).encode()
 
         # Encrypt the patched videoList
-        encrypted_video_list = bytearray()
-
-        for i, char in enumerate(patched_video_list):
-            encrypted_video_list.append(
-                char ^ RMDJ_ENCRYPTION_KEY[i % len(RMDJ_ENCRYPTION_KEY)]
-            )
+        encrypted_video_list = RMDJCodec.encrypt(patched_video_list)
 
         # Write the encrypted videoList to the original file
         with open(self.__path, "wb") as f:
@@ -86,12 +74,9 @@ class VideoList:
             video_list = json.load(f)
 
         # Encrypt the videoList
-        encrypted_video_list = bytearray()
-
-        for i, char in enumerate(json.dumps(video_list, indent=4).encode()):
-            encrypted_video_list.append(
-                char ^ RMDJ_ENCRYPTION_KEY[i % len(RMDJ_ENCRYPTION_KEY)]
-            )
+        encrypted_video_list = RMDJCodec.encrypt(
+            json.dumps(video_list, indent=4).encode()
+        )
 
         # Write the encrypted videoList to the output file
         with open(output_path, "wb") as f:
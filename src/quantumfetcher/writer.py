@@ -0,0 +1,237 @@
+import errno
+import os
+import queue
+import threading
+from pathlib import Path
+from types import TracebackType
+
+from quantumfetcher.constants import WRITE_BLOCK_SIZE, WRITE_BUFFERS
+from quantumfetcher.enumerators.policy_fsync import FsyncPolicy
+
+
+def get_progress_path(path: Path) -> Path:
+    # Files placed on another storage root are symlinked from the episode
+    # directory, their progress is kept next to the file itself
+    if path.is_symlink():
+        path = path.resolve()
+
+    return path.with_name(f"{path.name}.progress")
+
+
+def read_progress(path: Path) -> int:
+    # Preallocated files have their final size from the start, so the number
+    # of bytes actually written is kept next to them until they are complete
+    try:
+        return int(get_progress_path(path).read_text())
+    except FileNotFoundError:
+        pass
+    except ValueError:
+        # Torn progress file, start over
+        return 0
+
+    try:
+        return path.stat().st_size
+    except FileNotFoundError:
+        return 0
+
+
+# Network side copies received data into a small pool of large buffers, a
+# background thread writes them to disk in whole blocks. Once all buffers
+# are in flight the network side waits, so memory use is bounded no matter
+# how slow the disk is.
+class MediaWriter:
+
+    def __init__(
+        self,
+        path: Path,
+        size: int,
+        fsync_policy: FsyncPolicy = FsyncPolicy.Never,
+        block_size: int = WRITE_BLOCK_SIZE,
+        buffers: int = WRITE_BUFFERS,
+    ):
+        self.__path = path
+        self.__size = size
+        self.__fsync_policy = fsync_policy
+        self.__block_size = block_size
+
+        self.__offset = read_progress(path)
+        self.__written = self.__offset
+        self.__dropped = 0
+        self.__error: BaseException | None = None
+
+        self.__free: queue.SimpleQueue = queue.SimpleQueue()
+        self.__filled: queue.SimpleQueue = queue.SimpleQueue()
+
+        for _ in range(buffers):
+            self.__free.put(bytearray(block_size))
+
+        self.__buffer: bytearray | None = None
+        self.__fill = 0
+
+        self.__fd = os.open(path, os.O_RDWR | os.O_CREAT | getattr(os, "O_BINARY", 0))
+
+        try:
+            self.__progress = open(get_progress_path(path), "wb")
+        except BaseException:
+            os.close(self.__fd)
+            raise
+
+        try:
+            self.__save_progress()
+
+            if fsync_policy != FsyncPolicy.Never:
+                # Progress has to survive a crash before the file is preallocated,
+                # otherwise resume would take it for a complete one
+                os.fsync(self.__progress.fileno())
+
+            self.__preallocate()
+            os.lseek(self.__fd, self.__offset, os.SEEK_SET)
+        except BaseException:
+            self.__close_files()
+            raise
+
+        self.__thread = threading.Thread(
+            target=self.__run, name=f"writer-{path.name}", daemon=True
+        )
+        self.__thread.start()
+
+    def __enter__(self) -> "MediaWriter":
+        return self
+
+    def __exit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc_value: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> None:
+        self.close()
+
+    @property
+    def offset(self) -> int:
+        return self.__offset
+
+    def write(self, data: bytes):
+        view = memoryview(data)
+
+        while view:
+            if self.__buffer is None:
+                self.__buffer = self.__free.get()
+                self.__raise_error()
+
+            count = min(len(view), self.__block_size - self.__fill)
+            self.__buffer[self.__fill : self.__fill + count] = view[:count]
+            self.__fill += count
+            self.__offset += count
+            view = view[count:]
+
+            if self.__fill == self.__block_size:
+                self.__submit(sync=False)
+
+    def flush(self):
+        # Hands over the partly filled buffer, so everything written so far
+        # reaches the file without waiting for the block to fill up
+        self.__submit(sync=False)
+
+    def end_range(self):
+        if self.__fsync_policy == FsyncPolicy.Range:
+            self.__submit(sync=True)
+
+    def close(self):
+        if self.__thread.is_alive():
+            self.__submit(sync=self.__fsync_policy != FsyncPolicy.Never)
+            self.__filled.put(None)
+            self.__thread.join()
+
+        try:
+            self.__raise_error()
+        finally:
+            self.__close_files()
+
+    def __submit(self, sync: bool):
+        if self.__buffer is None and not sync:
+            return
+
+        self.__filled.put((self.__buffer, self.__fill, sync))
+        self.__buffer = None
+        self.__fill = 0
+
+    def __raise_error(self):
+        if self.__error is not None:
+            raise self.__error
+
+    def __run(self):
+        while True:
+            item = self.__filled.get()
+
+            if item is None:
+                break
+
+            buffer, length, sync = item
+
+            try:
+                if self.__error is None:
+                    self.__write_block(buffer, length, sync)
+            except BaseException as e:
+                self.__error = e
+            finally:
+                if buffer is not None:
+                    self.__free.put(buffer)
+
+    def __write_block(self, buffer: bytearray | None, length: int, sync: bool):
+        if buffer is not None:
+            with memoryview(buffer) as view:
+                written = 0
+
+                while written < length:
+                    written += os.write(self.__fd, view[written:length])
+
+            self.__written += length
+
+        if sync:
+            os.fsync(self.__fd)
+
+        self.__save_progress()
+        self.__drop_cache(self.__written if sync else self.__written - length)
+
+    def __save_progress(self):
+        self.__progress.seek(0)
+        self.__progress.write(str(self.__written).encode())
+        self.__progress.truncate()
+        self.__progress.flush()
+
+        if self.__fsync_policy == FsyncPolicy.Range:
+            os.fsync(self.__progress.fileno())
+
+    def __preallocate(self):
+        if not hasattr(os, "posix_fallocate") or self.__offset >= self.__size:
+            return
+
+        try:
+            os.posix_fallocate(self.__fd, self.__offset, self.__size - self.__offset)
+        except OSError as e:
+            # Not every filesystem supports it, running out of space does matter
+            if e.errno not in (errno.EOPNOTSUPP, errno.EINVAL, errno.ENOSYS):
+                raise
+
+    def __drop_cache(self, end: int):
+        # Media files are written once and not read back, keep them out of
+        # the page cache. Dirty pages are only dropped once written back, so
+        # without fsync this lags a block behind and starts their writeback.
+        if not hasattr(os, "posix_fadvise") or end <= self.__dropped:
+            return
+
+        os.posix_fadvise(
+            self.__fd, self.__dropped, end - self.__dropped, os.POSIX_FADV_DONTNEED
+        )
+        self.__dropped = end
+
+    def __close_files(self):
+        self.__progress.close()
+
+        if hasattr(os, "posix_fadvise"):
+            os.posix_fadvise(self.__fd, 0, 0, os.POSIX_FADV_DONTNEED)
+
+        if self.__written >= self.__size:
+            get_progress_path(self.__path).unlink(missing_ok=True)
+
+        os.close(self.__fd)
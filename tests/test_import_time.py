@@ -0,0 +1,76 @@
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+SRC_PATH = Path(__file__).resolve().parents[1] / "src"
+
+# Cumulative time of "import quantumfetcher", it was ~450 ms when the
+# download machinery was imported eagerly and is ~60 ms without it
+IMPORT_TIME_BUDGET = 0.25  # seconds
+
+# Only needed for downloading and interactive prompts
+HEAVY_MODULES = {"requests", "rich.live", "rich.progress", "inquirer"}
+
+
+def run_with_importtime(*args: str) -> dict[str, int]:
+    # Cumulative import time in microseconds of every module imported
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(
+        filter(None, [str(SRC_PATH), env.get("PYTHONPATH")])
+    )
+
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", *args],
+        capture_output=True,
+        text=True,
+        env=env,
+        check=True,
+    )
+
+    modules = {}
+
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+
+        _, cumulative, name = line.split("|")
+        modules[name.strip()] = int(cumulative)
+
+    return modules
+
+
+def test_import_time_within_budget():
+    modules = run_with_importtime("-c", "import quantumfetcher")
+
+    assert modules["quantumfetcher"] / 1e6 < IMPORT_TIME_BUDGET
+
+
+def test_videolist_operations_skip_heavy_imports(tmp_path: Path):
+    json_path = tmp_path / "videoList.json"
+    rmdj_path = tmp_path / "videoList.rmdj"
+    dump_path = tmp_path / "dump.json"
+    video_list = {"J1 - Test": "http://127.0.0.1:10000/J1%20-%20Test.ism/manifest"}
+    json_path.write_text(json.dumps(video_list))
+
+    build_modules = run_with_importtime(
+        "-m",
+        "quantumfetcher",
+        "--build-videolist-path",
+        str(json_path),
+        "--videolist-path",
+        str(rmdj_path),
+    )
+    dump_modules = run_with_importtime(
+        "-m",
+        "quantumfetcher",
+        "--videolist-path",
+        str(rmdj_path),
+        "--dump-videolist-path",
+        str(dump_path),
+    )
+
+    assert json.loads(dump_path.read_text()) == video_list
+    assert not HEAVY_MODULES & set(build_modules)
+    assert not HEAVY_MODULES & set(dump_modules)